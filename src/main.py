@@ -1,59 +1,3827 @@
 import sys
 import os
+import re
+import argparse
+import base64
+import collections
+import concurrent.futures
+import hashlib
+import heapq
+import hmac
+import http.client
+import mmap
+import multiprocessing
+import queue
+import random
+import select
+import shutil
+import socket
+import sqlite3
+import tempfile
+import ctypes
+import ctypes.util
+import statistics
+import struct
 import threading
 import time
-from datetime import datetime
+import urllib.parse
+import uuid
+import zlib
+from contextlib import closing
+from datetime import datetime, timezone
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel, 
                              QSystemTrayIcon, QMenu, QAction, QVBoxLayout, 
                              QHBoxLayout, QLineEdit, QPushButton, QSpinBox, 
                              QFileDialog, QMessageBox, QGroupBox, QCheckBox,
                              QRadioButton, QButtonGroup)
-from PyQt5.QtCore import Qt, QRect, QPoint, pyqtSignal, QTimer, QThread
-from PyQt5.QtGui import QPainter, QColor, QPen, QPixmap, QIcon
+from PyQt5.QtCore import (Qt, QRect, QPoint, QPointF, pyqtSignal, QTimer, QThread, QBuffer,
+                          QIODevice, QObject, QMimeData)
+from PyQt5.QtNetwork import QLocalServer
+from PyQt5.QtGui import (QPainter, QColor, QPen, QPixmap, QIcon, QImage, QImageReader, QMouseEvent, QFont,
+                         QRegion)
+from PyQt5 import sip
 import keyboard
+import importlib
 import json
 import logging
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import evdev
+except ImportError:
+    evdev = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # Setup logging for debugging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class HotkeyThread(QThread):
-    """Run keyboard hooks in a separate thread to prevent blocking the UI"""
-    hotkey_triggered = pyqtSignal()
+def parse_hotkey(hotkey):
+    """Split 'ctrl+shift+p' into ({'ctrl', 'shift'}, 'p')"""
+    parts = [part.strip().lower() for part in hotkey.split('+') if part.strip()]
+    if not parts:
+        raise ValueError(f"Empty hotkey: {hotkey!r}")
+    aliases = {'control': 'ctrl', 'win': 'super', 'windows': 'super', 'cmd': 'super',
+               'command': 'super', 'meta': 'super', 'option': 'alt'}
+    modifiers = {aliases.get(part, part) for part in parts[:-1]}
+    unknown = modifiers - {'ctrl', 'shift', 'alt', 'super'}
+    if unknown:
+        raise ValueError(f"Unknown modifier(s) in hotkey {hotkey!r}: {', '.join(sorted(unknown))}")
+    return modifiers, parts[-1]
+
+
+class HotkeyBackend:
+    """
+    Base class for global hotkey backends.
+    run() blocks the calling thread until stop() and calls callback for every
+    press of the hotkey. wakeups counts how often the backend had to run
+    Python code in response to an OS event (for --measure-hotkeys).
+    """
+    name = 'base'
+
+    def __init__(self):
+        self.wakeups = 0
+        self.count_events = False
+        self._stop_event = threading.Event()
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def run(self, hotkey, callback):
+        raise NotImplementedError
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class KeyboardHotkeyBackend(HotkeyBackend):
+    """
+    The keyboard library (Windows, macOS, Linux as root).
+    It sees every keystroke system-wide in Python; the waiting thread itself
+    sleeps until stop() instead of polling.
+    """
+    name = 'keyboard'
+
+    @classmethod
+    def is_available(cls):
+        # On Linux the library reads /dev/input and needs root
+        return not sys.platform.startswith('linux') or os.geteuid() == 0
+
+    def _count(self, event):
+        self.wakeups += 1
+
+    def run(self, hotkey, callback):
+        handle = keyboard.add_hotkey(hotkey, callback)
+        counter = keyboard.hook(self._count) if self.count_events else None
+        try:
+            self._stop_event.wait()
+        finally:
+            # Only remove our own hooks, not everything registered in the process
+            keyboard.remove_hotkey(handle)
+            if counter is not None:
+                keyboard.unhook(counter)
+
+
+class _SelectLoopHotkeyBackend(HotkeyBackend):
+    """Backend that blocks in select() on its event sources plus a wake-up pipe"""
+
+    def __init__(self):
+        super().__init__()
+        # The pipe only exists while run() loops; stop() must never write to a
+        # closed descriptor number that may since belong to another file
+        self._pipe_lock = threading.Lock()
+        self._wake_r = self._wake_w = None
+
+    def stop(self):
+        super().stop()
+        with self._pipe_lock:
+            if self._wake_w is None:
+                return
+            try:
+                os.write(self._wake_w, b'x')
+            except OSError:
+                pass
+
+    def _open_pipe(self):
+        with self._pipe_lock:
+            self._wake_r, self._wake_w = os.pipe()
+
+    def _close_pipe(self):
+        with self._pipe_lock:
+            fds = (self._wake_r, self._wake_w)
+            self._wake_r = self._wake_w = None
+            for fd in fds:
+                if fd is None:
+                    continue
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+    def _wait(self, fds):
+        """Block until one of fds is readable; returns them, or None once stopped"""
+        if self._stop_event.is_set():
+            return None
+        readable, _, _ = select.select(list(fds) + [self._wake_r], [], [])
+        if self._stop_event.is_set():
+            return None
+        self.wakeups += 1
+        return readable
+
+
+class X11HotkeyBackend(_SelectLoopHotkeyBackend):
+    """
+    XGrabKey on the root window: the X server only sends us the bound chord,
+    so the thread sleeps in select() until the hotkey is actually pressed.
+    """
+    name = 'x11'
+
+    KEY_PRESS = 2
+    GRAB_MODE_ASYNC = 1
+    MODIFIER_MASKS = {'shift': 1 << 0, 'ctrl': 1 << 2, 'alt': 1 << 3, 'super': 1 << 6}
+    # Lock (Caps Lock) and Mod2 (usually Num Lock) must not stop the hotkey from firing
+    IGNORED_MASKS = (0, 1 << 1, 1 << 4, (1 << 1) | (1 << 4))
+    KEYSYM_NAMES = {'print screen': 'Print', 'printscreen': 'Print', 'space': 'space',
+                    'enter': 'Return', 'return': 'Return', 'esc': 'Escape', 'escape': 'Escape',
+                    'tab': 'Tab', 'backspace': 'BackSpace', 'delete': 'Delete', 'insert': 'Insert',
+                    'home': 'Home', 'end': 'End', 'page up': 'Prior', 'page down': 'Next',
+                    'pause': 'Pause', 'scroll lock': 'Scroll_Lock'}
+
+    _x11 = None
+
+    @classmethod
+    def _load_x11(cls):
+        if cls._x11 is None:
+            path = ctypes.util.find_library('X11')
+            if not path:
+                raise OSError("libX11 not found")
+            x11 = ctypes.CDLL(path)
+            x11.XOpenDisplay.restype = ctypes.c_void_p
+            x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+            x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+            x11.XDefaultRootWindow.restype = ctypes.c_ulong
+            x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+            x11.XStringToKeysym.restype = ctypes.c_ulong
+            x11.XStringToKeysym.argtypes = [ctypes.c_char_p]
+            x11.XKeysymToKeycode.restype = ctypes.c_ubyte
+            x11.XKeysymToKeycode.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+            x11.XGrabKey.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_uint, ctypes.c_ulong,
+                                     ctypes.c_int, ctypes.c_int, ctypes.c_int]
+            x11.XUngrabKey.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_uint, ctypes.c_ulong]
+            x11.XConnectionNumber.argtypes = [ctypes.c_void_p]
+            x11.XPending.argtypes = [ctypes.c_void_p]
+            x11.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+            x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+            x11.XSetErrorHandler.restype = ctypes.c_void_p
+            x11.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+            cls._x11 = x11
+        return cls._x11
+
+    @classmethod
+    def is_available(cls):
+        if not sys.platform.startswith('linux') or not os.environ.get('DISPLAY'):
+            return False
+        if QApplication.instance() is not None and QApplication.platformName() != 'xcb':
+            return False
+        try:
+            return cls._load_x11() is not None
+        except OSError:
+            return False
+
+    def __init__(self):
+        super().__init__()
+        self.x11 = self._load_x11()
+        self._grab_failed = False
+        # XGrabKey reports BadAccess asynchronously; the default handler would exit
+        self._error_handler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p,
+                                               ctypes.c_void_p)(self._on_x_error)
+
+    def _on_x_error(self, display, error_event):
+        self._grab_failed = True
+        return 0
+
+    def _keycode(self, display, key):
+        keysym_name = self.KEYSYM_NAMES.get(key, key.upper() if re.match(r'^f\d+$', key) else key)
+        keysym = self.x11.XStringToKeysym(keysym_name.encode('ascii'))
+        keycode = self.x11.XKeysymToKeycode(display, keysym) if keysym else 0
+        if not keycode:
+            raise ValueError(f"No X11 keycode for key {key!r}")
+        return keycode
+
+    def run(self, hotkey, callback):
+        modifiers, key = parse_hotkey(hotkey)
+        mask = 0
+        for modifier in modifiers:
+            mask |= self.MODIFIER_MASKS[modifier]
+
+        display = self.x11.XOpenDisplay(None)
+        if not display:
+            raise OSError("Cannot open X display")
+        self._open_pipe()
+        try:
+            root = self.x11.XDefaultRootWindow(display)
+            keycode = self._keycode(display, key)
+            # The error handler is process-global (Qt's own X connection included),
+            # so it is only installed for as long as the grab takes to report errors
+            previous_handler = self.x11.XSetErrorHandler(ctypes.cast(self._error_handler, ctypes.c_void_p))
+            try:
+                for extra in self.IGNORED_MASKS:
+                    self.x11.XGrabKey(display, keycode, mask | extra, root, 0,
+                                      self.GRAB_MODE_ASYNC, self.GRAB_MODE_ASYNC)
+                self.x11.XSync(display, 0)
+            finally:
+                self.x11.XSetErrorHandler(previous_handler)
+            if self._grab_failed:
+                raise OSError(f"Hotkey {hotkey} is already grabbed by another application")
+
+            event = (ctypes.c_long * 24)()
+            x_fd = self.x11.XConnectionNumber(display)
+            while True:
+                # Drain events Xlib already read before sleeping on the socket again
+                while self.x11.XPending(display):
+                    self.x11.XNextEvent(display, event)
+                    if ctypes.cast(event, ctypes.POINTER(ctypes.c_int))[0] == self.KEY_PRESS:
+                        callback()
+                if self._wait([x_fd]) is None:
+                    break
+
+            for extra in self.IGNORED_MASKS:
+                self.x11.XUngrabKey(display, keycode, mask | extra, root)
+            self.x11.XSync(display, 0)
+        finally:
+            self.x11.XCloseDisplay(display)
+            self._close_pipe()
+
+
+class EvdevHotkeyBackend(_SelectLoopHotkeyBackend):
+    """
+    Read keyboards directly through evdev (works on Wayland and without X;
+    needs read access to /dev/input, e.g. membership of the input group).
+    Wakes on every key event of the keyboards, but not on mouse or other input.
+    """
+    name = 'evdev'
+
+    MODIFIER_CODES = {
+        'ctrl': ('KEY_LEFTCTRL', 'KEY_RIGHTCTRL'),
+        'shift': ('KEY_LEFTSHIFT', 'KEY_RIGHTSHIFT'),
+        'alt': ('KEY_LEFTALT', 'KEY_RIGHTALT'),
+        'super': ('KEY_LEFTMETA', 'KEY_RIGHTMETA'),
+    }
+    KEY_NAMES = {'print screen': 'KEY_SYSRQ', 'printscreen': 'KEY_SYSRQ', 'enter': 'KEY_ENTER',
+                 'return': 'KEY_ENTER', 'escape': 'KEY_ESC', 'page up': 'KEY_PAGEUP',
+                 'page down': 'KEY_PAGEDOWN', 'scroll lock': 'KEY_SCROLLLOCK'}
+
+    @classmethod
+    def is_available(cls):
+        return evdev is not None and bool(cls._keyboards())
+
+    @staticmethod
+    def _keyboards():
+        keyboards = []
+        for path in evdev.list_devices():
+            try:
+                device = evdev.InputDevice(path)
+            except OSError:
+                continue
+            keys = device.capabilities().get(evdev.ecodes.EV_KEY, [])
+            if evdev.ecodes.KEY_A in keys:
+                keyboards.append(device)
+            else:
+                device.close()
+        return keyboards
+
+    def run(self, hotkey, callback):
+        modifiers, key = parse_hotkey(hotkey)
+        ecodes = evdev.ecodes.ecodes
+        key_name = self.KEY_NAMES.get(key, 'KEY_' + key.upper().replace(' ', ''))
+        if key_name not in ecodes:
+            raise ValueError(f"No evdev key code for key {key!r}")
+        key_code = ecodes[key_name]
+        required = [{ecodes[name] for name in self.MODIFIER_CODES[modifier]} for modifier in modifiers]
+
+        keyboards = self._keyboards()
+        if not keyboards:
+            raise OSError("No readable keyboard devices in /dev/input")
+        by_fd = {device.fd: device for device in keyboards}
+        pressed = set()
+        self._open_pipe()
+        try:
+            while True:
+                readable = self._wait(by_fd)
+                if readable is None:
+                    break
+                for fd in readable:
+                    if fd not in by_fd:
+                        continue
+                    for event in by_fd[fd].read():
+                        if event.type != evdev.ecodes.EV_KEY:
+                            continue
+                        if event.value == 0:
+                            pressed.discard(event.code)
+                            continue
+                        if event.value == 1:
+                            pressed.add(event.code)
+                            if event.code == key_code and all(group & pressed for group in required):
+                                callback()
+        finally:
+            for device in keyboards:
+                device.close()
+            self._close_pipe()
+
+
+HOTKEY_BACKENDS = {
+    X11HotkeyBackend.name: X11HotkeyBackend,
+    EvdevHotkeyBackend.name: EvdevHotkeyBackend,
+    KeyboardHotkeyBackend.name: KeyboardHotkeyBackend,
+}
+
+
+def create_hotkey_backend(name='auto'):
+    """Instantiate a hotkey backend; 'auto' takes the first available in HOTKEY_BACKENDS order"""
+    if name == 'auto':
+        for backend_class in HOTKEY_BACKENDS.values():
+            if backend_class.is_available():
+                return backend_class()
+        return KeyboardHotkeyBackend()
+    backend_class = HOTKEY_BACKENDS.get(name)
+    if backend_class is None:
+        logger.warning(f"Unknown hotkey backend '{name}', using keyboard")
+        backend_class = KeyboardHotkeyBackend
+    return backend_class()
+
+
+def measure_hotkey_backends(hotkey, seconds=10.0):
+    """
+    Run every available hotkey backend idle for seconds and report the CPU it
+    used and how often it woke up. Type normally meanwhile to see the cost of
+    backends that see every keystroke.
+    """
+    results = []
+    for name, backend_class in HOTKEY_BACKENDS.items():
+        if not backend_class.is_available():
+            logger.info(f"{name}: not available here")
+            continue
+        backend = backend_class()
+        backend.count_events = True
+        errors = []
+        
+        def run_backend():
+            try:
+                backend.run(hotkey, lambda: None)
+            except Exception as e:
+                errors.append(e)
+        
+        thread = threading.Thread(target=run_backend, daemon=True)
+        
+        cpu_start = time.process_time()
+        switches_start = resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw if resource else 0
+        start = time.perf_counter()
+        thread.start()
+        time.sleep(seconds)
+        backend.stop()
+        thread.join(5)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        switches = (resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw - switches_start) if resource else 0
+        
+        if errors:
+            logger.info(f"{name}: failed: {errors[0]!r}")
+            continue
+        result = {
+            'backend': name,
+            'seconds': elapsed,
+            'cpu_percent': cpu / elapsed * 100,
+            'wakeups_per_s': backend.wakeups / elapsed,
+            'context_switches_per_s': switches / elapsed,
+        }
+        results.append(result)
+        logger.info(f"{name:>8}: cpu={result['cpu_percent']:.3f}%  "
+                    f"wakeups={result['wakeups_per_s']:.2f}/s  "
+                    f"context switches={result['context_switches_per_s']:.2f}/s")
+    return results
+
+
+class HotkeyThread(QThread):
+    """Run keyboard hooks in a separate thread to prevent blocking the UI"""
+    hotkey_pressed = pyqtSignal(float)  # time.monotonic() of the press
+    
+    def __init__(self, hotkey, backend='auto'):
+        super().__init__()
+        self.hotkey = hotkey
+        self.is_running = False
+        self.daemon = True
+        self.backend = create_hotkey_backend(backend)
+    
+    def run(self):
+        try:
+            self.is_running = True
+            logger.info(f"Hotkey thread started for: {self.hotkey} ({self.backend.name} backend)")
+            # Blocks until stop(); the backend only wakes up for input events
+            self.backend.run(self.hotkey, self._on_hotkey)
+        except Exception as e:
+            logger.error(f"Error in hotkey thread: {e}")
+        finally:
+            self.is_running = False
+            logger.info("Hotkey thread ended")
+    
+    def _on_hotkey(self):
+        """Emit signal when hotkey is pressed"""
+        self.hotkey_pressed.emit(time.monotonic())
+    
+    def stop(self):
+        """Stop the hotkey thread"""
+        self.is_running = False
+        try:
+            self.backend.stop()
+        except Exception as e:
+            logger.error(f"Error stopping hotkey thread: {e}")
+        self.wait()
+
+
+class GrabBackend:
+    """
+    Base class for screen grab backends.
+    A backend returns the pixels of a rectangle (global desktop coordinates)
+    on a given screen as a QPixmap. Pixel copies a grab makes on the way are
+    counted in counter (a BufferCounter) when one is given.
+    """
+    name = 'base'
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def grab(self, screen, rect=None, counter=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class QtGrabBackend(GrabBackend):
+    """Grab through QScreen.grabWindow (portable default)"""
+    name = 'qt'
+
+    def grab(self, screen, rect=None, counter=None):
+        geom = screen.geometry()
+        if rect is None:
+            return screen.grabWindow(0)
+        # grabWindow(0, ...) takes coordinates relative to the screen
+        return screen.grabWindow(0, rect.x() - geom.x(), rect.y() - geom.y(),
+                                 rect.width(), rect.height())
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [('shmseg', ctypes.c_ulong),
+                ('shmid', ctypes.c_int),
+                ('shmaddr', ctypes.c_void_p),
+                ('readOnly', ctypes.c_int)]
+
+
+class _XImageFuncs(ctypes.Structure):
+    _fields_ = [('create_image', ctypes.c_void_p),
+                ('destroy_image', ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p)),
+                ('get_pixel', ctypes.c_void_p),
+                ('put_pixel', ctypes.c_void_p),
+                ('sub_image', ctypes.c_void_p),
+                ('add_pixel', ctypes.c_void_p)]
+
+
+class _XImage(ctypes.Structure):
+    _fields_ = [('width', ctypes.c_int),
+                ('height', ctypes.c_int),
+                ('xoffset', ctypes.c_int),
+                ('format', ctypes.c_int),
+                ('data', ctypes.c_void_p),
+                ('byte_order', ctypes.c_int),
+                ('bitmap_unit', ctypes.c_int),
+                ('bitmap_bit_order', ctypes.c_int),
+                ('bitmap_pad', ctypes.c_int),
+                ('depth', ctypes.c_int),
+                ('bytes_per_line', ctypes.c_int),
+                ('bits_per_pixel', ctypes.c_int),
+                ('red_mask', ctypes.c_ulong),
+                ('green_mask', ctypes.c_ulong),
+                ('blue_mask', ctypes.c_ulong),
+                ('obdata', ctypes.c_void_p),
+                ('f', _XImageFuncs)]
+
+
+class X11ShmGrabBackend(GrabBackend):
+    """
+    Grab through the X11 MIT-SHM extension (XShmGetImage).
+    Only the requested region is transferred, straight into a shared memory
+    segment that is reused between grabs as long as the size does not change.
+    """
+    name = 'x11-shm'
+
+    ZPIXMAP = 2
+    IPC_PRIVATE = 0
+    IPC_CREAT = 0o1000
+    IPC_RMID = 0
+    ALL_PLANES = ctypes.c_ulong(-1).value
+
+    _libs = None
+
+    @classmethod
+    def _load_libs(cls):
+        """Load and prototype libX11, libXext and libc (cached)"""
+        if cls._libs is None:
+            x11_path = ctypes.util.find_library('X11')
+            xext_path = ctypes.util.find_library('Xext')
+            if not x11_path or not xext_path:
+                raise OSError("libX11/libXext not found")
+            x11 = ctypes.CDLL(x11_path)
+            xext = ctypes.CDLL(xext_path)
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+            x11.XOpenDisplay.restype = ctypes.c_void_p
+            x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+            x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+            x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+            x11.XDefaultRootWindow.restype = ctypes.c_ulong
+            x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+            x11.XDefaultVisual.restype = ctypes.c_void_p
+            x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+            x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+            x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+            x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+            x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+
+            xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+            xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+            xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint,
+                                             ctypes.c_int, ctypes.c_void_p,
+                                             ctypes.POINTER(_XShmSegmentInfo),
+                                             ctypes.c_uint, ctypes.c_uint]
+            xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+            xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+            xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                          ctypes.POINTER(_XImage), ctypes.c_int,
+                                          ctypes.c_int, ctypes.c_ulong]
+
+            libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+            libc.shmat.restype = ctypes.c_void_p
+            libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+            libc.shmdt.argtypes = [ctypes.c_void_p]
+            libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+            cls._libs = (x11, xext, libc)
+        return cls._libs
+
+    @classmethod
+    def is_available(cls):
+        """MIT-SHM needs the xcb platform plugin, the libraries and the server extension"""
+        if not sys.platform.startswith('linux'):
+            return False
+        if QApplication.instance() is not None and QApplication.platformName() != 'xcb':
+            return False
+        try:
+            x11, xext, _ = cls._load_libs()
+            display = x11.XOpenDisplay(None)
+            if not display:
+                return False
+            try:
+                return bool(xext.XShmQueryExtension(display))
+            finally:
+                x11.XCloseDisplay(display)
+        except Exception as e:
+            logger.info(f"X11 MIT-SHM backend unavailable: {e}")
+            return False
+
+    def __init__(self):
+        self.x11, self.xext, self.libc = self._load_libs()
+        self.display = self.x11.XOpenDisplay(None)
+        if not self.display:
+            raise OSError("Cannot open X display")
+        screen_num = self.x11.XDefaultScreen(self.display)
+        self.root = self.x11.XDefaultRootWindow(self.display)
+        self.visual = self.x11.XDefaultVisual(self.display, screen_num)
+        self.depth = self.x11.XDefaultDepth(self.display, screen_num)
+        self.root_rect = QRect(0, 0, self.x11.XDisplayWidth(self.display, screen_num),
+                               self.x11.XDisplayHeight(self.display, screen_num))
+        self.image = None
+        self.shminfo = None
+        self.image_size = None
+
+    def _release_image(self):
+        """Detach and free the current shared memory image"""
+        if self.image is None:
+            return
+        self.xext.XShmDetach(self.display, ctypes.byref(self.shminfo))
+        self.x11.XSync(self.display, 0)
+        self.libc.shmdt(ctypes.c_void_p(self.shminfo.shmaddr))
+        # The data is shared memory, not Xmalloc'ed: detach it before destroying
+        self.image.contents.data = None
+        self.image.contents.f.destroy_image(ctypes.cast(self.image, ctypes.c_void_p))
+        self.image = None
+        self.shminfo = None
+        self.image_size = None
+
+    def _ensure_image(self, width, height):
+        """(Re)create the shared memory image when the grab size changes"""
+        if self.image_size == (width, height):
+            return
+        self._release_image()
+
+        shminfo = _XShmSegmentInfo()
+        image = self.xext.XShmCreateImage(self.display, self.visual, self.depth, self.ZPIXMAP,
+                                          None, ctypes.byref(shminfo), width, height)
+        if not image:
+            raise OSError("XShmCreateImage failed")
+        if image.contents.bits_per_pixel != 32 or sys.byteorder != 'little':
+            image.contents.f.destroy_image(ctypes.cast(image, ctypes.c_void_p))
+            raise OSError(f"Unsupported X11 pixel layout: {image.contents.bits_per_pixel} bpp")
+
+        size = image.contents.bytes_per_line * height
+        shminfo.shmid = self.libc.shmget(self.IPC_PRIVATE, size, self.IPC_CREAT | 0o600)
+        if shminfo.shmid < 0:
+            image.contents.f.destroy_image(ctypes.cast(image, ctypes.c_void_p))
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        shminfo.shmaddr = self.libc.shmat(shminfo.shmid, None, 0)
+        # Mark for removal now; the kernel frees it once everyone has detached
+        self.libc.shmctl(shminfo.shmid, self.IPC_RMID, None)
+        if shminfo.shmaddr in (None, ctypes.c_void_p(-1).value):
+            image.contents.f.destroy_image(ctypes.cast(image, ctypes.c_void_p))
+            raise OSError(ctypes.get_errno(), "shmat failed")
+        shminfo.readOnly = 0
+        image.contents.data = shminfo.shmaddr
+
+        if not self.xext.XShmAttach(self.display, ctypes.byref(shminfo)):
+            self.libc.shmdt(ctypes.c_void_p(shminfo.shmaddr))
+            image.contents.data = None
+            image.contents.f.destroy_image(ctypes.cast(image, ctypes.c_void_p))
+            raise OSError("XShmAttach failed")
+
+        self.image = image
+        self.shminfo = shminfo
+        self.image_size = (width, height)
+
+    def grab(self, screen, rect=None, counter=None):
+        if rect is None:
+            rect = screen.geometry()
+        if screen.devicePixelRatio() != 1:
+            # Logical and device coordinates differ; let Qt do the mapping
+            return QtGrabBackend().grab(screen, rect)
+        if not self.root_rect.contains(rect):
+            # XShmGetImage outside the root window is a BadMatch error, which
+            # Xlib's default handler turns into exit(); Qt clips instead
+            return QtGrabBackend().grab(screen, rect)
+
+        self._ensure_image(rect.width(), rect.height())
+        if not self.xext.XShmGetImage(self.display, self.root, self.image,
+                                      rect.x(), rect.y(), self.ALL_PLANES):
+            raise OSError("XShmGetImage failed")
+
+        bytes_per_line = self.image.contents.bytes_per_line
+        view = QImage(sip.voidptr(self.image.contents.data), rect.width(), rect.height(),
+                      bytes_per_line, QImage.Format_RGB32)
+        # The segment is reused by the next grab, so detach the pixels from it.
+        # That is the only copy: without format conversion the pixmap takes
+        # over the copied buffer (raster platforms).
+        image = view.copy()
+        if counter is not None:
+            counter.copied(image)
+        return QPixmap.fromImage(image, Qt.NoFormatConversion)
+
+    def close(self):
+        try:
+            self._release_image()
+        finally:
+            if self.display:
+                self.x11.XCloseDisplay(self.display)
+                self.display = None
+
+
+GRAB_BACKENDS = {
+    QtGrabBackend.name: QtGrabBackend,
+    X11ShmGrabBackend.name: X11ShmGrabBackend,
+}
+
+_grab_backend_cache = {}
+
+
+def get_grab_backend(name='auto'):
+    """
+    Return a (cached) grab backend instance.
+    'auto' prefers X11 MIT-SHM when running on X11, and falls back to Qt.
+    """
+    if name == 'auto':
+        name = X11ShmGrabBackend.name if X11ShmGrabBackend.is_available() else QtGrabBackend.name
+
+    if name not in _grab_backend_cache:
+        backend_class = GRAB_BACKENDS.get(name)
+        if backend_class is None:
+            logger.warning(f"Unknown grab backend '{name}', using Qt")
+            backend_class = QtGrabBackend
+        try:
+            _grab_backend_cache[name] = backend_class()
+        except Exception as e:
+            logger.warning(f"Could not initialise grab backend '{name}': {e}, using Qt")
+            _grab_backend_cache[name] = QtGrabBackend()
+        logger.info(f"Grab backend: {_grab_backend_cache[name].name}")
+    return _grab_backend_cache[name]
+
+
+def benchmark_grab_backends(iterations=20, region=None):
+    """
+    Time every available grab backend on the current display.
+    region is an optional QRect (global coordinates) to grab instead of
+    each full screen. Returns a list of result dicts and logs a summary.
+    """
+    results = []
+    screens = QApplication.screens()
+
+    for name, backend_class in GRAB_BACKENDS.items():
+        if not backend_class.is_available():
+            logger.info(f"{name}: not available on this display")
+            continue
+        backend = backend_class()
+        try:
+            timings = []
+            pixels = 0
+            backend.grab(screens[0], region)  # warm up (allocations, shm setup)
+            for _ in range(iterations):
+                pixels = 0
+                start = time.perf_counter()
+                if region is not None:
+                    screen = QApplication.screenAt(region.center()) or screens[0]
+                    pixmap = backend.grab(screen, region)
+                    pixels += pixmap.width() * pixmap.height()
+                else:
+                    for screen in screens:
+                        pixmap = backend.grab(screen)
+                        pixels += pixmap.width() * pixmap.height()
+                timings.append(time.perf_counter() - start)
+        finally:
+            backend.close()
+
+        mean = statistics.mean(timings)
+        result = {
+            'backend': name,
+            'iterations': iterations,
+            'pixels': pixels,
+            'mean_ms': mean * 1000,
+            'median_ms': statistics.median(timings) * 1000,
+            'min_ms': min(timings) * 1000,
+            'mpix_per_s': pixels / mean / 1e6 if mean > 0 else 0.0,
+        }
+        results.append(result)
+        logger.info(f"{name}: mean={result['mean_ms']:.2f} ms  median={result['median_ms']:.2f} ms  "
+                    f"min={result['min_ms']:.2f} ms  ({result['mpix_per_s']:.1f} Mpix/s)")
+    return results
+
+
+class BufferCounter:
+    """Full-size pixel buffers allocated and copied on the way from grab to file"""
+
+    def __init__(self):
+        self.allocations = 0
+        self.copies = 0
+        self.bytes_copied = 0
+        self._lock = threading.Lock()  # Regions are encoded on several threads
+
+    def copied(self, image, allocated=True):
+        """
+        Count image (a QImage or QPixmap) as a buffer that was just filled by
+        copying pixels; allocated=False for copies into an existing buffer.
+        """
+        size = pixmap_bytes(image) if isinstance(image, QPixmap) else image.bytesPerLine() * image.height()
+        with self._lock:
+            self.allocations += int(allocated)
+            self.copies += 1
+            self.bytes_copied += size
+        return image
+
+
+def as_rgb32(image, counter=None):
+    """
+    image in QImage.Format_RGB32, the one format the capture path works in
+    (screens are opaque, so no alpha). Converts, and counts it, only if needed.
+    """
+    if image.format() == QImage.Format_RGB32:
+        return image
+    converted = image.convertToFormat(QImage.Format_RGB32)
+    if counter is not None:
+        counter.copied(converted)
+    return converted
+
+
+def crop_image_view(image, rect, counter=None):
+    """
+    Return a QImage that views rect inside image without copying pixels.
+    The view shares the source buffer, so image must outlive it.
+    Falls back to a real copy for formats that are not 32 bits per pixel.
+    """
+    rect = rect.intersected(image.rect())
+    if image.depth() != 32 or rect.isEmpty():
+        crop = image.copy(rect)
+        if counter is not None:
+            counter.copied(crop)
+        return crop
+    offset = rect.y() * image.bytesPerLine() + rect.x() * 4
+    bits = image.constBits()
+    view = QImage(sip.voidptr(int(bits) + offset), rect.width(), rect.height(),
+                  image.bytesPerLine(), image.format())
+    return view
+
+
+class ClipboardImage(QMimeData):
+    """
+    Clipboard contents that crop rect out of image only when they are first
+    asked for (a paste or a clipboard manager), so putting a capture on the
+    clipboard copies no pixels. image is implicitly shared, not copied, and
+    released once the crop has been made; it must own its pixels (not a
+    crop_image_view view), as the clipboard outlives the capture.
+    """
+    IMAGE_FORMAT = 'application/x-qt-image'
+
+    def __init__(self, image, rect=None):
+        super().__init__()
+        self._source = image
+        self._rect = image.rect() if rect is None else QRect(rect)
+        self._image = None
+
+    def image(self):
+        if self._image is None:
+            if self._rect == self._source.rect():
+                self._image = self._source
+            else:
+                self._image = self._source.copy(self._rect)
+            self._source = None
+        return self._image
+
+    def formats(self):
+        return [self.IMAGE_FORMAT]
+
+    def hasFormat(self, mime_type):
+        return mime_type == self.IMAGE_FORMAT
+
+    def retrieveData(self, mime_type, type):
+        return self.image() if mime_type == self.IMAGE_FORMAT else None
+
+
+class CapturedFrame:
+    """
+    A captured region as handed to capture hooks.
+    image is a QImage over the capture buffer (no copy, no encode). It is only
+    guaranteed to stay valid during the hook call; use image.copy() to keep it.
+    """
+
+    def __init__(self, image, rect, ratio_mode, filepath=None, source=None):
+        self.image = image
+        self.rect = QRect(rect)
+        self.ratio_mode = ratio_mode
+        self.filepath = filepath
+        self.timestamp = time.time()
+        self._source = source  # Keeps the buffer behind a cropped view alive
+
+    @property
+    def width(self):
+        return self.image.width()
+
+    @property
+    def height(self):
+        return self.image.height()
+
+    @property
+    def bytes_per_line(self):
+        return self.image.bytesPerLine()
+
+    def memoryview(self):
+        """Read-only memoryview over the scanlines (rows are bytes_per_line apart); empty for an empty frame"""
+        if self.image.isNull() or self.width == 0 or self.height == 0:
+            return memoryview(b'')
+        size = self.bytes_per_line * (self.height - 1) + self.width * self.image.depth() // 8
+        bits = self.image.constBits()
+        bits.setsize(size)
+        return memoryview(bits).toreadonly()
+
+    def numpy(self):
+        """Read-only (height, width, 4) uint8 view in BGRA byte order, or None without NumPy"""
+        if np is None:
+            return None
+        if self.image.isNull() or self.width == 0 or self.height == 0:
+            return np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        if self.image.depth() != 32:
+            return None
+        flat = np.frombuffer(self.memoryview(), dtype=np.uint8)
+        return np.lib.stride_tricks.as_strided(flat, shape=(self.height, self.width, 4),
+                                               strides=(self.bytes_per_line, 4, 1),
+                                               writeable=False)
+
+
+_capture_hooks = []
+
+
+def register_capture_hook(callback):
+    """Call callback(frame) with a CapturedFrame for every capture, before it is saved"""
+    if callback not in _capture_hooks:
+        _capture_hooks.append(callback)
+
+
+def unregister_capture_hook(callback):
+    if callback in _capture_hooks:
+        _capture_hooks.remove(callback)
+
+
+def dispatch_capture_hooks(frame):
+    """Run all capture hooks; a failing hook never prevents the capture from being saved"""
+    for callback in list(_capture_hooks):
+        try:
+            callback(frame)
+        except Exception as e:
+            logger.error(f"Error in capture hook {getattr(callback, '__name__', callback)}: {e}")
+
+
+def load_capture_plugins(module_names):
+    """
+    Import plugin modules listed in settings.
+    A plugin module either defines on_capture(frame) or register(register_capture_hook).
+    """
+    for module_name in module_names:
+        try:
+            module = importlib.import_module(module_name)
+            if hasattr(module, 'register'):
+                module.register(register_capture_hook)
+            elif hasattr(module, 'on_capture'):
+                register_capture_hook(module.on_capture)
+            else:
+                logger.warning(f"Capture plugin {module_name} has no on_capture or register")
+                continue
+            logger.info(f"Loaded capture plugin: {module_name}")
+        except Exception as e:
+            logger.error(f"Error loading capture plugin {module_name}: {e}")
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Uncompressed bytes per strip; like pigz's 128 KiB blocks, small enough to spread over cores
+PNG_STRIP_BYTES = 256 * 1024
+# Deflate window: each strip is primed with this much of the previous one
+PNG_WINDOW = 32 * 1024
+# 'auto' uses the parallel encoder from about one Full HD frame up
+PARALLEL_PNG_MIN_PIXELS = 2000000
+
+
+def _png_chunk(kind, data):
+    crc = zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', crc)
+
+
+def _filter_png_rows(rows, above, bpp):
+    """
+    Apply PNG filters to a (height, row_bytes) uint8 array whose preceding row
+    is above, picking for every row the filter with the smallest sum of
+    absolute values (libpng's heuristic). Returns the filtered bytes.
+    """
+    height, row_bytes = rows.shape
+    prior = np.vstack((above[np.newaxis, :], rows[:-1]))
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+    upper_left = np.zeros_like(prior)
+    upper_left[:, bpp:] = prior[:, :-bpp]
+    
+    left16, prior16, upper_left16 = (a.astype(np.int16) for a in (left, prior, upper_left))
+    pa = np.abs(prior16 - upper_left16)
+    pb = np.abs(left16 - upper_left16)
+    pc = np.abs(left16 + prior16 - 2 * upper_left16)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, prior, upper_left))
+    
+    candidates = np.stack((rows,
+                           rows - left,
+                           rows - prior,
+                           rows - ((left16 + prior16) >> 1).astype(np.uint8),
+                           rows - paeth))
+    scores = np.abs(candidates.view(np.int8).astype(np.int16)).sum(axis=2)
+    choice = scores.argmin(axis=0)
+    
+    out = np.empty((height, row_bytes + 1), dtype=np.uint8)
+    out[:, 0] = choice
+    out[:, 1:] = candidates[choice, np.arange(height)]
+    return out.tobytes()
+
+
+def encode_png_parallel(image, workers=None, level=6, counter=None):
+    """
+    Encode a QImage or QPixmap to PNG bytes using several cores, like pigz:
+    horizontal strips are filtered and deflated concurrently (zlib and NumPy
+    release the GIL), each strip primed with the end of the previous one, and
+    the sync-flushed raw deflate streams are stitched into one zlib stream.
+    Without NumPy rows are stored unfiltered. The conversion to packed RGB(A)
+    is counted in counter (a BufferCounter) when one is given.
+    Returns (data, encode_ms), with data None on failure.
+    """
+    start = time.perf_counter()
+    if isinstance(image, QPixmap):
+        image = image.toImage()
+    if image.isNull():
+        return None, 0.0
+    
+    alpha = image.hasAlphaChannel()
+    image = image.convertToFormat(QImage.Format_RGBA8888 if alpha else QImage.Format_RGB888)
+    if counter is not None:
+        counter.copied(image)
+    width, height = image.width(), image.height()
+    bpp = 4 if alpha else 3
+    row_bytes = width * bpp
+    stride = image.bytesPerLine()
+    bits = image.constBits()
+    bits.setsize(stride * height)
+    pixels = memoryview(bits)
+    
+    rows_per_strip = max(1, PNG_STRIP_BYTES // row_bytes)
+    strips = [(y, min(rows_per_strip, height - y)) for y in range(0, height, rows_per_strip)]
+    if np is not None:
+        grid = np.frombuffer(pixels, dtype=np.uint8).reshape(height, stride)[:, :row_bytes]
+    
+    def filtered(strip):
+        y, count = strip
+        if np is None:
+            return b''.join(b'\0' + pixels[row * stride:row * stride + row_bytes]
+                            for row in range(y, y + count))
+        above = grid[y - 1] if y else np.zeros(row_bytes, dtype=np.uint8)
+        return _filter_png_rows(grid[y:y + count], above, bpp)
+    
+    def deflate(index):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15,
+                                      zdict=strip_data[index - 1][-PNG_WINDOW:] if index else b'')
+        last = index == len(strip_data) - 1
+        return (compressor.compress(strip_data[index])
+                + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH))
+    
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        strip_data = list(pool.map(filtered, strips))
+        compressed = list(pool.map(deflate, range(len(strip_data))))
+    
+    checksum = 1
+    for data in strip_data:
+        checksum = zlib.adler32(data, checksum)
+    # zlib header for 32K window, default compression; one IDAT chunk per strip
+    compressed[0] = b'\x78\x9c' + compressed[0]
+    compressed[-1] += struct.pack('>I', checksum)
+    
+    header = struct.pack('>IIBBBBB', width, height, 8, 6 if alpha else 2, 0, 0, 0)
+    parts = [PNG_SIGNATURE, _png_chunk(b'IHDR', header)]
+    parts.extend(_png_chunk(b'IDAT', data) for data in compressed)
+    parts.append(_png_chunk(b'IEND', b''))
+    return b''.join(parts), (time.perf_counter() - start) * 1000
+
+
+def encode_png(image, encoder='qt', counter=None):
+    """
+    Encode a QImage or QPixmap to PNG bytes in memory.
+    Safe to call from worker threads for QImages (Qt releases the GIL while encoding).
+    encoder is 'qt', 'parallel' (encode_png_parallel) or 'auto', which picks the
+    parallel encoder for large images on multi-core machines. Its pixel copy
+    is counted in counter (a BufferCounter) when one is given.
+    Returns (data, encode_ms), with data None on failure.
+    """
+    if encoder == 'auto':
+        large = image.width() * image.height() >= PARALLEL_PNG_MIN_PIXELS
+        encoder = 'parallel' if large and (os.cpu_count() or 1) > 1 else 'qt'
+    if encoder == 'parallel':
+        try:
+            return encode_png_parallel(image, counter=counter)
+        except Exception as e:
+            logger.warning(f"Parallel PNG encoding failed, using Qt: {e}")
+    start = time.perf_counter()
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    if not image.save(buffer, 'PNG'):
+        return None, 0.0
+    return bytes(buffer.data()), (time.perf_counter() - start) * 1000
+
+
+def make_benchmark_image(width, height):
+    """A screenshot-like test image: flat UI panels, text and a photo-like area"""
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(245, 246, 248))
+    painter = QPainter(image)
+    rng = random.Random(1)
+    for y in range(0, height, 48):
+        painter.fillRect(0, y, width, 40, QColor(255, 255, 255) if (y // 48) % 2 else QColor(232, 236, 241))
+        painter.setPen(QColor(30, 41, 59))
+        painter.drawText(16, y + 28, ' '.join(rng.choice(('capture', 'portrait', 'region', 'frame', 'video',
+                                                           'screen', 'pixel', 'settings', 'export'))
+                                              for _ in range(width // 60)))
+    painter.end()
+    # A noisy photo-like block in the middle, the part deflate finds hardest
+    if np is not None:
+        bits = image.bits()
+        bits.setsize(image.bytesPerLine() * height)
+        pixels = np.frombuffer(bits, dtype=np.uint32).reshape(height, image.bytesPerLine() // 4)
+        top, left = height // 3, width // 4
+        block = pixels[top:top + height // 3, left:left + width // 2]
+        noise = np.random.default_rng(1).integers(0, 24, size=block.shape, dtype=np.uint32)
+        ramp = (np.arange(block.shape[1], dtype=np.uint32) * 200 // block.shape[1])[np.newaxis, :]
+        block[:] = 0xff000000 | ((ramp + noise) << 16) | ((noise * 3) << 8) | (255 - ramp)
+    return image
+
+
+def benchmark_png_encoders(image=None, iterations=3, worker_counts=None):
+    """
+    Compare Qt's PNG encoder with the parallel encoder at several worker counts.
+    Checks that the parallel output decodes to the same pixels, and returns a
+    list of result dicts (best time of iterations per encoder).
+    """
+    if image is None:
+        image = make_benchmark_image(2160, 3840)
+    cores = os.cpu_count() or 1
+    if worker_counts is None:
+        worker_counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)) | {1})
+    
+    def best(encode):
+        times = []
+        for _ in range(iterations):
+            data, encode_ms = encode()
+            times.append(encode_ms)
+        return data, min(times)
+    
+    logger.info(f"Encoding {image.width()}x{image.height()} ({cores} cores, "
+                f"{'NumPy' if np is not None else 'no NumPy: unfiltered'} filters)")
+    qt_data, qt_ms = best(lambda: encode_png(image, 'qt'))
+    results = [{'encoder': 'qt', 'workers': 1, 'ms': qt_ms, 'bytes': len(qt_data), 'speedup': 1.0}]
+    logger.info(f"{'qt':>12}: {qt_ms:8.1f} ms  {len(qt_data):>10} bytes")
+    
+    expected = image.convertToFormat(QImage.Format_RGB888)
+    for workers in worker_counts:
+        data, ms = best(lambda: encode_png_parallel(image, workers))
+        decoded = QImage.fromData(data, 'PNG').convertToFormat(QImage.Format_RGB888)
+        if decoded != expected:
+            raise AssertionError(f"Parallel PNG with {workers} workers does not decode to the source image")
+        result = {'encoder': 'parallel', 'workers': workers, 'ms': ms, 'bytes': len(data),
+                  'speedup': qt_ms / ms}
+        results.append(result)
+        logger.info(f"{f'parallel x{workers}':>12}: {ms:8.1f} ms  {len(data):>10} bytes  "
+                    f"{result['speedup']:5.2f}x Qt speed  {len(data) / len(qt_data):5.2f}x Qt size")
+    return results
+
+
+# Default capture size per ratio mode
+DEFAULT_REGION_SIZES = {
+    '9:16': (607, 1080),
+    '16:9': (1920, 1080),
+}
+
+# In-progress writes; hidden and not matching any screenshot name pattern
+TEMP_SUFFIX = '.tmp'
+
+# Last sequence number given out per file prefix, kept in the save location so
+# that numbering is global across date shards and needs no folder scan
+SEQUENCE_STATE_FILE = '.portrait-sequence.json'
+
+FSYNC_POLICIES = ('none', 'file', 'file+dir', 'batch')
+
+
+def fsync_directory(directory):
+    """Make a rename in directory durable (no-op where directories cannot be opened)"""
+    if os.name == 'nt':
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.warning(f"Could not fsync directory {directory}: {e}")
+
+
+def remove_stale_temp_files(directory):
+    """Remove temp files left behind by writes that were interrupted, date shards included"""
+    stack = [directory]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.name.startswith('.') and entry.name.endswith(TEMP_SUFFIX) and entry.is_file():
+                        os.remove(entry.path)
+                        logger.info(f"Removed interrupted write: {entry.path}")
+                    elif not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except OSError:
+            pass
+
+
+def benchmark_write_policies(directory, count=200, size=500 * 1024):
+    """
+    Measure what each fsync policy costs on the storage holding directory.
+    Writes count files of size bytes per policy into a scratch subfolder
+    and removes them afterwards. Returns a list of result dicts.
+    """
+    payload = os.urandom(size)
+    rect = QRect(0, 0, 1, 1)
+    results = []
+    for policy in FSYNC_POLICIES:
+        scratch = tempfile.mkdtemp(prefix='.write-benchmark-', dir=directory)
+        try:
+            writer = CaptureWriter({'save_location': scratch, 'file_prefix': 'bench',
+                                    'fsync_policy': policy, 'fsync_batch_size': 10})
+            start = time.perf_counter()
+            for _ in range(count):
+                writer._write(writer.next_filepath(), payload, 0.0, rect)
+            writer.flush()
+            elapsed = time.perf_counter() - start
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        result = {
+            'policy': policy,
+            'captures_per_s': count / elapsed,
+            'ms_per_capture': elapsed / count * 1000,
+            'mb_per_s': count * size / elapsed / 1e6,
+        }
+        results.append(result)
+        logger.info(f"{policy:>8}: {result['captures_per_s']:8.1f} captures/s  "
+                    f"{result['ms_per_capture']:7.2f} ms/capture  {result['mb_per_s']:7.1f} MB/s")
+    return results
+
+
+CaptureResult = collections.namedtuple('CaptureResult',
+                                       ['filepath', 'data', 'rect', 'ratio_mode', 'timestamp'])
+
+
+class CaptureWriter:
+    """
+    Names, encodes and writes captured regions.
+    Shared by the interactive overlay and the IPC control server, and keeps
+    running statistics about the captures it has written.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.stats = {
+            'captures': 0,
+            'failures': 0,
+            'bytes_written': 0,
+            'last_encode_ms': 0.0,
+            'total_encode_ms': 0.0,
+            'last_filepath': None,
+            # Pixel buffers of the last capture, see BufferCounter
+            'last_allocations': 0,
+            'last_copies': 0,
+            'last_bytes_copied': 0,
+        }
+        # prefix -> last sequence number given out (SEQUENCE_STATE_FILE), and its mtime
+        self._sequence_state = None
+        self._sequence_state_mtime = None
+        self._last_stamp = None
+        self._stamp_counter = 0
+        # Batch fsync policy: (temp path, CaptureResult, label, encode_ms) not yet in place
+        self._pending_sync = []
+        self._batch_timer = None
+        # Called with each CaptureResult once its file is in place
+        self.listeners = []
+        # Set to a CaptureSpool to defer encoding; the spool's encoder thread also writes
+        self.spool = None
+        self._lock = threading.RLock()
+        remove_stale_temp_files(self.get_save_dir())
+
+    def get_save_dir(self):
+        return self.settings.get('save_location', 
+                                 os.path.join(os.path.expanduser('~'), 'Screenshots'))
+
+    def get_target_dir(self, when):
+        """
+        Directory for a capture taken at when. With shard_by_date the files go
+        into YYYY/MM/DD/ below the save location so no directory grows unbounded.
+        """
+        target_dir = self.get_save_dir()
+        if self.settings.get('shard_by_date', False):
+            target_dir = os.path.join(target_dir, when.strftime('%Y'), when.strftime('%m'),
+                                      when.strftime('%d'))
+        # Every time (a single stat once it exists): the folder may be deleted while we run
+        os.makedirs(target_dir, exist_ok=True)
+        return target_dir
+
+    def get_next_sequence_number(self, save_dir, prefix):
+        """
+        Scan the save directory (date shards included) for files matching the
+        prefix pattern and return the next sequence number.
+        Pattern: prefix1.png, prefix2.jpg, etc.
+        """
+        if not os.path.exists(save_dir):
+            return 1
+        
+        # Pattern to match: prefix followed by a number and a screenshot extension
+        extensions = '|'.join(re.escape(ext) for ext in CONVERT_FORMATS.values())
+        pattern = re.compile(rf'^{re.escape(prefix)}(\d+)({extensions})$', re.IGNORECASE)
+        
+        max_number = 0
+        try:
+            for entry in iter_screenshots(save_dir):
+                match = pattern.match(entry.name)
+                if match:
+                    number = int(match.group(1))
+                    max_number = max(max_number, number)
+        except Exception as e:
+            logger.warning(f"Error scanning directory for sequence numbers: {e}")
+        
+        return max_number + 1
+
+    def _sequence_state_path(self):
+        return os.path.join(self.get_save_dir(), SEQUENCE_STATE_FILE)
+
+    def _load_sequence_state(self):
+        """The per-prefix high-water marks, re-read only when another process changed them"""
+        path = self._sequence_state_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._sequence_state is None or mtime != self._sequence_state_mtime:
+            state = {}
+            if mtime is not None:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        state = {prefix: int(number) for prefix, number in json.load(f).items()}
+                except (OSError, ValueError, AttributeError, TypeError) as e:
+                    logger.warning(f"Ignoring unreadable sequence state {path}: {e}")
+                    state = {}
+            self._sequence_state = state
+            self._sequence_state_mtime = mtime
+        return self._sequence_state
+
+    def _save_sequence_state(self, state):
+        path = self._sequence_state_path()
+        tmp_path = f"{path}.{os.getpid()}{TEMP_SUFFIX}"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+            self._sequence_state_mtime = os.stat(path).st_mtime_ns
+        except OSError as e:
+            # Numbering still works for this run; the next start rescans
+            logger.warning(f"Could not save sequence state {path}: {e}")
+
+    def allocate_sequence_number(self, prefix):
+        """
+        Return the next sequence number for prefix from its persisted
+        high-water mark. Numbers are global across date shards and are never
+        reused, so deleting files (e.g. by retention) needs no rescan. The
+        library is only scanned the first time a prefix is used, or when the
+        state is lost or turned out to be behind (see _commit).
+        """
+        with self._lock:
+            state = self._load_sequence_state()
+            last = state.get(prefix)
+            if last is None:
+                last = self.get_next_sequence_number(self.get_save_dir(), prefix) - 1
+            state[prefix] = last + 1
+            self._save_sequence_state(state)
+            return last + 1
+
+    def next_filepath(self):
+        """Build the path for the next screenshot from the naming settings"""
+        return self.next_filepaths([None])[0]
+
+    def next_filepaths(self, labels):
+        """
+        Build paths for several screenshots taken at the same moment.
+        Sequential names get consecutive numbers; timestamp names get the
+        label (e.g. the region name) appended so they do not collide.
+        Names are unique within this process; _write still creates the files
+        exclusively in case another process picked the same name.
+        """
+        with self._lock:
+            now = datetime.now()
+            save_dir = self.get_target_dir(now)
+            
+            # Get the file prefix from settings
+            prefix = self.settings.get('file_prefix', '').strip()
+            
+            filepaths = []
+            # If prefix is empty, use timestamp with milliseconds (plus a counter within the same millisecond)
+            if not prefix:
+                stamp = now.strftime('%Y-%m-%d_%H-%M-%S') + f"-{now.microsecond // 1000:03d}"
+                if stamp == self._last_stamp:
+                    self._stamp_counter += 1
+                else:
+                    self._last_stamp = stamp
+                    self._stamp_counter = 0
+                if self._stamp_counter:
+                    stamp += f"-{self._stamp_counter}"
+                for label in labels:
+                    suffix = f"_{label.replace(':', 'x')}" if label else ''
+                    filepaths.append(os.path.join(save_dir, f"Portrait_{stamp}{suffix}.png"))
+            else:
+                # Use prefix with sequence number
+                for _ in labels:
+                    seq_number = self.allocate_sequence_number(prefix)
+                    filepaths.append(os.path.join(save_dir, f"{prefix}{seq_number}.png"))
+            
+            return filepaths
+
+    def _commit(self, tmp_path, filepath, label=None):
+        """
+        Atomically move a fully written temp file to its final name without
+        ever replacing an existing screenshot. On a clash the next name is tried.
+        Returns the final path.
+        """
+        for _ in range(100):
+            try:
+                # link() fails if the target exists, unlike rename() on POSIX
+                os.link(tmp_path, filepath)
+                os.unlink(tmp_path)
+                return filepath
+            except FileExistsError:
+                pass
+            except OSError:
+                # Filesystem without hard links (e.g. FAT): check, then rename
+                if not os.path.exists(filepath):
+                    os.replace(tmp_path, filepath)
+                    return filepath
+            logger.info(f"{filepath} already exists, picking the next name")
+            prefix = self.settings.get('file_prefix', '').strip()
+            if prefix:
+                # Files we did not number (another process, restored state): rescan once
+                with self._lock:
+                    self._load_sequence_state().pop(prefix, None)
+            filepath = self.next_filepaths([label])[0]
+        raise FileExistsError(f"Could not find a free file name near {filepath}")
+
+    def _sync(self, directory):
+        """Apply the fsync_policy to a file that was just committed"""
+        if self.settings.get('fsync_policy', 'none') == 'file+dir':
+            fsync_directory(directory)
+
+    def _hold_for_batch(self, tmp_path, result, label, encode_ms):
+        """
+        Batch policy: keep a written file under its temp name until the batch
+        boundary (fsync_batch_size captures, or fsync_batch_seconds after the
+        first one), where flush() makes the whole batch durable at once.
+        """
+        self._pending_sync.append((tmp_path, result, label, encode_ms))
+        if len(self._pending_sync) >= max(1, int(self.settings.get('fsync_batch_size', 10))):
+            self.flush()
+        elif self._batch_timer is None:
+            self._batch_timer = threading.Timer(float(self.settings.get('fsync_batch_seconds', 2.0)),
+                                                self.flush)
+            self._batch_timer.daemon = True
+            self._batch_timer.start()
+
+    def flush(self):
+        """
+        Finish the captures held back by the batch policy: fsync their temp
+        files, move them to their names, then fsync the directories. A crash
+        before this loses the batch (the temp files are removed at the next
+        start) but never leaves an empty or partial PNG under a real name.
+        """
+        with self._lock:
+            pending, self._pending_sync = self._pending_sync, []
+            if self._batch_timer is not None:
+                self._batch_timer.cancel()
+                self._batch_timer = None
+            for tmp_path, _, _, _ in pending:
+                try:
+                    fd = os.open(tmp_path, os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError as e:
+                    logger.warning(f"Could not fsync {tmp_path}: {e}")
+            committed = []
+            for tmp_path, result, label, encode_ms in pending:
+                try:
+                    filepath = self._commit(tmp_path, result.filepath, label)
+                except OSError as e:
+                    logger.error(f"Could not move {tmp_path} into place: {e}")
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    self.stats['failures'] += 1
+                    continue
+                committed.append((result._replace(filepath=filepath), encode_ms))
+            for directory in {os.path.dirname(result.filepath) for result, _ in committed}:
+                fsync_directory(directory)
+            for result, encode_ms in committed:
+                self._account(result, encode_ms)
+        for result, _ in committed:
+            self._notify(result)
+
+    def _account(self, result, encode_ms):
+        self.stats['captures'] += 1
+        self.stats['bytes_written'] += len(result.data)
+        self.stats['last_encode_ms'] = encode_ms
+        self.stats['total_encode_ms'] += encode_ms
+        self.stats['last_filepath'] = result.filepath
+
+    def _notify(self, result):
+        for listener in list(self.listeners):
+            try:
+                listener(result)
+            except Exception as e:
+                logger.error(f"Error in capture listener: {e}")
+
+    def note_buffers(self, counter):
+        """Record the buffer allocations and copies a capture needed"""
+        self.stats['last_allocations'] = counter.allocations
+        self.stats['last_copies'] = counter.copies
+        self.stats['last_bytes_copied'] = counter.bytes_copied
+        logger.info(f"Capture buffers: {counter.allocations} allocations, {counter.copies} copies "
+                    f"({counter.bytes_copied / (1024 * 1024):.1f} MB)")
+
+    def encode(self, image, counter=None):
+        """Encode with the png_encoder setting; see encode_png"""
+        return encode_png(image, self.settings.get('png_encoder', 'auto'), counter)
+
+    def _region_image(self, captured, rect, source_image):
+        """captured as a QImage, viewing into source_image instead of converting where possible"""
+        if isinstance(captured, QImage):
+            return captured
+        if source_image is not None:
+            return crop_image_view(source_image, rect)
+        return captured.toImage()
+
+    def _run_hooks(self, captured, rect, filepath, source_image, ratio_mode):
+        """Hand the region to in-process consumers before encoding"""
+        if not _capture_hooks:
+            return
+        if ratio_mode is None:
+            ratio_mode = self.settings.get('ratio_mode', '9:16')
+        image = self._region_image(captured, rect, source_image)
+        dispatch_capture_hooks(CapturedFrame(image, rect, ratio_mode,
+                                             filepath=filepath, source=source_image))
+
+    def _write(self, filepath, data, encode_ms, rect, label=None, ratio_mode=None):
+        """
+        Write encoded bytes and account for them in the statistics.
+        The bytes go to a hidden temp file in the same directory which is then
+        moved into place, so a crash or full disk never leaves a truncated PNG
+        under a real screenshot name. Under the batch fsync policy the move
+        waits for the batch boundary (see flush); the result then names the
+        file before it appears.
+        """
+        directory = os.path.dirname(filepath)
+        tmp_path = os.path.join(directory, f".{os.path.basename(filepath)}.{os.getpid()}{TEMP_SUFFIX}")
+        policy = self.settings.get('fsync_policy', 'none')
+        with self._lock:
+            try:
+                # The folder may have been removed since the name was picked (e.g. spooled captures)
+                os.makedirs(directory, exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    if policy in ('file', 'file+dir'):
+                        f.flush()
+                        os.fsync(f.fileno())
+                if policy != 'batch':
+                    filepath = self._commit(tmp_path, filepath, label)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            result = CaptureResult(filepath, data, QRect(rect),
+                                   ratio_mode or label or self.settings.get('ratio_mode', '9:16'),
+                                   time.time())
+            if policy == 'batch':
+                self._hold_for_batch(tmp_path, result, label, encode_ms)
+                return result
+            self._sync(directory)
+            self._account(result, encode_ms)
+        
+        self._notify(result)
+        return result
+
+    def save(self, captured, rect, source_image=None, ratio_mode=None, defer=True, counter=None):
+        """
+        Run capture hooks, encode captured (a QPixmap of rect) to PNG and write it.
+        source_image is the full-desktop image captured was cropped from; hooks get
+        a view into it instead of a converted copy when it is given.
+        With a spool (and defer) the raw pixels are spooled instead and the returned
+        CaptureResult has no data yet; its file appears once the spool is drained.
+        Without defer the file is in place when this returns, even under the
+        batch fsync policy (the pending batch is flushed).
+        Pixel copies on the way are counted in counter (a BufferCounter).
+        Returns a CaptureResult, or None when encoding failed.
+        """
+        filepath = self.next_filepath()
+        self._run_hooks(captured, rect, filepath, source_image, ratio_mode)
+        
+        if defer and self.spool is not None:
+            return self.spool.append(self._region_image(captured, rect, source_image), rect,
+                                     filepath, ratio_mode or self.settings.get('ratio_mode', '9:16'),
+                                     counter)
+        
+        data, encode_ms = self.encode(captured, counter)
+        if data is None:
+            self.stats['failures'] += 1
+            return None
+        result = self._write(filepath, data, encode_ms, rect, ratio_mode=ratio_mode)
+        if not defer:
+            self.flush()
+        return result
+
+    def save_many(self, crops, regions, source_image=None, counter=None):
+        """
+        Save several named regions cropped from one frame.
+        crops maps a region name (its ratio mode) to its QImage and regions maps
+        it to its QRect. source_image is the frame the crops view into, if any.
+        The crops are encoded in parallel; pixel copies are counted in counter.
+        Returns {name: CaptureResult or None}.
+        """
+        names = list(regions)
+        filepaths = self.next_filepaths(names)
+        
+        # Each crop is only read by its own encoder thread
+        for name, filepath in zip(names, filepaths):
+            self._run_hooks(crops[name], regions[name], filepath, source_image, name)
+        
+        if self.spool is not None:
+            return {name: self.spool.append(crops[name], regions[name], filepath, name, counter)
+                    for name, filepath in zip(names, filepaths)}
+        
+        workers = min(len(names), os.cpu_count() or 1)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            encoded = list(pool.map(lambda image: self.encode(image, counter),
+                                    [crops[name] for name in names]))
+        
+        results = {}
+        for name, filepath, (data, encode_ms) in zip(names, filepaths, encoded):
+            if data is None:
+                self.stats['failures'] += 1
+                results[name] = None
+            else:
+                results[name] = self._write(filepath, data, encode_ms, regions[name], name)
+        return results
+
+
+class CaptureSpool:
+    """
+    Append-only spool of raw captured regions for deferred encoding.
+    capture time only copies the cropped scanlines into a memory-mapped file;
+    a low-priority thread encodes them to their final PNGs once the machine is
+    idle (or when drain() is called). Records are kept until their PNG is in
+    place, so captures not yet encoded survive a quit or crash and are picked
+    up again on the next start.
+    """
+
+    MAGIC = b'PSPL'
+    # magic, state, reserved, QImage format, width, height, bytes per row,
+    # x, y, w, h of the region, timestamp, path length, ratio mode length
+    HEADER = struct.Struct('<4sBBHIIIiiiidHH')
+    WRITING, PENDING, DONE = 0, 1, 2
+    GROWTH = 64 * 1024 * 1024
+
+    def __init__(self, path, writer, idle_seconds=3.0, max_bytes=1024 * 1024 * 1024):
+        self.path = path
+        self.writer = writer
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self.stats = {'spooled': 0, 'encoded': 0, 'failures': 0}
+        self._condition = threading.Condition()
+        self._map = None
+        self._size = 0
+        self._end = 0
+        self._pending = collections.deque()
+        self._last_append = 0.0
+        self._draining = False
+        self._stopping = False
+        self._closed = False  # close() was called
+        self._exited = False  # The encoder thread has returned
+        self._retry_at = 0.0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name='CaptureSpool', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _align(n):
+        return (n + 7) & ~7
+
+    def _remap(self, size):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        os.ftruncate(self._fd, size)
+        self._size = size
+        if size:
+            self._map = mmap.mmap(self._fd, size)
+
+    def _recover(self):
+        """Find the records a previous session spooled but did not encode"""
+        size = os.fstat(self._fd).st_size
+        if not size:
+            return
+        self._remap(size)
+        offset = 0
+        while offset + self.HEADER.size <= size:
+            header = self.HEADER.unpack_from(self._map, offset)
+            if header[0] != self.MAGIC or header[1] == self.WRITING:
+                break  # End of the spool, or a record torn by a crash
+            length = self._record_length(header)
+            if offset + length > size:
+                break
+            if header[1] == self.PENDING:
+                self._pending.append(offset)
+            offset += length
+        self._end = offset
+        if self._pending:
+            logger.info(f"Spool {self.path} holds {len(self._pending)} captures to encode")
+        else:
+            self._remap(0)
+            self._end = 0
+
+    def _record_length(self, header):
+        height, row_bytes, path_len, ratio_len = header[5], header[6], header[12], header[13]
+        return self._align(self.HEADER.size + path_len + ratio_len) + self._align(height * row_bytes)
+
+    def append(self, image, rect, filepath, ratio_mode, counter=None):
+        """
+        Spool the scanlines of image (the pixels of rect) to be saved as filepath.
+        The copy into the spool is counted in counter (a BufferCounter) if given.
+        Returns a CaptureResult without data, or None for an empty image.
+        """
+        if image.isNull() or image.width() == 0 or image.height() == 0:
+            logger.error(f"Not spooling empty capture {filepath}")
+            with self._condition:
+                self.stats['failures'] += 1
+            return None
+        row_bytes = (image.width() * image.depth() + 31) // 32 * 4
+        height = image.height()
+        path_data = filepath.encode('utf-8')
+        ratio_data = ratio_mode.encode('utf-8')
+        timestamp = time.time()
+        header = (self.MAGIC, self.WRITING, 0, int(image.format()), image.width(), height,
+                  row_bytes, rect.x(), rect.y(), rect.width(), rect.height(), timestamp,
+                  len(path_data), len(ratio_data))
+        length = self._record_length(header)
+        
+        stride = image.bytesPerLine()
+        bits = image.constBits()
+        bits.setsize(stride * (height - 1) + min(row_bytes, stride))
+        source = memoryview(bits)
+        
+        with self._condition:
+            offset = self._end
+            # Room for the record plus the terminator that marks the end of the spool
+            needed = offset + length + self.HEADER.size
+            if needed > self._size:
+                self._remap((needed + self.GROWTH - 1) // self.GROWTH * self.GROWTH)
+            spool = memoryview(self._map)
+            try:
+                self.HEADER.pack_into(self._map, offset, *header)
+                names = offset + self.HEADER.size
+                spool[names:names + len(path_data)] = path_data
+                spool[names + len(path_data):names + len(path_data) + len(ratio_data)] = ratio_data
+                pixels = offset + self._align(self.HEADER.size + len(path_data) + len(ratio_data))
+                copy_bytes = min(row_bytes, stride)
+                if stride == row_bytes:
+                    spool[pixels:pixels + len(source)] = source
+                else:
+                    for row in range(height):
+                        start = pixels + row * row_bytes
+                        spool[start:start + copy_bytes] = source[row * stride:row * stride + copy_bytes]
+            finally:
+                spool.release()
+            # Mark the record complete only once its pixels are in place
+            self._map[offset + 4] = self.PENDING
+            self._end = offset + length
+            self._map[self._end:self._end + 4] = b'\0\0\0\0'
+            if self.writer.settings.get('fsync_policy', 'none') != 'none':
+                self._map.flush()
+            self._pending.append(offset)
+            self._last_append = time.monotonic()
+            self.stats['spooled'] += 1
+            self._condition.notify_all()
+        
+        if counter is not None:
+            counter.copied(image, allocated=False)  # Into the mapped spool file
+        return CaptureResult(filepath, None, QRect(rect), ratio_mode, timestamp)
+
+    def pending(self):
+        with self._condition:
+            return len(self._pending)
+
+    def size(self):
+        """Bytes currently used by spooled records"""
+        with self._condition:
+            return self._end
+
+    def drain(self, wait=False, timeout=None):
+        """Encode everything spooled now instead of waiting for the machine to be idle"""
+        with self._condition:
+            self._draining = True
+            self._retry_at = 0.0
+            self._condition.notify_all()
+            if wait:
+                self._condition.wait_for(lambda: not self._pending, timeout)
+            return len(self._pending)
+
+    def _idle(self, now):
+        """Whether background encoding may run now"""
+        if now < self._retry_at:
+            return False
+        if self._draining or self._end >= self.max_bytes:
+            return True
+        if now - self._last_append < self.idle_seconds:
+            return False
+        if hasattr(os, 'getloadavg'):
+            return os.getloadavg()[0] < 0.5 * (os.cpu_count() or 1)
+        return True
+
+    def _read(self, offset):
+        """Copy one record out of the spool: (QImage, rect, filepath, ratio_mode)"""
+        header = self.HEADER.unpack_from(self._map, offset)
+        (_, _, _, image_format, width, height, row_bytes,
+         x, y, w, h, _, path_len, ratio_len) = header
+        names = offset + self.HEADER.size
+        filepath = bytes(self._map[names:names + path_len]).decode('utf-8')
+        ratio_mode = bytes(self._map[names + path_len:names + path_len + ratio_len]).decode('utf-8')
+        pixels = offset + self._align(self.HEADER.size + path_len + ratio_len)
+        data = bytes(self._map[pixels:pixels + height * row_bytes])
+        # copy() so the QImage owns its pixels rather than viewing data
+        image = QImage(data, width, height, row_bytes, QImage.Format(image_format)).copy()
+        return image, QRect(x, y, w, h), filepath, ratio_mode
+
+    def _run(self):
+        # Encoding is background work: give way to everything else on the machine
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            with self._condition:
+                while not self._stopping and not (self._pending and self._idle(time.monotonic())):
+                    self._condition.wait(1.0)
+                if self._stopping:
+                    self._exited = True
+                    if self._closed:
+                        # close() stopped waiting for us: the spool is ours to release
+                        self._release()
+                    return
+                offset = self._pending[0]
+                image, rect, filepath, ratio_mode = self._read(offset)
+            
+            data, encode_ms = self.writer.encode(image)
+            if data is not None:
+                try:
+                    self.writer._write(filepath, data, encode_ms, rect, ratio_mode=ratio_mode)
+                except OSError as e:
+                    # Keep the record (e.g. disk full) and try again later
+                    logger.error(f"Could not write spooled capture {filepath}: {e}")
+                    with self._condition:
+                        self._retry_at = time.monotonic() + 30.0
+                    continue
+            
+            with self._condition:
+                if data is None:
+                    logger.error(f"Could not encode spooled capture {filepath}, dropping it")
+                    self.stats['failures'] += 1
+                else:
+                    self.stats['encoded'] += 1
+                self._map[offset + 4] = self.DONE
+                self._pending.popleft()
+                if not self._pending:
+                    # Everything is encoded: give the disk space back
+                    self._remap(0)
+                    self._end = 0
+                    self._draining = False
+                self._condition.notify_all()
+
+    def _release(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+        os.close(self._fd)
+
+    def close(self, timeout=2.0):
+        """
+        Stop encoding after the current record; whatever is still spooled is
+        encoded in the next session. Waits at most timeout for that record:
+        if it takes longer, the encoder thread releases the spool once done.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join(timeout=timeout)
+        with self._condition:
+            self._closed = True
+            if self._exited:
+                self._release()
+            else:
+                logger.info("Spool encoder still busy, it will close the spool when done")
+
+
+def get_spool_path(settings):
+    return settings.get('spool_path') or os.path.join(os.path.expanduser('~'),
+                                                      '.portrait_screenshot_spool')
+
+
+# Formats screenshots are saved or converted to (--convert), with their extensions
+CONVERT_FORMATS = {'png': '.png', 'jpg': '.jpg', 'webp': '.webp'}
+
+
+def iter_screenshots(directory, extensions=tuple(CONVERT_FORMATS.values())):
+    """
+    Every screenshot (file with one of extensions) below directory, date
+    shards included, as an os.DirEntry, streamed with os.scandir so huge
+    folders are never listed at once.
+    """
+    stack = [directory]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    # Hidden names are temp files still being written
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(extensions) and entry.is_file(follow_symlinks=False):
+                        yield entry
+        except OSError as e:
+            logger.warning(f"Could not scan a folder below {directory}: {e}")
+
+
+TIMESTAMP_NAME = re.compile(r'^Portrait_\d{4}-\d{2}-\d{2}_')
+
+
+def retention_group(filename):
+    """
+    Name prefix a screenshot belongs to for keep-latest-per-prefix:
+    'Portrait_' for timestamp names, the prefix for sequential ones.
+    """
+    if TIMESTAMP_NAME.match(filename):
+        return 'Portrait_'
+    return re.sub(r'\d+$', '', os.path.splitext(filename)[0])
+
+
+class RetentionPruner:
+    """
+    Keeps the screenshot folder within a retention policy: maximum age,
+    maximum total size, maximum number of files and/or only the latest N
+    files per name prefix. A low-priority thread walks the folder (including
+    date shards) in short time slices with pauses in between, so a folder with
+    hundreds of thousands of files never holds up a capture. The newest file
+    of every prefix is always kept.
+    """
+
+    def __init__(self, directory, max_age_days=0, max_total_mb=0, max_count=0, keep_per_prefix=0,
+                 interval=3600.0, slice_seconds=0.02, pause_seconds=0.05, background=True):
+        self.directory = directory
+        self.max_age = max_age_days * 86400.0
+        self.max_bytes = int(max_total_mb * 1024 * 1024)
+        self.max_count = max_count
+        self.keep_per_prefix = keep_per_prefix
+        self.interval = interval
+        self.slice_seconds = slice_seconds
+        self.pause_seconds = pause_seconds
+        self.stats = {'passes': 0, 'scanned': 0, 'removed': 0, 'bytes_freed': 0,
+                      'last_pass_s': 0.0, 'kept': 0, 'kept_bytes': 0}
+        # Called with the list of paths removed in each slice
+        self.listeners = []
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_settings(cls, directory, settings, background=True):
+        """A pruner for the retention_* settings, or None when no limit is set"""
+        limits = {
+            'max_age_days': float(settings.get('retention_max_age_days', 0) or 0),
+            'max_total_mb': float(settings.get('retention_max_total_mb', 0) or 0),
+            'max_count': int(settings.get('retention_max_count', 0) or 0),
+            'keep_per_prefix': int(settings.get('retention_keep_per_prefix', 0) or 0),
+        }
+        if not any(limits.values()):
+            return None
+        return cls(directory, interval=float(settings.get('retention_interval_minutes', 60)) * 60,
+                   background=background, **limits)
+
+    def prune_now(self):
+        """Start a pass now instead of waiting for the interval"""
+        self._wake.set()
+
+    def _slices(self, items):
+        """Yield items, pausing whenever the current time slice is used up"""
+        deadline = time.monotonic() + self.slice_seconds
+        for item in items:
+            if self._stopping:
+                return
+            yield item
+            if time.monotonic() >= deadline:
+                time.sleep(self.pause_seconds)
+                deadline = time.monotonic() + self.slice_seconds
+
+    def select(self, files, now):
+        """
+        Paths to remove from files, a list of (mtime, size, path, group).
+        Newest files are kept first; the newest of each group is always kept.
+        """
+        files = sorted(files, reverse=True)
+        newest = set()
+        per_group = collections.Counter()
+        count = total = 0
+        doomed = []
+        for mtime, size, path, group in files:
+            per_group[group] += 1
+            if group not in newest:
+                newest.add(group)
+                keep = True
+            else:
+                keep = not (
+                    (self.max_age and now - mtime > self.max_age)
+                    or (self.keep_per_prefix and per_group[group] > self.keep_per_prefix)
+                    or (self.max_count and count >= self.max_count)
+                    or (self.max_bytes and total + size > self.max_bytes))
+            if keep:
+                count += 1
+                total += size
+            else:
+                doomed.append((path, size))
+        self.stats['kept'] = count
+        self.stats['kept_bytes'] = total
+        return doomed
+
+    def run_pass(self):
+        """Walk the folder once and remove what the policy no longer keeps"""
+        started = time.monotonic()
+        files = []
+        for entry in self._slices(iter_screenshots(self.directory)):
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path, retention_group(entry.name)))
+        if self._stopping:
+            return
+        self.stats['scanned'] = len(files)
+        
+        removed = []
+        for path, size in self._slices(self.select(files, time.time())):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Retention: could not remove {path}: {e}")
+                continue
+            removed.append(path)
+            self.stats['removed'] += 1
+            self.stats['bytes_freed'] += size
+            if len(removed) >= 100:
+                self._notify(removed)
+                removed = []
+        self._notify(removed)
+        self.stats['passes'] += 1
+        self.stats['last_pass_s'] = time.monotonic() - started
+        logger.info(f"Retention pass over {len(files)} screenshots took {self.stats['last_pass_s']:.1f}s, "
+                    f"{self.stats['removed']} removed so far")
+
+    def _notify(self, removed):
+        if not removed:
+            return
+        for listener in self.listeners:
+            try:
+                listener(removed)
+            except Exception as e:
+                logger.error(f"Retention listener {listener!r} failed: {e}")
+
+    def _run(self):
+        # Pruning is background work: give way to capturing and everything else
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        # Let startup finish before the first pass
+        self._wake.wait(10.0)
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                self.run_pass()
+            except Exception as e:
+                logger.error(f"Retention pass failed: {e}")
+            self._wake.wait(self.interval)
+
+    def close(self):
+        """Stop after the current time slice"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+
+class HttpExportSink:
+    """
+    Upload each screenshot with an HTTP PUT or POST of the raw PNG bytes.
+    The file name is sent percent-encoded in the X-Filename header.
+    Config: {"type": "http", "url": "https://host/shots/{filename}",
+             "method": "PUT", "headers": {...}}
+    """
+    type = 'http'
+
+    def __init__(self, config):
+        self.name = config.get('name', self.type)
+        self.url = config['url']
+        self.method = config.get('method', 'PUT').upper()
+        self.headers = dict(config.get('headers', {}))
+
+    def build_request(self, filepath, data):
+        """Return (method, url, headers) for uploading data"""
+        filename = os.path.basename(filepath)
+        url = self.url.replace('{filename}', urllib.parse.quote(filename))
+        # Header values must be ASCII (http.client encodes them as Latin-1)
+        headers = {'Content-Type': 'image/png', 'X-Filename': urllib.parse.quote(filename)}
+        headers.update(self.headers)
+        return self.method, url, headers
+
+
+class S3ExportSink:
+    """
+    PUT each screenshot into an S3-compatible bucket (path-style, AWS Signature V4).
+    Config: {"type": "s3", "endpoint": "https://s3.example.com", "bucket": "shots",
+             "region": "us-east-1", "access_key": "...", "secret_key": "...", "prefix": "portrait/"}
+    """
+    type = 's3'
+
+    def __init__(self, config):
+        self.name = config.get('name', self.type)
+        self.endpoint = config['endpoint'].rstrip('/')
+        self.bucket = config['bucket']
+        self.region = config.get('region', 'us-east-1')
+        self.access_key = config['access_key']
+        self.secret_key = config['secret_key']
+        self.prefix = config.get('prefix', '')
+
+    def _sign(self, key, message):
+        return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+    def build_request(self, filepath, data):
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        date = now.strftime('%Y%m%d')
+        
+        parsed = urllib.parse.urlsplit(self.endpoint)
+        key = self.prefix + os.path.basename(filepath)
+        path = '/' + '/'.join(urllib.parse.quote(part, safe='-_.~')
+                              for part in [self.bucket] + key.split('/'))
+        payload_hash = hashlib.sha256(data).hexdigest()
+        
+        canonical_headers = (f"host:{parsed.netloc}\n"
+                             f"x-amz-content-sha256:{payload_hash}\n"
+                             f"x-amz-date:{amz_date}\n")
+        signed_headers = 'host;x-amz-content-sha256;x-amz-date'
+        canonical_request = f"PUT\n{path}\n\n{canonical_headers}\n{signed_headers}\n{payload_hash}"
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = (f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+                          f"{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}")
+        
+        signing_key = self._sign(('AWS4' + self.secret_key).encode('utf-8'), date)
+        for part in (self.region, 's3', 'aws4_request'):
+            signing_key = self._sign(signing_key, part)
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        
+        headers = {
+            'Host': parsed.netloc,
+            'Content-Type': 'image/png',
+            'x-amz-date': amz_date,
+            'x-amz-content-sha256': payload_hash,
+            'Authorization': (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                              f"SignedHeaders={signed_headers}, Signature={signature}"),
+        }
+        return 'PUT', f"{parsed.scheme}://{parsed.netloc}{path}", headers
+
+
+EXPORT_SINK_TYPES = {
+    HttpExportSink.type: HttpExportSink,
+    S3ExportSink.type: S3ExportSink,
+}
+
+
+class ExportManager:
+    """
+    Uploads saved screenshots to the configured export sinks in the background.
+    Jobs run on a small worker pool whose threads keep persistent keep-alive
+    connections. Every job is recorded in the queue directory before it runs and
+    removed once it succeeds, so failed or interrupted uploads survive restarts
+    and are retried with exponential backoff.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.sinks = {}
+        for index, config in enumerate(settings.get('export_sinks', [])):
+            sink_class = EXPORT_SINK_TYPES.get(config.get('type'))
+            if sink_class is None:
+                logger.warning(f"Unknown export sink type: {config.get('type')}")
+                continue
+            config = dict(config)
+            config.setdefault('name', f"{config['type']}-{index}")
+            self.sinks[config['name']] = sink_class(config)
+        
+        self.queue_dir = settings.get('export_queue_dir') or os.path.join(
+            os.path.expanduser('~'), '.portrait_screenshot_exports')
+        self.failed_dir = os.path.join(self.queue_dir, 'failed')
+        os.makedirs(self.failed_dir, exist_ok=True)
+        
+        self.max_attempts = int(settings.get('export_max_attempts', 8))
+        self.backoff_base = float(settings.get('export_backoff_base', 2.0))
+        self.backoff_max = float(settings.get('export_backoff_max', 3600.0))
+        self.timeout = float(settings.get('export_timeout', 30.0))
+        
+        self.stats = {'uploaded': 0, 'failed_attempts': 0, 'given_up': 0, 'bytes_uploaded': 0}
+        self._stats_lock = threading.Lock()  # Updated from the worker pool threads
+        self._local = threading.local()
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, int(settings.get('export_workers', 2))),
+            thread_name_prefix='export')
+        self._retry_heap = []
+        self._condition = threading.Condition()
+        self._running = True
+        self._scheduler = threading.Thread(target=self._schedule_retries, name='export-retry',
+                                           daemon=True)
+        self._scheduler.start()
+        self._load_queue()
+
+    def _job_path(self, job):
+        return os.path.join(self.queue_dir, f"{job['id']}.json")
+
+    def _persist(self, job):
+        path = self._job_path(job)
+        tmp_path = path + TEMP_SUFFIX
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _load_queue(self):
+        """Reschedule jobs left over from earlier sessions"""
+        remove_stale_temp_files(self.queue_dir)
+        for entry in os.scandir(self.queue_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path) as f:
+                    job = json.load(f)
+                self._schedule(job)
+            except Exception as e:
+                logger.warning(f"Dropping unreadable export job {entry.path}: {e}")
+                os.remove(entry.path)
+
+    def submit(self, result):
+        """Queue a CaptureResult for every sink; the encoded bytes are reused for the first attempt"""
+        for sink_name in self.sinks:
+            job = {'id': uuid.uuid4().hex, 'sink': sink_name, 'filepath': result.filepath,
+                   'attempts': 0, 'next_attempt': time.time()}
+            self._persist(job)
+            self._pool.submit(self._run_job, job, result.data)
+
+    def _schedule(self, job):
+        with self._condition:
+            heapq.heappush(self._retry_heap, (job['next_attempt'], job['id'], job))
+            self._condition.notify()
+
+    def _schedule_retries(self):
+        """Hand due retry jobs to the worker pool; sleeps until the next one is due"""
+        while True:
+            with self._condition:
+                while self._running and (not self._retry_heap or
+                                         self._retry_heap[0][0] > time.time()):
+                    timeout = self._retry_heap[0][0] - time.time() if self._retry_heap else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                _, _, job = heapq.heappop(self._retry_heap)
+            self._pool.submit(self._run_job, job, None)
+
+    def _run_job(self, job, data):
+        sink = self.sinks.get(job['sink'])
+        if sink is None:
+            logger.warning(f"Export sink {job['sink']} no longer configured, dropping job")
+            self._remove(job)
+            return
+        try:
+            if data is None:
+                with open(job['filepath'], 'rb') as f:
+                    data = f.read()
+            method, url, headers = sink.build_request(job['filepath'], data)
+            self._send(method, url, headers, data)
+        except FileNotFoundError:
+            logger.warning(f"{job['filepath']} was removed before it could be exported")
+            self._remove(job)
+            return
+        except Exception as e:
+            self._on_failure(job, e)
+            return
+        with self._stats_lock:
+            self.stats['uploaded'] += 1
+            self.stats['bytes_uploaded'] += len(data)
+        logger.info(f"Exported {job['filepath']} to {sink.name}")
+        self._remove(job)
+
+    def _on_failure(self, job, error):
+        with self._stats_lock:
+            self.stats['failed_attempts'] += 1
+        job['attempts'] += 1
+        job['last_error'] = str(error)
+        if job['attempts'] >= self.max_attempts:
+            logger.error(f"Giving up exporting {job['filepath']} to {job['sink']}: {error}")
+            os.replace(self._job_path(job), os.path.join(self.failed_dir, f"{job['id']}.json"))
+            with self._stats_lock:
+                self.stats['given_up'] += 1
+            return
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (job['attempts'] - 1))
+        delay *= random.uniform(0.8, 1.2)  # Jitter, so retries after an outage do not stampede
+        job['next_attempt'] = time.time() + delay
+        logger.warning(f"Export of {job['filepath']} to {job['sink']} failed ({error}), "
+                       f"retry {job['attempts']} in {delay:.0f}s")
+        self._persist(job)
+        self._schedule(job)
+
+    def _remove(self, job):
+        try:
+            os.remove(self._job_path(job))
+        except FileNotFoundError:
+            pass
+
+    def _connection(self, scheme, netloc):
+        """Keep-alive connection of the current worker thread for scheme://netloc"""
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        key = (scheme, netloc)
+        if key not in connections:
+            connection_class = (http.client.HTTPSConnection if scheme == 'https'
+                                else http.client.HTTPConnection)
+            connections[key] = connection_class(netloc, timeout=self.timeout)
+        return connections[key]
+
+    def _drop_connection(self, scheme, netloc):
+        connection = self._local.connections.pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+
+    def _send(self, method, url, headers, body):
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        
+        # A pooled connection may have been closed by the server while idle: retry once on a fresh one
+        for attempt in range(2):
+            connection = self._connection(parsed.scheme, parsed.netloc)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response_body = response.read()  # Drain so the connection can be reused
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self._drop_connection(parsed.scheme, parsed.netloc)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self._drop_connection(parsed.scheme, parsed.netloc)
+                raise
+            if response.will_close:
+                self._drop_connection(parsed.scheme, parsed.netloc)
+            if not 200 <= response.status < 300:
+                raise RuntimeError(f"HTTP {response.status} {response.reason}: {response_body[:200]!r}")
+            return
+
+    def pending(self):
+        """Number of jobs waiting in the queue directory"""
+        return sum(1 for entry in os.scandir(self.queue_dir) if entry.name.endswith('.json'))
+
+    def shutdown(self):
+        """Stop scheduling; queued jobs stay on disk for the next session"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._pool.shutdown(wait=False)
+
+
+def read_png_size(path):
+    """Width and height from a PNG's IHDR chunk, or (None, None) if it is not a PNG"""
+    with open(path, 'rb') as f:
+        header = f.read(24)
+    if len(header) < 24 or header[:8] != b'\x89PNG\r\n\x1a\n':
+        return None, None
+    return int.from_bytes(header[16:20], 'big'), int.from_bytes(header[20:24], 'big')
+
+
+def read_image_size(path):
+    """Width and height of an image file from its header, or (None, None) if unreadable"""
+    width, height = read_png_size(path)
+    if width is None:
+        size = QImageReader(path).size()
+        if size.isValid():
+            width, height = size.width(), size.height()
+    return width, height
+
+
+class CaptureCatalog:
+    """
+    SQLite catalog of captures (path, time, region, ratio mode, format, size,
+    SHA-256), for history and statistics without walking the screenshot folder.
+    Rows are hashed and inserted in batches by a background thread, and deleted
+    again when retention or conversion removes their files; queries use their
+    own connection (WAL mode allows both at once).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS captures (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            timestamp REAL NOT NULL,
+            x INTEGER, y INTEGER, width INTEGER, height INTEGER,
+            ratio_mode TEXT,
+            format TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            sha256 TEXT
+        );
+        CREATE INDEX IF NOT EXISTS captures_timestamp ON captures (timestamp);
+        CREATE INDEX IF NOT EXISTS captures_region ON captures (x, y, width, height, timestamp);
+    """
+    INSERT = """
+        INSERT OR IGNORE INTO captures
+            (path, timestamp, x, y, width, height, ratio_mode, format, size, sha256)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    def __init__(self, path, batch_size=50, flush_interval=2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        with self._connect() as connection:
+            connection.executescript(self.SCHEMA)
+        self._thread = threading.Thread(target=self._run, name='catalog', daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def add(self, result):
+        """Queue a CaptureResult (CaptureWriter listener); never blocks the caller"""
+        self._queue.put(result)
+
+    def submit(self, function):
+        """
+        Run function on the writer thread, after the rows queued before it.
+        Returns a concurrent.futures.Future of its result.
+        """
+        future = concurrent.futures.Future()
+        self._queue.put((future, function))
+        return future
+
+    def _row(self, result):
+        rect = result.rect
+        return (os.path.abspath(result.filepath), result.timestamp,
+                rect.x(), rect.y(), rect.width(), rect.height(), result.ratio_mode,
+                os.path.splitext(result.filepath)[1].lstrip('.').lower() or 'png',
+                len(result.data), hashlib.sha256(result.data).hexdigest())
+
+    def _run(self):
+        connection = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                # Collect more rows for a while so they share one transaction
+                deadline = time.monotonic() + self.flush_interval
+                while isinstance(item, CaptureResult) and len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+                
+                rows = [self._row(result) for result in batch if isinstance(result, CaptureResult)]
+                if rows:
+                    try:
+                        with connection:
+                            connection.executemany(self.INSERT, rows)
+                    except sqlite3.Error as e:
+                        logger.error(f"Error writing {len(rows)} catalog rows: {e}")
+                if batch[-1] is None:
+                    return
+                if not isinstance(batch[-1], CaptureResult):
+                    future, function = batch[-1]
+                    if future.set_running_or_notify_cancel():
+                        try:
+                            future.set_result(function())
+                        except Exception as e:
+                            future.set_exception(e)
+        finally:
+            connection.close()
+
+    def record_conversions(self, conversions):
+        """
+        Point rows at converted files (convert_library listener); conversions
+        is a list of (source, target, size, sha256). The target takes over the
+        source's row, or gets a copy of it while the source still exists.
+        """
+        try:
+            with closing(self._connect()) as connection, connection:
+                for source, target, size, digest in conversions:
+                    source, target = os.path.abspath(source), os.path.abspath(target)
+                    fmt = os.path.splitext(target)[1].lstrip('.').lower()
+                    connection.execute(
+                        "INSERT OR REPLACE INTO captures "
+                        "(path, timestamp, x, y, width, height, ratio_mode, format, size, sha256) "
+                        "SELECT ?, timestamp, x, y, width, height, ratio_mode, ?, ?, ? "
+                        "FROM captures WHERE path = ?",
+                        (target, fmt, size, digest, source))
+                    if source != target and not os.path.exists(source):
+                        connection.execute('DELETE FROM captures WHERE path = ?', (source,))
+        except sqlite3.Error as e:
+            logger.error(f"Error updating {len(conversions)} catalog rows after conversion: {e}")
+
+    def forget(self, paths):
+        """Delete the rows of files that no longer exist (RetentionPruner listener)"""
+        try:
+            with closing(self._connect()) as connection, connection:
+                connection.executemany('DELETE FROM captures WHERE path = ?',
+                                       [(os.path.abspath(path),) for path in paths])
+        except sqlite3.Error as e:
+            logger.error(f"Error removing {len(paths)} catalog rows: {e}")
+
+    def close(self):
+        """Write out what is queued and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join(10)
+
+    def query(self, since=None, until=None, region=None, limit=1000):
+        """
+        Captures newest first. since/until are Unix timestamps; region is a
+        QRect or (x, y, width, height) to match exactly.
+        """
+        clauses, params = [], []
+        if since is not None:
+            clauses.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('timestamp < ?')
+            params.append(until)
+        if region is not None:
+            if isinstance(region, QRect):
+                region = (region.x(), region.y(), region.width(), region.height())
+            clauses.append('x = ? AND y = ? AND width = ? AND height = ?')
+            params.extend(region)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with closing(self._connect()) as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                f"SELECT * FROM captures {where} ORDER BY timestamp DESC LIMIT ?",
+                params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def totals(self, since=None, until=None):
+        """Number and total bytes of captures in a time range"""
+        with closing(self._connect()) as connection:
+            count, size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM captures "
+                "WHERE timestamp >= ? AND timestamp < ?",
+                (since if since is not None else 0, until if until is not None else 1e12)).fetchone()
+        return {'captures': count, 'bytes': size}
+
+    def rebuild(self, directory):
+        """
+        Add every screenshot below directory (any of CONVERT_FORMATS) that is
+        not in the catalog yet, e.g. files saved before the catalog existed or
+        converted by --convert. Region positions are unknown for them.
+        Returns the number of rows added.
+        """
+        added = 0
+        with closing(self._connect()) as connection:
+            known = {row[0] for row in connection.execute('SELECT path FROM captures')}
+            batch = []
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = [name for name in dirs if not name.startswith('.')]
+                for name in files:
+                    fmt = os.path.splitext(name)[1].lstrip('.').lower()
+                    if fmt not in CONVERT_FORMATS or name.startswith('.'):
+                        continue
+                    path = os.path.abspath(os.path.join(root, name))
+                    if path in known:
+                        continue
+                    try:
+                        stat = os.stat(path)
+                        width, height = read_image_size(path)
+                        digest = hashlib.sha256()
+                        with open(path, 'rb') as f:
+                            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                                digest.update(chunk)
+                    except OSError as e:
+                        logger.warning(f"Skipping {path}: {e}")
+                        continue
+                    ratio_mode = None
+                    if width and height:
+                        ratio_mode = '9:16' if width < height else '16:9'
+                    batch.append((path, stat.st_mtime, None, None, width, height, ratio_mode,
+                                  fmt, stat.st_size, digest.hexdigest()))
+                    if len(batch) >= 500:
+                        with connection:
+                            connection.executemany(self.INSERT, batch)
+                        added += len(batch)
+                        batch = []
+            if batch:
+                with connection:
+                    connection.executemany(self.INSERT, batch)
+                added += len(batch)
+        logger.info(f"Catalog rebuild added {added} captures from {directory}")
+        return added
+
+
+def get_catalog_path(settings):
+    return settings.get('catalog_path') or os.path.join(os.path.expanduser('~'),
+                                                        '.portrait_screenshot_catalog.sqlite3')
+
+
+def convert_capture(source, target, fmt, quality=90, level=9, max_size=0):
+    """
+    Re-encode one screenshot (process pool worker). Writes a hidden temp file
+    next to target and moves it into place atomically, with the source's
+    modification time so age-based retention keeps working. A PNG rewritten
+    in place is only replaced when the result is smaller.
+    Returns (source, status, bytes in, bytes out, SHA-256 of the new file, error).
+    """
+    size_in = os.path.getsize(source)
+    image = QImage(source)
+    if image.isNull():
+        return source, 'failed', size_in, 0, None, "not a readable image"
+    if max_size and max(image.width(), image.height()) > max_size:
+        image = image.scaled(max_size, max_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
     
-    def __init__(self, hotkey):
-        super().__init__()
-        self.hotkey = hotkey
-        self.is_running = False
-        self.daemon = True
+    if fmt == 'png':
+        try:
+            data, _ = encode_png_parallel(image, workers=1, level=level)
+        except Exception:
+            data, _ = encode_png(image)
+    else:
+        if fmt == 'jpg' and image.hasAlphaChannel():
+            # JPEG has no alpha: flatten onto white rather than black
+            flat = QImage(image.size(), QImage.Format_RGB32)
+            flat.fill(Qt.white)
+            painter = QPainter(flat)
+            painter.drawImage(0, 0, image)
+            painter.end()
+            image = flat
+        buffer = QBuffer()
+        buffer.open(QIODevice.WriteOnly)
+        data = bytes(buffer.data()) if image.save(buffer, fmt.upper(), quality) else None
+    if not data:
+        return source, 'failed', size_in, 0, None, f"could not encode {fmt}"
     
-    def run(self):
+    if os.path.abspath(source) == os.path.abspath(target) and len(data) >= size_in:
+        return source, 'kept', size_in, size_in, None, None
+    
+    stat = os.stat(source)
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp creates the file 0600; keep the original's permissions and time
+        os.chmod(tmp_path, stat.st_mode & 0o7777)
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, target)
+    except BaseException:
         try:
-            self.is_running = True
-            logger.info(f"Hotkey thread started for: {self.hotkey}")
-            keyboard.add_hotkey(self.hotkey, self._on_hotkey)
-            # Keep thread alive
-            while self.is_running:
-                time.sleep(0.1)
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return source, 'converted', size_in, len(data), hashlib.sha256(data).hexdigest(), None
+
+
+def convert_library(root, fmt='png', output=None, quality=90, level=9, max_size=0,
+                    workers=None, replace=False, checkpoint=None, report=None, converted=None):
+    """
+    Re-encode every screenshot below root in a process pool sized to the
+    cores: to another format (fmt 'jpg' or 'webp'), or to PNG at another
+    compression level, optionally downscaled to max_size pixels. Results go
+    next to the originals (replace removes an original once its converted
+    copy is in place) or into the mirror tree output.
+    Finished files are appended to a checkpoint file named after the options,
+    so an interrupted run resumes where it stopped, even after runs with other
+    options in between. report(stats) is called about every two seconds;
+    converted([(source, target, size, sha256)]) after each batch of written
+    files (e.g. CaptureCatalog.record_conversions). Returns the statistics.
+    """
+    if fmt not in CONVERT_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(CONVERT_FORMATS)}")
+    root = os.path.abspath(root)
+    output = os.path.abspath(output) if output else None
+    workers = workers or os.cpu_count() or 1
+    options = json.dumps({'root': root, 'format': fmt, 'output': output, 'quality': quality,
+                          'level': level, 'max_size': max_size}, sort_keys=True)
+    options_id = hashlib.sha256(options.encode('utf-8')).hexdigest()[:12]
+    checkpoint = checkpoint or os.path.join(output or root, f".portrait-convert-checkpoint-{options_id}")
+    
+    done = set()
+    if os.path.exists(checkpoint):
+        with open(checkpoint, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        if lines and lines[0] == options:
+            done.update(lines[1:])
+        else:
+            logger.info(f"Checkpoint {checkpoint} was written with other options, starting over")
+    if not done:
+        os.makedirs(os.path.dirname(checkpoint), exist_ok=True)
+        with open(checkpoint, 'w', encoding='utf-8') as f:
+            f.write(options + '\n')
+    
+    stats = {'converted': 0, 'kept': 0, 'skipped': len(done), 'failed': 0,
+             'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0, 'files_per_s': 0.0, 'mb_per_s': 0.0}
+    started = time.monotonic()
+    last_report = started
+    
+    def update_rates():
+        stats['seconds'] = time.monotonic() - started
+        processed = stats['converted'] + stats['kept'] + stats['failed']
+        stats['files_per_s'] = processed / max(stats['seconds'], 1e-9)
+        stats['mb_per_s'] = stats['bytes_in'] / 1e6 / max(stats['seconds'], 1e-9)
+    
+    def tasks():
+        # Sources are the PNGs the app saves, never converted copies from an earlier run
+        for entry in iter_screenshots(root, ('.png',)):
+            relative = os.path.relpath(entry.path, root)
+            if relative in done:
+                continue
+            base = os.path.splitext(relative)[0] + CONVERT_FORMATS[fmt]
+            target = os.path.join(output, base) if output else os.path.join(root, base)
+            yield relative, entry.path, target
+    
+    # spawn: forked children would inherit Qt and hotkey threads in an unknown state
+    context = multiprocessing.get_context('spawn')
+    with open(checkpoint, 'a', encoding='utf-8') as log, \
+            concurrent.futures.ProcessPoolExecutor(workers, mp_context=context) as pool:
+        pending = {}
+        queued = tasks()
+        exhausted = False
+        while True:
+            # Stream the tree: never more than a few files per worker in flight
+            while not exhausted and len(pending) < workers * 4:
+                task = next(queued, None)
+                if task is None:
+                    exhausted = True
+                    break
+                relative, source, target = task
+                future = pool.submit(convert_capture, source, target, fmt, quality, level, max_size)
+                pending[future] = (relative, source, target)
+            if not pending:
+                break
+            finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            written = []
+            for future in finished:
+                relative, source, target = pending.pop(future)
+                try:
+                    _, status, size_in, size_out, digest, error = future.result()
+                except Exception as e:
+                    status, size_in, size_out, digest, error = 'failed', 0, 0, None, str(e)
+                stats[status] += 1
+                stats['bytes_in'] += size_in
+                stats['bytes_out'] += size_out if status != 'failed' else size_in
+                if status == 'failed':
+                    logger.warning(f"Could not convert {source}: {error}")
+                    continue
+                if replace and status == 'converted' and not output and target != source:
+                    os.remove(source)
+                if status == 'converted':
+                    written.append((source, target, size_out, digest))
+                log.write(relative + '\n')
+            log.flush()
+            if written and converted is not None:
+                converted(written)
+            if report is not None and time.monotonic() - last_report >= 2.0:
+                last_report = time.monotonic()
+                update_rates()
+                report(stats)
+    update_rates()
+    return stats
+
+
+def grab_desktop_region(backend, rect, counter=None):
+    """
+    Grab rect (global desktop coordinates) without opening the overlay.
+    A region spanning several screens is composed from one grab per screen.
+    Pixel copies are counted in counter (a BufferCounter) when one is given.
+    """
+    screens = [screen for screen in QApplication.screens() if screen.geometry().intersects(rect)]
+    if not screens:
+        raise ValueError(f"Region {rect.x()},{rect.y()} {rect.width()}x{rect.height()} is off-screen")
+    
+    if len(screens) == 1 and screens[0].geometry().contains(rect):
+        return backend.grab(screens[0], rect, counter)
+    
+    pixmap = QPixmap(rect.width(), rect.height())
+    pixmap.fill(Qt.black)
+    painter = QPainter(pixmap)
+    for screen in screens:
+        part = screen.geometry().intersected(rect)
+        painter.drawPixmap(part.x() - rect.x(), part.y() - rect.y(), backend.grab(screen, part, counter))
+    painter.end()
+    if counter is not None:
+        counter.copied(pixmap)
+    return pixmap
+
+
+# Side of the grey thumbnail watch mode compares; each of its pixels averages one block of the region
+WATCH_THUMBNAIL = 64
+
+
+def luma_thumbnail(image, size=WATCH_THUMBNAIL, excluded=()):
+    """
+    image reduced to a size x size grey thumbnail, the signature watch mode
+    compares. Smooth scaling averages every pixel of a block into its
+    thumbnail pixel, which also evens out dithering and noise. Rectangles in
+    excluded (image coordinates) are blanked, rounded outwards to whole blocks.
+    """
+    thumbnail = image.scaled(size, size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    thumbnail = thumbnail.convertToFormat(QImage.Format_RGB32)
+    if excluded:
+        width, height = max(1, image.width()), max(1, image.height())
+        painter = QPainter(thumbnail)
+        for area in excluded:
+            left, top = area.x() * size // width, area.y() * size // height
+            right = -(-(area.x() + area.width()) * size // width)
+            bottom = -(-(area.y() + area.height()) * size // height)
+            painter.fillRect(QRect(left, top, right - left, bottom - top), Qt.black)
+        painter.end()
+    return thumbnail.convertToFormat(QImage.Format_Grayscale8)
+
+
+def changed_cells(old, new, cell_delta=4):
+    """
+    Fraction of the pixels of two luma thumbnails (luma_thumbnail) that differ
+    by more than cell_delta grey levels, i.e. of the region's blocks whose
+    average luminance changed. 1.0 when there is nothing to compare with.
+    """
+    if old is None or old.size() != new.size():
+        return 1.0
+    width, height = new.width(), new.height()
+    stride = new.bytesPerLine()
+    old_data, new_data = old.constBits().asstring(old.byteCount()), new.constBits().asstring(new.byteCount())
+    if old_data == new_data:
+        return 0.0
+    changed = 0
+    for row in range(height):
+        start = row * stride
+        old_row, new_row = old_data[start:start + width], new_data[start:start + width]
+        if old_row != new_row:
+            changed += sum(1 for a, b in zip(old_row, new_row) if abs(a - b) > cell_delta)
+    return changed / (width * height)
+
+
+class RegionWatcher(QObject):
+    """
+    Watch mode: captures a region whenever its content changes.
+    Each sample grabs the region and compares a 64 x 64 grey thumbnail of it
+    (luma_thumbnail) with the thumbnail of the last saved frame; only when
+    more than threshold of the thumbnail's pixels changed (changed_cells) is
+    the grab (already at full resolution) saved through the normal
+    CaptureWriter path. Areas returned by excluded() (global rectangles, e.g.
+    this app's own window) are left out of the comparison.
+    Samples run on the GUI thread from a QTimer and are skipped while another
+    capture is running.
+    """
+
+    captured = pyqtSignal(object)  # CaptureResult
+    sampled = pyqtSignal()
+
+    def __init__(self, writer, backend, rect, ratio_mode, interval_ms=500, threshold=0.001,
+                 cell_delta=4, paused=None, excluded=None, parent=None):
+        super().__init__(parent)
+        self.writer = writer
+        self.backend = backend
+        self.rect = rect
+        self.ratio_mode = ratio_mode
+        self.threshold = threshold
+        self.cell_delta = cell_delta
+        self.paused = paused
+        self.excluded = excluded
+        self.stats = {'samples': 0, 'captures': 0, 'skipped': 0, 'failures': 0, 'last_change': 0.0,
+                      'sample_rate': 0.0, 'cpu_percent': 0.0, 'last_sample_ms': 0.0}
+        self._reference = None  # Thumbnail of the last saved frame
+        self._failing = False
+        # Samples and CPU time since the rate was last computed
+        self._window_start = time.monotonic()
+        self._window_samples = 0
+        self._window_cpu = 0.0
+        self._timer = QTimer(self)
+        self._timer.setInterval(max(50, int(interval_ms)))
+        self._timer.timeout.connect(self.sample)
+
+    def start(self):
+        # The first sample always saves, so later ones compare with a frame on disk
+        self._reference = None
+        self._window_start = time.monotonic()
+        self._window_samples = 0
+        self._window_cpu = 0.0
+        self._timer.start()
+        logger.info(f"Watching {self.rect.width()}x{self.rect.height()} at "
+                    f"{self.rect.x()},{self.rect.y()} every {self._timer.interval()} ms")
+
+    def stop(self):
+        self._timer.stop()
+
+    def is_running(self):
+        return self._timer.isActive()
+
+    def _signature(self, pixmap):
+        """The grab's thumbnail, with the excluded areas that fall inside it blanked"""
+        image = pixmap.toImage()
+        excluded = self.excluded() if self.excluded is not None else []
+        areas = [QRect(area).translated(-self.rect.topLeft()).intersected(image.rect())
+                 for area in excluded]
+        return luma_thumbnail(image, excluded=[area for area in areas if not area.isEmpty()])
+    
+    def sample(self):
+        """Grab and compare once; save the grab if it changed enough"""
+        if self.paused is not None and self.paused():
+            self.stats['skipped'] += 1
+            return
+        started = time.monotonic()
+        cpu_started = time.thread_time()
+        try:
+            buffers = BufferCounter()
+            pixmap = grab_desktop_region(self.backend, self.rect, buffers)
+            if pixmap.isNull():
+                raise RuntimeError("the screen grab came back empty")
+            signature = self._signature(pixmap)
+            change = changed_cells(self._reference, signature, cell_delta=self.cell_delta)
+            if change > self.threshold:
+                result = self.writer.save(pixmap, self.rect, ratio_mode=self.ratio_mode, counter=buffers)
+                self.writer.note_buffers(buffers)
+                if result is not None:
+                    self._reference = signature
+                    self.stats['captures'] += 1
+                    self.stats['last_change'] = change
+                    self.captured.emit(result)
+            self._failing = False
         except Exception as e:
-            logger.error(f"Error in hotkey thread: {e}")
+            self.stats['failures'] += 1
+            # Log once per run of failures rather than at the sampling rate
+            if not self._failing:
+                logger.error(f"Watch sample failed: {e}")
+            self._failing = True
+        
+        self.stats['samples'] += 1
+        self.stats['last_sample_ms'] = (time.monotonic() - started) * 1000
+        self._window_samples += 1
+        self._window_cpu += time.thread_time() - cpu_started
+        elapsed = time.monotonic() - self._window_start
+        if elapsed >= 2.0:
+            self.stats['sample_rate'] = self._window_samples / elapsed
+            self.stats['cpu_percent'] = 100.0 * self._window_cpu / elapsed
+            self._window_start = time.monotonic()
+            self._window_samples = 0
+            self._window_cpu = 0.0
+            self.sampled.emit()
+
+
+WindowInfo = collections.namedtuple('WindowInfo', ['wid', 'title', 'wm_class', 'rect'])
+
+
+class WindowFinder:
+    """
+    Base class for listing the top-level windows of other applications.
+    windows() returns WindowInfo tuples from bottom to top of the stacking
+    order; rect is the client area in global desktop coordinates.
+    """
+    name = 'base'
+
+    @classmethod
+    def is_available(cls):
+        return False
+
+    def windows(self):
+        raise NotImplementedError
+
+
+class X11WindowFinder(WindowFinder):
+    """Client windows of an EWMH window manager (_NET_CLIENT_LIST_STACKING)"""
+    name = 'x11'
+
+    ANY_PROPERTY_TYPE = 0
+
+    _x11 = None
+    # A window can disappear while we look at it; the default handler would exit on
+    # BadWindow. Kept on the class so it outlives handler chains that point to it
+    _error_handler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p,
+                                      ctypes.c_void_p)(lambda display, error_event: 0)
+
+    @classmethod
+    def _load_x11(cls):
+        if cls._x11 is None:
+            path = ctypes.util.find_library('X11')
+            if not path:
+                raise OSError("libX11 not found")
+            x11 = ctypes.CDLL(path)
+            x11.XOpenDisplay.restype = ctypes.c_void_p
+            x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+            x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+            x11.XDefaultRootWindow.restype = ctypes.c_ulong
+            x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+            x11.XInternAtom.restype = ctypes.c_ulong
+            x11.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+            x11.XGetWindowProperty.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong,
+                                               ctypes.c_long, ctypes.c_long, ctypes.c_int,
+                                               ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong),
+                                               ctypes.POINTER(ctypes.c_int),
+                                               ctypes.POINTER(ctypes.c_ulong),
+                                               ctypes.POINTER(ctypes.c_ulong),
+                                               ctypes.POINTER(ctypes.c_void_p)]
+            x11.XFree.argtypes = [ctypes.c_void_p]
+            x11.XGetGeometry.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                         ctypes.POINTER(ctypes.c_ulong),
+                                         ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                         ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint),
+                                         ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint)]
+            x11.XTranslateCoordinates.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong,
+                                                  ctypes.c_int, ctypes.c_int,
+                                                  ctypes.POINTER(ctypes.c_int),
+                                                  ctypes.POINTER(ctypes.c_int),
+                                                  ctypes.POINTER(ctypes.c_ulong)]
+            x11.XSetErrorHandler.restype = ctypes.c_void_p
+            x11.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+            cls._x11 = x11
+        return cls._x11
+
+    @classmethod
+    def is_available(cls):
+        if not sys.platform.startswith('linux') or not os.environ.get('DISPLAY'):
+            return False
+        if QApplication.instance() is not None and QApplication.platformName() != 'xcb':
+            return False
+        try:
+            return cls._load_x11() is not None
+        except OSError:
+            return False
+
+    def __init__(self):
+        self.x11 = self._load_x11()
+
+    def _property(self, display, window, name):
+        """A window property: bytes for 8-bit formats, a list of ints for 32-bit ones"""
+        atom = self.x11.XInternAtom(display, name, 1)
+        if not atom:
+            return None
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        count = ctypes.c_ulong()
+        remaining = ctypes.c_ulong()
+        data = ctypes.c_void_p()
+        status = self.x11.XGetWindowProperty(display, window, atom, 0, 65536, 0,
+                                             self.ANY_PROPERTY_TYPE, ctypes.byref(actual_type),
+                                             ctypes.byref(actual_format), ctypes.byref(count),
+                                             ctypes.byref(remaining), ctypes.byref(data))
+        if status != 0 or not data.value:
+            return None
+        try:
+            if actual_format.value == 8:
+                return ctypes.string_at(data.value, count.value)
+            if actual_format.value == 32:
+                # Xlib hands out 32-bit items as C longs
+                return list((ctypes.c_ulong * count.value).from_address(data.value))
+            return None
         finally:
-            logger.info("Hotkey thread ended")
-    
-    def _on_hotkey(self):
-        """Emit signal when hotkey is pressed"""
-        self.hotkey_triggered.emit()
+            self.x11.XFree(data)
+
+    def _text(self, display, window, *names):
+        for name in names:
+            value = self._property(display, window, name)
+            if isinstance(value, bytes):
+                return ' '.join(part.decode('utf-8', 'replace') for part in value.split(b'\0') if part)
+        return ''
+
+    def _geometry(self, display, root, window):
+        """Client area of window in root coordinates, or None if it is gone"""
+        parent = ctypes.c_ulong()
+        x, y = ctypes.c_int(), ctypes.c_int()
+        width, height = ctypes.c_uint(), ctypes.c_uint()
+        border, depth = ctypes.c_uint(), ctypes.c_uint()
+        if not self.x11.XGetGeometry(display, window, ctypes.byref(parent), ctypes.byref(x),
+                                     ctypes.byref(y), ctypes.byref(width), ctypes.byref(height),
+                                     ctypes.byref(border), ctypes.byref(depth)):
+            return None
+        child = ctypes.c_ulong()
+        if not self.x11.XTranslateCoordinates(display, window, root, 0, 0, ctypes.byref(x),
+                                              ctypes.byref(y), ctypes.byref(child)):
+            return None
+        return QRect(x.value, y.value, width.value, height.value)
+
+    def windows(self):
+        display = self.x11.XOpenDisplay(None)
+        if not display:
+            raise OSError("Cannot open X display")
+        previous_handler = self.x11.XSetErrorHandler(ctypes.cast(self._error_handler, ctypes.c_void_p))
+        try:
+            root = self.x11.XDefaultRootWindow(display)
+            clients = (self._property(display, root, b'_NET_CLIENT_LIST_STACKING')
+                       or self._property(display, root, b'_NET_CLIENT_LIST') or [])
+            hidden = self.x11.XInternAtom(display, b'_NET_WM_STATE_HIDDEN', 1)
+            found = []
+            for wid in clients:
+                # Minimized windows have nothing on screen to grab
+                if hidden and hidden in (self._property(display, wid, b'_NET_WM_STATE') or []):
+                    continue
+                rect = self._geometry(display, root, wid)
+                if rect is None or rect.isEmpty():
+                    continue
+                found.append(WindowInfo(wid, self._text(display, wid, b'_NET_WM_NAME', b'WM_NAME'),
+                                        self._text(display, wid, b'WM_CLASS'), rect))
+            return found
+        finally:
+            self.x11.XSetErrorHandler(previous_handler)
+            self.x11.XCloseDisplay(display)
+
+
+class Win32WindowFinder(WindowFinder):
+    """Visible, non-minimized top-level windows from EnumWindows"""
+    name = 'win32'
+
+    @classmethod
+    def is_available(cls):
+        return sys.platform == 'win32'
+
+    def windows(self):
+        from ctypes import wintypes
+        user32 = ctypes.windll.user32
+        found = []
+
+        def visit(hwnd, _):
+            if not user32.IsWindowVisible(hwnd) or user32.IsIconic(hwnd):
+                return True
+            length = user32.GetWindowTextLengthW(hwnd)
+            if not length:
+                return True
+            title = ctypes.create_unicode_buffer(length + 1)
+            user32.GetWindowTextW(hwnd, title, length + 1)
+            class_name = ctypes.create_unicode_buffer(256)
+            user32.GetClassNameW(hwnd, class_name, 256)
+            client = wintypes.RECT()
+            origin = wintypes.POINT(0, 0)
+            user32.GetClientRect(hwnd, ctypes.byref(client))
+            user32.ClientToScreen(hwnd, ctypes.byref(origin))
+            rect = QRect(origin.x, origin.y, client.right, client.bottom)
+            if not rect.isEmpty():
+                found.append(WindowInfo(hwnd, title.value, class_name.value, rect))
+            return True
+
+        callback = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)(visit)
+        user32.EnumWindows(callback, 0)
+        # EnumWindows walks from the top of the stacking order down
+        found.reverse()
+        return found
+
+
+WINDOW_FINDERS = (X11WindowFinder, Win32WindowFinder)
+
+
+def list_windows():
+    """Top-level windows bottom to top, or [] where windows cannot be enumerated"""
+    for finder_class in WINDOW_FINDERS:
+        if finder_class.is_available():
+            return finder_class().windows()
+    return []
+
+
+def find_window(title=None, wm_class=None, point=None, windows=None):
+    """
+    The topmost window whose title (or, failing that, class) contains title,
+    whose class contains wm_class and which contains point; all case-insensitive
+    and optional. Returns a WindowInfo or None.
+    """
+    if windows is None:
+        windows = list_windows()
+    candidates = [window for window in reversed(windows)
+                  if (not wm_class or wm_class.lower() in window.wm_class.lower())
+                  and (point is None or window.rect.contains(point))]
+    if not title:
+        return candidates[0] if candidates else None
+    text = title.lower()
+    for field in ('title', 'wm_class'):
+        for window in candidates:
+            if text in getattr(window, field).lower():
+                return window
+    return None
+
+
+WINDOW_FIT_MODES = ('none', 'crop', 'pad')
+
+
+def fit_rect_to_ratio(rect, ratio_mode, fit='crop'):
+    """
+    Centre a rect with the aspect ratio of ratio_mode ('9:16' or '16:9') on rect:
+    the largest one inside it for 'crop', the smallest one around it for 'pad'.
+    """
+    if fit not in ('crop', 'pad'):
+        return QRect(rect)
+    ratio_w, ratio_h = (int(part) for part in ratio_mode.split(':'))
+    width, height = rect.width(), rect.height()
+    too_wide = width * ratio_h > height * ratio_w
+    if fit == 'crop':
+        if too_wide:
+            width = height * ratio_w // ratio_h
+        else:
+            height = width * ratio_h // ratio_w
+    else:
+        if too_wide:
+            height = -(-width * ratio_h // ratio_w)
+        else:
+            width = -(-height * ratio_w // ratio_h)
+    return QRect(rect.x() + (rect.width() - width) // 2, rect.y() + (rect.height() - height) // 2,
+                 width, height)
+
+
+def grab_window(backend, window, ratio_mode, fit='none', counter=None):
+    """
+    Grab only the area of window, cropped to ratio_mode or letterboxed (black
+    bars) to it depending on fit. The Qt backend reads the window itself with
+    grabWindow(winId, ...); other backends grab its area of the screen.
+    Returns (pixmap, rect) with rect the captured area in global coordinates.
+    Pixel copies are counted in counter (a BufferCounter) when one is given.
+    """
+    rect = fit_rect_to_ratio(window.rect, ratio_mode, 'crop' if fit == 'crop' else 'none')
+    pixmap = None
+    screen = QApplication.screenAt(rect.center())
+    if isinstance(backend, QtGrabBackend) and screen is not None:
+        pixmap = screen.grabWindow(window.wid, rect.x() - window.rect.x(),
+                                   rect.y() - window.rect.y(), rect.width(), rect.height())
+    if pixmap is None or pixmap.isNull():
+        pixmap = grab_desktop_region(backend, rect, counter)
     
+    if fit == 'pad':
+        padded = fit_rect_to_ratio(rect, ratio_mode, 'pad')
+        canvas = QPixmap(padded.size())
+        canvas.fill(Qt.black)
+        painter = QPainter(canvas)
+        painter.drawPixmap(rect.topLeft() - padded.topLeft(), pixmap)
+        painter.end()
+        if counter is not None:
+            counter.copied(canvas)
+        return canvas, padded
+    return pixmap, rect
+
+
+def grab_all_screens(backend):
+    """Grab every screen now: {screen name: QPixmap}, for overlays opened later"""
+    return {screen.name(): backend.grab(screen) for screen in QApplication.screens()}
+
+
+class FrameGrabBackend(GrabBackend):
+    """Serves grabs from a frame taken earlier (grab_all_screens) instead of the screen"""
+    name = 'frame'
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def grab(self, screen, rect=None, counter=None):
+        pixmap = self.frame[screen.name()]
+        if rect is None:
+            return pixmap
+        pixmap = pixmap.copy(rect.translated(-screen.geometry().topLeft()))
+        if counter is not None:
+            counter.copied(pixmap)
+        return pixmap
+
+
+CAPTURE_QUEUE_POLICIES = ('drop', 'coalesce', 'queue')
+
+
+class CaptureRequest:
+    """One capture trigger: what to capture, when it was asked for, and its early grab"""
+
+    def __init__(self, kind, pressed_at):
+        self.kind = kind  # 'overlay' or 'window'
+        self.pressed_at = pressed_at
+        self.frame = None
+        self.grabbed_at = None
+
+
+class CaptureRequestQueue:
+    """
+    Admission control between capture triggers (hotkeys, tray, IPC) and their
+    execution. Only one request runs at a time, e.g. while an overlay is open;
+    what happens to requests arriving meanwhile depends on the policy:
+      drop      - they are discarded
+      coalesce  - at most one waits per kind, a newer press replaces it
+                  (and no more than max_pending in total)
+      queue     - up to max_pending wait, later ones are discarded
+    A waiting request grabs the screen as soon as it is admitted, so it shows
+    the moment of the press rather than the moment it gets its turn (unless
+    grab returns None or fails; it then grabs when it runs).
+    """
+
+    def __init__(self, execute, grab, policy='coalesce', max_pending=3):
+        # execute(request) returns True while the request keeps running (call finished() after)
+        self.execute = execute
+        self.grab = grab
+        self.policy = policy if policy in CAPTURE_QUEUE_POLICIES else 'coalesce'
+        self.max_pending = max(1, max_pending)
+        self.busy = False
+        self.pending = collections.deque()
+        self.stats = {
+            'requests': 0,
+            'executed': 0,
+            'dropped': 0,
+            'coalesced': 0,
+            'max_depth': 0,
+            'last_latency_ms': 0.0,  # Press to grab
+        }
+
+    def submit(self, kind, pressed_at=None):
+        """Admit, coalesce, queue or drop a request made at pressed_at (time.monotonic())"""
+        request = CaptureRequest(kind, time.monotonic() if pressed_at is None else pressed_at)
+        self.stats['requests'] += 1
+        if not self.busy and not self.pending:
+            self._execute(request)
+            return
+        
+        if self.policy == 'drop':
+            self.stats['dropped'] += 1
+            logger.info(f"Capture busy, dropped {kind} request")
+            return
+        if self.policy == 'coalesce':
+            for index, queued in enumerate(self.pending):
+                if queued.kind == kind:
+                    self._grab(request)
+                    self.pending[index] = request
+                    self.stats['coalesced'] += 1
+                    logger.info(f"Capture busy, coalesced {kind} request")
+                    return
+        if len(self.pending) >= self.max_pending:
+            self.stats['dropped'] += 1
+            logger.info(f"Capture queue full, dropped {kind} request")
+            return
+        
+        self._grab(request)
+        self.pending.append(request)
+        self.stats['max_depth'] = max(self.stats['max_depth'], len(self.pending))
+
+    def _grab(self, request):
+        try:
+            request.frame = self.grab(request)
+            if request.frame is None:
+                return  # Grabbed when the request runs
+            request.grabbed_at = time.monotonic()
+            self.stats['last_latency_ms'] = (request.grabbed_at - request.pressed_at) * 1000
+        except Exception as e:
+            # Grab again when the request runs
+            logger.error(f"Early grab for {request.kind} request failed: {e}")
+
+    def _execute(self, request):
+        self.busy = True
+        self.stats['executed'] += 1
+        if request.grabbed_at is None:
+            self.stats['last_latency_ms'] = (time.monotonic() - request.pressed_at) * 1000
+        try:
+            running = self.execute(request)
+        except Exception as e:
+            logger.error(f"Error executing {request.kind} request: {e}")
+            running = False
+        if not running:
+            self.finished()
+
+    def finished(self):
+        """The running request is done; start the next one from the event loop"""
+        if not self.busy:
+            return
+        self.busy = False
+        if self.pending:
+            QTimer.singleShot(0, self._next)
+
+    def _next(self):
+        if not self.busy and self.pending:
+            self._execute(self.pending.popleft())
+
+    def depth(self):
+        return len(self.pending)
+
+
+def get_ipc_socket_path():
+    """Path of the control socket (per user, in the runtime directory when available)"""
+    if os.environ.get('PORTRAIT_SCREENSHOT_SOCKET'):
+        return os.environ['PORTRAIT_SCREENSHOT_SOCKET']
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+    return os.path.join(runtime_dir, f'portrait-screenshot-{user}.sock')
+
+
+def send_ipc_request(request, socket_path=None, timeout=10.0):
+    """
+    Send one request to a running instance and return its decoded response,
+    or None if no instance is listening. A running instance that does not
+    answer in time, or answers with something that is not a JSON line, gives
+    an error response ({"ok": false, "error": ...}). Uses plain sockets so
+    that a client does not need to start Qt.
+    """
+    if not hasattr(socket, 'AF_UNIX') or os.name != 'posix':
+        return None
+    socket_path = socket_path or get_ipc_socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    try:
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        reply = bytearray()
+        while not reply.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            reply.extend(chunk)
+        if not reply:
+            return {'ok': False, 'error': "The running instance closed the connection without replying"}
+        response = json.loads(reply.decode('utf-8'))
+        if not isinstance(response, dict):
+            raise ValueError(f"unexpected reply {response!r}")
+        return response
+    except socket.timeout:
+        return {'ok': False, 'error': f"No reply from the running instance within {timeout:g}s"}
+    except (OSError, ValueError) as e:
+        return {'ok': False, 'error': f"Bad reply from the running instance: {e}"}
+    finally:
+        sock.close()
+
+
+def acquire_instance_lock(socket_path=None):
+    """
+    Take the per-user lock that decides which of several launches starts the
+    control server. Returns the open lock file, which must stay open for the
+    life of the process, or None when another launch holds the lock. The kernel
+    drops the lock when its holder exits, so a crash never leaves it stale.
+    """
+    socket_path = socket_path or get_ipc_socket_path()
+    lock_file = open(socket_path + '.lock', 'a')
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def forward_when_listening(request, socket_path=None, timeout=10.0):
+    """Send request to the instance that holds the lock once its server is up"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = send_ipc_request(request, socket_path, timeout)
+        if response is not None:
+            return response
+        time.sleep(0.05)
+    return {'ok': False, 'error': f"The running instance did not start listening within {timeout:g}s"}
+
+
+class ControlServer(QObject):
+    """
+    Local control server for the running instance.
+    Protocol: one JSON object per line in each direction. Every request has a
+    "cmd" key; every response has "ok" and either results or "error".
+    The handler may return a concurrent.futures.Future of the response for
+    slow requests; that reply is written once it completes.
+    """
+    _deferred_done = pyqtSignal(object, object)  # connection, Future
+
+    def __init__(self, socket_path, handler, parent=None):
+        super().__init__(parent)
+        self.socket_path = socket_path
+        self.handler = handler
+        self.requests_handled = 0
+        self._buffers = {}
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self._on_new_connection)
+        # Futures complete on other threads; replies are written on this one
+        self._deferred_done.connect(self._on_deferred_done)
+
+    def start(self):
+        # Only called by the launch that holds the instance lock, so a leftover socket is stale
+        QLocalServer.removeServer(self.socket_path)
+        if not self.server.listen(self.socket_path):
+            logger.error(f"Control server could not listen on {self.socket_path}: "
+                         f"{self.server.errorString()}")
+            return False
+        logger.info(f"Control server listening on {self.socket_path}")
+        return True
+
     def stop(self):
-        """Stop the hotkey thread"""
-        self.is_running = False
+        self.server.close()
+        QLocalServer.removeServer(self.socket_path)
+
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            self._buffers[connection] = bytearray()
+            connection.readyRead.connect(lambda c=connection: self._on_ready_read(c))
+            connection.disconnected.connect(lambda c=connection: self._on_disconnected(c))
+
+    def _on_disconnected(self, connection):
+        self._buffers.pop(connection, None)
+        connection.deleteLater()
+
+    def _on_ready_read(self, connection):
+        buffer = self._buffers.get(connection)
+        if buffer is None:
+            return
+        buffer.extend(bytes(connection.readAll()))
+        while b'\n' in buffer:
+            line, _, rest = bytes(buffer).partition(b'\n')
+            buffer[:] = rest
+            if line.strip():
+                response = self.handle_line(line)
+                if isinstance(response, concurrent.futures.Future):
+                    response.add_done_callback(
+                        lambda future, c=connection: self._deferred_done.emit(c, future))
+                    continue
+                self._reply(connection, response)
+
+    def _reply(self, connection, response):
+        connection.write(json.dumps(response).encode('utf-8') + b'\n')
+        connection.flush()
+
+    def _on_deferred_done(self, connection, future):
         try:
-            keyboard.unhook_all()
+            response = future.result()
+            response.setdefault('ok', True)
         except Exception as e:
-            logger.error(f"Error stopping hotkey thread: {e}")
-        self.wait()
+            logger.error(f"Control request failed: {e}")
+            response = {'ok': False, 'error': str(e)}
+        # The client may have given up and disconnected meanwhile
+        if connection in self._buffers:
+            self._reply(connection, response)
+
+    def handle_line(self, line):
+        self.requests_handled += 1
+        try:
+            request = json.loads(line.decode('utf-8'))
+            if not isinstance(request, dict) or 'cmd' not in request:
+                raise ValueError("request must be a JSON object with a 'cmd' key")
+            response = self.handler(request)
+            if isinstance(response, concurrent.futures.Future):
+                return response
+            response.setdefault('ok', True)
+            return response
+        except Exception as e:
+            logger.error(f"Control request failed: {e}")
+            return {'ok': False, 'error': str(e)}
+
+
+class MagnifierLoupe:
+    """
+    Magnified view of the pixels around a point of the overlay's screen grab,
+    with a pixel grid. Rendered from a small LRU cache of pre-scaled tiles, so
+    a paint is only a few unscaled pixmap blits instead of rescaling the grab.
+    """
+
+    TILE = 32  # Source pixels per tile side
+    MAX_TILES = 64
+
+    def __init__(self, sources, zoom=6, radius=10):
+        # sources: [(QRect in overlay coordinates, QPixmap)] that together make up the grab
+        self.sources = sources
+        self.zoom = max(4, min(8, int(zoom)))
+        self.radius = radius
+        self._tiles = collections.OrderedDict()
+        self.stats = {'paints': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'tiles_scaled': 0}
+
+    def size(self):
+        return (2 * self.radius + 1) * self.zoom
+
+    def cache_bytes(self):
+        return sum(pixmap_bytes(tile) for tile in self._tiles.values())
+
+    def _tile(self, index, tx, ty):
+        """Scaled (and grid-lined) tile tx, ty of source index, from the cache"""
+        key = (index, tx, ty)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+        
+        pixmap = self.sources[index][1]
+        part = QRect(tx * self.TILE, ty * self.TILE, self.TILE, self.TILE).intersected(pixmap.rect())
+        tile = pixmap.copy(part).scaled(part.width() * self.zoom, part.height() * self.zoom,
+                                        Qt.IgnoreAspectRatio, Qt.FastTransformation)
+        painter = QPainter(tile)
+        painter.setPen(QColor(0, 0, 0, 60))
+        for x in range(0, tile.width(), self.zoom):
+            painter.drawLine(x, 0, x, tile.height())
+        for y in range(0, tile.height(), self.zoom):
+            painter.drawLine(0, y, tile.width(), y)
+        painter.end()
+        
+        self._tiles[key] = tile
+        if len(self._tiles) > self.MAX_TILES:
+            self._tiles.popitem(last=False)
+        self.stats['tiles_scaled'] += 1
+        return tile
+
+    def paint(self, painter, target, focus, selection=None):
+        """Draw the pixels around focus (overlay coordinates) into the square target"""
+        start = time.perf_counter()
+        zoom, radius = self.zoom, self.radius
+        area = QRect(focus.x() - radius, focus.y() - radius, 2 * radius + 1, 2 * radius + 1)
+        
+        painter.save()
+        painter.setClipRect(target, Qt.IntersectClip)
+        painter.fillRect(target, Qt.black)
+        for index, (source_rect, _) in enumerate(self.sources):
+            local = area.intersected(source_rect).translated(-source_rect.topLeft())
+            if local.isEmpty():
+                continue
+            for ty in range(local.top() // self.TILE, local.bottom() // self.TILE + 1):
+                for tx in range(local.left() // self.TILE, local.right() // self.TILE + 1):
+                    tile_rect = QRect(tx * self.TILE, ty * self.TILE, self.TILE, self.TILE).intersected(local)
+                    in_tile = tile_rect.translated(-tx * self.TILE, -ty * self.TILE)
+                    offset = tile_rect.topLeft() + source_rect.topLeft() - area.topLeft()
+                    # Same size on both sides: a plain copy, no scaling at paint time
+                    painter.drawPixmap(QRect(target.topLeft() + offset * zoom, tile_rect.size() * zoom),
+                                       self._tile(index, tx, ty),
+                                       QRect(in_tile.topLeft() * zoom, in_tile.size() * zoom))
+        
+        # The selection border and the focused pixel
+        if selection is not None:
+            painter.setPen(QPen(QColor(147, 51, 234), 2))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(QRect(target.topLeft() + (selection.topLeft() - area.topLeft()) * zoom,
+                                   selection.size() * zoom))
+        painter.setPen(QPen(Qt.white, 1))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(target.x() + radius * zoom, target.y() + radius * zoom, zoom, zoom)
+        painter.restore()
+        
+        painter.setPen(QPen(QColor(147, 51, 234), 2))
+        painter.drawRect(target)
+        label = f"{focus.x()}, {focus.y()}"
+        label_rect = QRect(target.left(), target.bottom() + 2, target.width(),
+                           painter.fontMetrics().height() + 4)
+        painter.fillRect(label_rect, QColor(30, 41, 59, 230))
+        painter.setPen(Qt.white)
+        painter.drawText(label_rect, Qt.AlignCenter, label)
+        
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stats['paints'] += 1
+        self.stats['total_ms'] += elapsed
+        self.stats['max_ms'] = max(self.stats['max_ms'], elapsed)
+
+
+def pixmap_bytes(pixmap):
+    """Memory held by a pixmap's pixels"""
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+class OverlayHud:
+    """
+    Performance readout drawn on the capture overlay (F12): how long the
+    screen grab took, last and average paint time, frames per second while
+    dragging or resizing, mouse move events per second and the memory held
+    by the grab. The overlay only feeds the paint and motion counters while
+    the HUD is visible, so it costs nothing otherwise.
+    """
+
+    def __init__(self):
+        self.visible = False
+        self.grab_ms = 0.0
+        self.grab_reused = False  # The grab was taken in advance (queued request)
+        self.paints = 0
+        self.total_paint_ms = 0.0
+        self.last_paint_ms = 0.0
+        self.fps = 0.0
+        self.moves_per_s = 0.0
+        self._window_start = time.monotonic()
+        self._drag_paints = 0
+        self._moves = 0
+        self._frame = None
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.paints = 0
+        self.total_paint_ms = 0.0
+        self.fps = self.moves_per_s = 0.0
+        self._window_start = time.monotonic()
+        self._drag_paints = self._moves = 0
+        self._frame = None
+
+    def note_move(self):
+        self._moves += 1
+        self._roll()
+
+    def note_paint(self, elapsed_ms, dragging, frame=None):
+        """
+        Count a painted frame. Windows painted for the same frame (the tiles
+        of a per-screen overlay) pass the same frame id and only add their
+        paint time to it.
+        """
+        if frame is not None and frame == self._frame:
+            self.total_paint_ms += elapsed_ms
+            self.last_paint_ms += elapsed_ms
+            return
+        self._frame = frame
+        self.paints += 1
+        self.total_paint_ms += elapsed_ms
+        self.last_paint_ms = elapsed_ms
+        if dragging:
+            self._drag_paints += 1
+        self._roll()
+
+    def _roll(self):
+        """Turn the counts of the last second into rates"""
+        elapsed = time.monotonic() - self._window_start
+        if elapsed >= 1.0:
+            self.fps = self._drag_paints / elapsed
+            self.moves_per_s = self._moves / elapsed
+            self._window_start = time.monotonic()
+            self._drag_paints = self._moves = 0
+
+    def lines(self, grab_bytes, loupe_bytes):
+        if time.monotonic() - self._window_start > 2.0:
+            # Nothing happened for a while
+            self.fps = self.moves_per_s = 0.0
+        average = self.total_paint_ms / self.paints if self.paints else 0.0
+        grab = f"{self.grab_ms:.1f} ms" + (" (grabbed in advance)" if self.grab_reused else "")
+        return [
+            f"grab        {grab}",
+            f"paint       {self.last_paint_ms:.2f} ms last, {average:.2f} ms avg ({self.paints})",
+            f"drag fps    {self.fps:.1f}",
+            f"moves/s     {self.moves_per_s:.0f}",
+            f"grab memory {grab_bytes / (1024 * 1024):.1f} MB (+{loupe_bytes / 1024:.0f} KB loupe)",
+        ]
+
+    def rect(self, anchor):
+        """Area of the HUD with its top-left corner at anchor"""
+        return QRect(anchor.x(), anchor.y(), 380, 96)
+
+    def paint(self, painter, rect, grab_bytes, loupe_bytes):
+        painter.save()
+        painter.fillRect(rect, QColor(15, 23, 42, 220))
+        painter.setPen(QColor(16, 185, 129))
+        font = painter.font()
+        font.setFamily('monospace')
+        font.setStyleHint(QFont.Monospace)
+        font.setPixelSize(12)
+        painter.setFont(font)
+        for row, line in enumerate(self.lines(grab_bytes, loupe_bytes)):
+            painter.drawText(rect.left() + 8, rect.top() + 20 + row * 16, line)
+        painter.restore()
 
 
 class CaptureOverlay(QWidget):
@@ -61,9 +3829,12 @@ class CaptureOverlay(QWidget):
     close_signal = pyqtSignal()
     update_ui_dimensions = pyqtSignal(int, int)  # width, height
     
-    def __init__(self, settings):
+    def __init__(self, settings, writer=None, frame=None):
         super().__init__()
         self.settings = settings
+        self.writer = writer if writer is not None else CaptureWriter(settings)
+        # Screens grabbed in advance (grab_all_screens), e.g. when the request was queued
+        self.frame = frame
         
         # Make overlay truly block everything behind it
         self.setWindowFlags(
@@ -107,6 +3878,10 @@ class CaptureOverlay(QWidget):
         logger.info(f"Full desktop offset: {self.full_desktop_offset.x()}, {self.full_desktop_offset.y()}")
         logger.info(f"Capture size: w={width}, h={height}")
         
+        # Named regions (by ratio mode); capture_rect is the active one
+        self.regions = {}
+        self.active_region = settings.get('ratio_mode', '9:16')
+        
         # Try to use last captured region if it's still valid
         last_rect = self.get_valid_last_region(width, height)
         
@@ -127,24 +3902,46 @@ class CaptureOverlay(QWidget):
             self.capture_rect = QRect(int(x), int(y), int(width), int(height))
             logger.info(f"Capture rect (centered): x={int(x)}, y={int(y)}, w={int(width)}, h={int(height)}")
         
+        # Capture the other ratio modes from the same frame as well
+        if settings.get('multi_region_capture', False):
+            self.add_companion_regions(screen_geom)
+        
         self.dragging = False
         self.drag_offset = QPoint()
         self.resizing = False
         self.resize_edge = None  # Which edge is being resized
         self.resize_min_size = 100  # Minimum resize dimension
         
-        # Capture all screens
+        # Capture all screens (F12 shows how long it took)
+        self.buffers = BufferCounter()
+        self._source_image = None
+        self.hud = OverlayHud()
+        grab_started = time.perf_counter()
         self.capture_screens()
+        self.hud.grab_ms = (time.perf_counter() - grab_started) * 1000
+        self.hud.grab_reused = frame is not None
+        # Refreshes the HUD's rates while it is shown and nothing else repaints
+        self.hud_timer = QTimer(self)
+        self.hud_timer.setInterval(1000)
+        self.hud_timer.timeout.connect(self.update)
         
-    def get_valid_last_region(self, width, height):
+        # Magnifier next to the cursor while an edge or corner is hovered or dragged
+        self.show_loupe = settings.get('show_loupe', True)
+        self.loupe = MagnifierLoupe(self.loupe_sources(), settings.get('loupe_zoom', 6))
+        self.loupe_focus = None
+        self.loupe_cursor = QPoint()
+        
+    def get_valid_last_region(self, width, height, ratio_mode=None):
         """
         Check if the last captured region is still valid for current screen setup.
         Uses separate storage for portrait (9:16) and landscape (16:9) modes.
+        Pass width/height of None to accept the saved dimensions as they are.
         Returns a QRect adjusted for current screen geometry, or None if invalid.
         """
         try:
             # Use the ratio_mode from settings (not inferred from dimensions)
-            ratio_mode = self.settings.get('ratio_mode', '9:16')
+            if ratio_mode is None:
+                ratio_mode = self.settings.get('ratio_mode', '9:16')
             
             # Get the appropriate last region key
             region_key = f'last_capture_rect_{ratio_mode}'
@@ -159,7 +3956,7 @@ class CaptureOverlay(QWidget):
             last_h = last_rect_data.get('height')
             
             # Check if dimensions match current settings
-            if last_w != width or last_h != height:
+            if width is not None and (last_w != width or last_h != height):
                 return None
             
             last_rect = QRect(last_x, last_y, last_w, last_h)
@@ -179,6 +3976,39 @@ class CaptureOverlay(QWidget):
             return None
 
     
+    @property
+    def capture_rect(self):
+        return self.regions[self.active_region]
+    
+    @capture_rect.setter
+    def capture_rect(self, rect):
+        self.regions[self.active_region] = rect
+    
+    def add_companion_regions(self, screen_geom):
+        """Add the saved region of every other ratio mode, or a centered default one"""
+        for ratio_mode, (width, height) in DEFAULT_REGION_SIZES.items():
+            if ratio_mode in self.regions:
+                continue
+            rect = self.get_valid_last_region(None, None, ratio_mode=ratio_mode)
+            if rect is None:
+                # Shrink the default size to the screen, keeping the aspect ratio
+                scale = min(1.0, screen_geom.width() / width, screen_geom.height() / height)
+                width, height = int(width * scale), int(height * scale)
+                rect = QRect(screen_geom.x() + (screen_geom.width() - width) // 2,
+                             screen_geom.y() + (screen_geom.height() - height) // 2,
+                             width, height)
+            self.regions[ratio_mode] = rect
+            logger.info(f"Companion region {ratio_mode}: x={rect.x()}, y={rect.y()}, w={rect.width()}, h={rect.height()}")
+    
+    def switch_active_region(self, name=None):
+        """Make another named region the one that is moved and resized (next one by default)"""
+        names = list(self.regions)
+        if name is None:
+            name = names[(names.index(self.active_region) + 1) % len(names)]
+        self.active_region = name
+        self.update_ui_dimensions.emit(self.capture_rect.width(), self.capture_rect.height())
+        self.update()
+    
     def clamp_rect_to_desktop(self, rect):
         """Clamp a rectangle to fit within the full desktop bounds"""
         min_x = self.full_desktop_offset.x()
@@ -191,8 +4021,8 @@ class CaptureOverlay(QWidget):
         
         return QRect(int(x), int(y), rect.width(), rect.height())
     
-    def setup_full_desktop_geometry(self):
-        """Set geometry to cover all monitors"""
+    def desktop_bounds(self):
+        """Bounding rectangle of all monitors, in global coordinates"""
         min_x = min_y = float('inf')
         max_x = max_y = float('-inf')
         
@@ -203,26 +4033,36 @@ class CaptureOverlay(QWidget):
             max_x = max(max_x, geom.x() + geom.width())
             max_y = max(max_y, geom.y() + geom.height())
         
-        width = int(max_x - min_x)
-        height = int(max_y - min_y)
-        
-        self.setGeometry(int(min_x), int(min_y), width, height)
-        self.full_desktop_offset = QPoint(int(min_x), int(min_y))
+        return QRect(int(min_x), int(min_y), int(max_x - min_x), int(max_y - min_y))
+    
+    def setup_full_desktop_geometry(self):
+        """Set geometry to cover all monitors"""
+        bounds = self.desktop_bounds()
+        self.setGeometry(bounds)
+        self.full_desktop_offset = bounds.topLeft()
         
-        logger.info(f"Full desktop geometry set: x={int(min_x)}, y={int(min_y)}, w={width}, h={height}")
+        logger.info(f"Full desktop geometry set: x={bounds.x()}, y={bounds.y()}, "
+                    f"w={bounds.width()}, h={bounds.height()}")
     
     def capture_screens(self):
         """Capture all screens into a single pixmap"""
         try:
             width = self.width()
             height = self.height()
+            backend = get_grab_backend(self.settings.get('grab_backend', 'auto'))
+            shots = [(screen, self.grab_screen(backend, screen)) for screen in self.screens]
+            if len(shots) == 1 and shots[0][1].size() == self.size():
+                # Nothing to compose or scale: use the grab itself
+                self.screen_pixmap = shots[0][1]
+                return
+            
             self.screen_pixmap = QPixmap(width, height)
             self.screen_pixmap.fill(Qt.black)
+            self.buffers.copied(self.screen_pixmap)
             
             painter = QPainter(self.screen_pixmap)
-            for screen in self.screens:
+            for screen, screen_shot in shots:
                 geom = screen.geometry()
-                screen_shot = screen.grabWindow(0)
                 x = geom.x() - self.full_desktop_offset.x()
                 y = geom.y() - self.full_desktop_offset.y()
                 painter.drawPixmap(int(x), int(y), screen_shot)
@@ -230,40 +4070,173 @@ class CaptureOverlay(QWidget):
         except Exception as e:
             logger.error(f"Error capturing screens: {e}")
     
+    def grab_screen(self, backend, screen):
+        """A screen's pixels from the frame grabbed in advance, or grabbed now"""
+        if self.frame is not None and screen.name() in self.frame:
+            return self.frame[screen.name()]
+        return backend.grab(screen, counter=self.buffers)
+    
     def paintEvent(self, event):
+        started = time.perf_counter() if self.hud.visible else None
         painter = QPainter(self)
         
         # Draw the full screenshot with reduced opacity outside capture area
         if hasattr(self, 'screen_pixmap'):
             # Draw full screen pixmap
             painter.drawPixmap(0, 0, self.screen_pixmap)
-            
-            # Darken areas outside the capture rectangle
-            # Create a path for everything except the capture area
-            path_painter = QPainter(self.screen_pixmap)
-            
-            # Draw semi-transparent dark overlay only on areas outside capture rect
-            dark_color = QColor(0, 0, 0, 100)  # Lighter opacity (100 instead of 180)
-            
-            # Darken top area
-            if self.capture_rect.top() > 0:
-                painter.fillRect(0, 0, self.width(), self.capture_rect.top(), dark_color)
-            
-            # Darken bottom area
-            if self.capture_rect.bottom() < self.height():
-                painter.fillRect(0, self.capture_rect.bottom(), self.width(), 
-                               self.height() - self.capture_rect.bottom(), dark_color)
-            
-            # Darken left area
-            if self.capture_rect.left() > 0:
-                painter.fillRect(0, self.capture_rect.top(), self.capture_rect.left(), 
-                               self.capture_rect.height(), dark_color)
-            
-            # Darken right area
-            if self.capture_rect.right() < self.width():
-                painter.fillRect(self.capture_rect.right(), self.capture_rect.top(), 
-                               self.width() - self.capture_rect.right(), 
-                               self.capture_rect.height(), dark_color)
+            self.paint_dimming(painter)
+        
+        self.paint_selection(painter)
+        self.paint_loupe(painter)
+        if started is not None:
+            self.hud.note_paint((time.perf_counter() - started) * 1000, self.dragging or self.resizing)
+            self.paint_hud(painter)
+    
+    def paint_dimming(self, painter):
+        """Darken areas outside the capture rectangle"""
+        # Draw semi-transparent dark overlay only on areas outside capture rect
+        dark_color = QColor(0, 0, 0, 100)  # Lighter opacity (100 instead of 180)
+        
+        # Darken top area
+        if self.capture_rect.top() > 0:
+            painter.fillRect(0, 0, self.width(), self.capture_rect.top(), dark_color)
+        
+        # Darken bottom area
+        if self.capture_rect.bottom() < self.height():
+            painter.fillRect(0, self.capture_rect.bottom(), self.width(), 
+                           self.height() - self.capture_rect.bottom(), dark_color)
+        
+        # Darken left area
+        if self.capture_rect.left() > 0:
+            painter.fillRect(0, self.capture_rect.top(), self.capture_rect.left(), 
+                           self.capture_rect.height(), dark_color)
+        
+        # Darken right area
+        if self.capture_rect.right() < self.width():
+            painter.fillRect(self.capture_rect.right(), self.capture_rect.top(), 
+                           self.width() - self.capture_rect.right(), 
+                           self.capture_rect.height(), dark_color)
+    
+    def background_frame(self):
+        """
+        The screens as grabbed when the overlay opened, in the format of
+        grab_all_screens, so requests made while it covers the screen can
+        capture what is underneath.
+        """
+        if self.frame is not None:
+            return self.frame
+        frame = {}
+        for screen in self.screens:
+            part = QRect(screen.geometry().topLeft() - self.full_desktop_offset, screen.geometry().size())
+            # A single screen is the whole pixmap: share it instead of copying
+            frame[screen.name()] = (self.screen_pixmap if part == self.screen_pixmap.rect()
+                                    else self.screen_pixmap.copy(part))
+        return frame
+    
+    def loupe_sources(self):
+        """The grab as (overlay rect, pixmap) pieces for the loupe"""
+        if not hasattr(self, 'screen_pixmap'):
+            return []
+        return [(QRect(QPoint(0, 0), self.screen_pixmap.size()), self.screen_pixmap)]
+    
+    def edge_point(self, edge, pos):
+        """The selection pixel that dragging edge (see get_resize_edge) moves, nearest to pos"""
+        rect = self.capture_rect
+        if 'l' in edge:
+            x = rect.left()
+        elif 'r' in edge:
+            x = rect.right()
+        else:
+            x = max(rect.left(), min(pos.x(), rect.right()))
+        if 't' in edge:
+            y = rect.top()
+        elif 'b' in edge:
+            y = rect.bottom()
+        else:
+            y = max(rect.top(), min(pos.y(), rect.bottom()))
+        return QPoint(x, y)
+    
+    def update_loupe(self, pos):
+        """Follow the edge or corner under (or dragged by) the cursor at pos"""
+        edge = self.resize_edge if self.resizing else None
+        if edge is None and not self.dragging:
+            edge = self.get_resize_edge(pos)
+        focus = self.edge_point(edge, pos) if edge and self.show_loupe else None
+        if focus != self.loupe_focus or (focus is not None and pos != self.loupe_cursor):
+            previous = self.loupe_rect()
+            self.loupe_focus = focus
+            self.loupe_cursor = QPoint(pos)
+            self.update_loupe_area(previous)
+    
+    def update_loupe_area(self, previous):
+        """Repaint the loupe and its label where they were and are now, and the HUD"""
+        region = QRegion()
+        for rect in (previous, self.loupe_rect()):
+            if rect is not None:
+                region = region.united(rect.adjusted(-2, -2, 2, 32))
+        hud_rect = self.hud_rect()
+        if hud_rect is not None:
+            region = region.united(hud_rect)
+        self.update(region)
+    
+    def loupe_rect(self):
+        """Where the loupe is drawn (overlay coordinates), or None when it is hidden"""
+        if self.loupe_focus is None:
+            return None
+        size = self.loupe.size()
+        x = self.loupe_cursor.x() + 24
+        y = self.loupe_cursor.y() + 24
+        # Flip to the other side of the cursor near the right and bottom edges
+        if x + size > self.width():
+            x = self.loupe_cursor.x() - 24 - size
+        if y + size + 30 > self.height():
+            y = self.loupe_cursor.y() - 24 - size - 30
+        return QRect(x, y, size, size)
+    
+    def paint_loupe(self, painter):
+        target = self.loupe_rect()
+        if target is not None:
+            self.loupe.paint(painter, target, self.loupe_focus, self.capture_rect)
+    
+    def grab_bytes(self):
+        """Memory held by the screen grab"""
+        return pixmap_bytes(self.screen_pixmap) if hasattr(self, 'screen_pixmap') else 0
+    
+    def hud_rect(self):
+        """Where the HUD is drawn: the top-left corner of the screen showing the selection"""
+        if not self.hud.visible:
+            return None
+        center = self.capture_rect.center()
+        anchor = QPoint(20, 20)
+        for screen in self.screens:
+            geom = screen.geometry().translated(-self.full_desktop_offset)
+            if geom.contains(center):
+                anchor = geom.topLeft() + QPoint(20, 20)
+                break
+        return self.hud.rect(anchor)
+    
+    def paint_hud(self, painter):
+        rect = self.hud_rect()
+        if rect is not None:
+            self.hud.paint(painter, rect, self.grab_bytes(), self.loupe.cache_bytes())
+    
+    def toggle_hud(self):
+        self.hud.toggle()
+        if self.hud.visible:
+            self.hud_timer.start()
+        else:
+            self.hud_timer.stop()
+        self.update()
+    
+    def paint_selection(self, painter):
+        """Draw the regions, resize handles, dimensions label and instructions"""
+        # Draw the other regions that are captured together with the active one
+        for name, rect in self.regions.items():
+            if name == self.active_region:
+                continue
+            painter.setPen(QPen(QColor(59, 130, 246), 2, Qt.DashLine))
+            painter.drawRect(rect)
+            painter.drawText(rect.left() + 8, rect.top() + 20, f"{name}  {rect.width()} × {rect.height()} px")
         
         # Draw border around capture area
         pen = QPen(QColor(147, 51, 234), 4)
@@ -308,15 +4281,51 @@ class CaptureOverlay(QWidget):
         painter.fillRect(bg_rect, QColor(147, 51, 234))
         painter.drawText(text_x, text_y, dim_text)
         
-        instructions = "ENTER = Capture  |  ESC = Cancel  |  Drag to move  |  Drag edges/corners to resize"
-        inst_rect = painter.fontMetrics().boundingRect(instructions)
-        inst_x = self.width() // 2 - inst_rect.width() // 2
-        inst_y = self.height() - 50
-        
-        inst_bg = QRect(inst_x - 20, inst_y - inst_rect.height() - 10,
-                       inst_rect.width() + 40, inst_rect.height() + 20)
+        instructions = self.instructions_text()
+        inst_bg = self.instructions_rect(painter.fontMetrics())
         painter.fillRect(inst_bg, QColor(30, 41, 59, 230))
-        painter.drawText(inst_x, inst_y, instructions)
+        painter.drawText(inst_bg.x() + 20, self.instructions_anchor().y(), instructions)
+    
+    def instructions_text(self):
+        instructions = "ENTER = Capture  |  ESC = Cancel  |  Drag to move  |  Drag edges/corners to resize"
+        if len(self.regions) > 1:
+            instructions += "  |  TAB = Switch region"
+        instructions += "  |  W = Snap to window  |  M = Magnifier  |  F12 = Performance"
+        return instructions
+    
+    def instructions_rect(self, metrics):
+        """Background rectangle of the instructions banner"""
+        inst_rect = metrics.boundingRect(self.instructions_text())
+        anchor = self.instructions_anchor()
+        inst_x = anchor.x() - inst_rect.width() // 2
+        return QRect(inst_x - 20, anchor.y() - inst_rect.height() - 10,
+                     inst_rect.width() + 40, inst_rect.height() + 20)
+    
+    def instructions_anchor(self):
+        """Bottom-center point of the instructions banner"""
+        return QPoint(self.width() // 2, self.height() - 50)
+    
+    def crop_region(self, rect):
+        """Pixels of rect (overlay coordinates) from the screen grab, as a view into source_image()"""
+        return crop_image_view(self.source_image(), rect, self.buffers)
+    
+    def clipboard_source(self, rect):
+        """(image, rect inside it) holding the pixels of rect, for ClipboardImage"""
+        return self.source_image(), rect
+    
+    def source_image(self):
+        """
+        The whole grab as a Format_RGB32 QImage that crops view into, or None.
+        On raster platforms toImage() shares the pixmap's buffer, so this is
+        normally free.
+        """
+        if self._source_image is None:
+            self._source_image = as_rgb32(self.screen_pixmap.toImage(), self.buffers)
+        return self._source_image
+    
+    def region_images(self, regions):
+        """QImages of several regions of the grab, as views where possible"""
+        return {name: self.crop_region(rect) for name, rect in regions.items()}, self.source_image()
     
     def get_resize_edge(self, pos):
         """Determine which edge or corner is being hovered/clicked"""
@@ -387,8 +4396,19 @@ class CaptureOverlay(QWidget):
             self.dragging = True
             self.drag_offset = event.pos() - self.capture_rect.topLeft()
             self.setCursor(Qt.ClosedHandCursor)
+        else:
+            # Clicking inside another region activates it and starts dragging it
+            for name, rect in self.regions.items():
+                if rect.contains(event.pos()):
+                    self.switch_active_region(name)
+                    self.dragging = True
+                    self.drag_offset = event.pos() - self.capture_rect.topLeft()
+                    self.setCursor(Qt.ClosedHandCursor)
+                    break
     
     def mouseMoveEvent(self, event):
+        if self.hud.visible:
+            self.hud.note_move()
         if self.resizing:
             # Calculate the change in position
             dx = event.pos().x() - self.resize_start_pos.x()
@@ -445,6 +4465,8 @@ class CaptureOverlay(QWidget):
                 self.setCursor(Qt.OpenHandCursor)
             else:
                 self.setCursor(Qt.CrossCursor)
+        
+        self.update_loupe(event.pos())
     
     def mouseReleaseEvent(self, event):
         if self.resizing:
@@ -467,6 +4489,8 @@ class CaptureOverlay(QWidget):
                 self.setCursor(Qt.OpenHandCursor)
             else:
                 self.setCursor(Qt.CrossCursor)
+        
+        self.update_loupe(event.pos())
     
     def keyPressEvent(self, event):
         if not event.isAutoRepeat():  # Ignore key repeat events
@@ -474,6 +4498,43 @@ class CaptureOverlay(QWidget):
                 self.capture_and_save()
             elif event.key() == Qt.Key_Escape:
                 self.close()
+            elif event.key() == Qt.Key_Tab and len(self.regions) > 1:
+                self.switch_active_region()
+            elif event.key() == Qt.Key_W:
+                self.snap_to_window()
+            elif event.key() == Qt.Key_M:
+                self.show_loupe = not self.show_loupe
+                self.loupe_focus = None
+                self.update()
+            elif event.key() == Qt.Key_F12:
+                self.toggle_hud()
+    
+    def snap_to_window(self):
+        """
+        Fit the active region to the window_target window, or to the window
+        under the cursor when no target is configured.
+        """
+        from PyQt5.QtGui import QCursor
+        target = self.settings.get('window_target', '').strip()
+        try:
+            window = find_window(title=target) if target else find_window(point=QCursor.pos())
+        except OSError as e:
+            logger.warning(f"Could not list windows: {e}")
+            return
+        if window is None:
+            logger.info(f"No window to snap to (window_target={target!r})")
+            return
+        
+        fit = 'crop' if self.settings.get('lock_ratio', True) else 'none'
+        rect = fit_rect_to_ratio(window.rect, self.active_region, fit)
+        # Windows report global coordinates, the overlay starts at the desktop's top-left
+        rect = rect.translated(-self.full_desktop_offset).intersected(QRect(QPoint(0, 0), self.size()))
+        if rect.isEmpty():
+            return
+        self.capture_rect = rect
+        logger.info(f"Snapped to window {window.title!r}: {rect.x()},{rect.y()} {rect.width()}x{rect.height()}")
+        self.update_ui_dimensions.emit(rect.width(), rect.height())
+        self.update()
     
     def closeEvent(self, event):
         """Release mouse and keyboard grab when closing"""
@@ -482,33 +4543,12 @@ class CaptureOverlay(QWidget):
             self.releaseKeyboard()
         except:
             pass
+        stats = self.loupe.stats
+        if stats['paints']:
+            logger.info(f"Loupe: {stats['paints']} paints, {stats['total_ms'] / stats['paints']:.3f} ms avg, "
+                        f"{stats['max_ms']:.3f} ms max, {stats['tiles_scaled']} tiles scaled")
         super().closeEvent(event)
-    
-    def get_next_sequence_number(self, save_dir, prefix):
-        """
-        Scan the save directory for files matching the prefix pattern
-        and return the next sequence number.
-        Pattern: prefix1.png, prefix2.png, etc.
-        """
-        import re
-        
-        if not os.path.exists(save_dir):
-            return 1
-        
-        # Pattern to match: prefix followed by a number and .png extension
-        pattern = re.compile(rf'^{re.escape(prefix)}(\d+)\.png$', re.IGNORECASE)
-        
-        max_number = 0
-        try:
-            for filename in os.listdir(save_dir):
-                match = pattern.match(filename)
-                if match:
-                    number = int(match.group(1))
-                    max_number = max(max_number, number)
-        except Exception as e:
-            logger.warning(f"Error scanning directory for sequence numbers: {e}")
-        
-        return max_number + 1
+        self.close_signal.emit()
     
     def capture_and_save(self):
         try:
@@ -516,37 +4556,30 @@ class CaptureOverlay(QWidget):
             self.releaseMouse()
             self.releaseKeyboard()
             
-            captured = self.screen_pixmap.copy(self.capture_rect)
-            
-            save_dir = self.settings.get('save_location', 
-                                        os.path.join(os.path.expanduser('~'), 'Screenshots'))
-            os.makedirs(save_dir, exist_ok=True)
-            
-            # Get the file prefix from settings
-            prefix = self.settings.get('file_prefix', '').strip()
+            if len(self.regions) > 1:
+                self.capture_all_regions()
+                return
             
-            # If prefix is empty, use timestamp (original behavior)
-            if not prefix:
-                timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-                filename = f"Portrait_{timestamp}.png"
-            else:
-                # Use prefix with sequence number
-                seq_number = self.get_next_sequence_number(save_dir, prefix)
-                filename = f"{prefix}{seq_number}.png"
+            # One buffer feeds hooks, encoder and clipboard: hooks and encoder
+            # get a view into the grab, the clipboard crops it when pasted
+            captured = self.crop_region(self.capture_rect)
             
-            filepath = os.path.join(save_dir, filename)
+            result = self.writer.save(captured, self.capture_rect,
+                                      source_image=self.source_image(), counter=self.buffers)
+            self.writer.note_buffers(self.buffers)
             
-            if captured.save(filepath, 'PNG'):
+            if result is not None:
                 # Save the current capture region for next time
                 self.save_capture_region()
                 
                 # Copy to clipboard if enabled
                 if self.settings.get('copy_to_clipboard', True):
-                    self.copy_image_to_clipboard(captured)
+                    self.copy_image_to_clipboard(*self.clipboard_source(self.capture_rect))
                 
                 self.capture_signal.emit(self.capture_rect)
                 # Show a toast-like notification that auto-dismisses
-                self.show_toast_notification(f"Screenshot saved:\n{filepath}")
+                status = "saved" if result.data is not None else "queued"
+                self.show_toast_notification(f"Screenshot {status}:\n{result.filepath}")
             else:
                 # Show error message with auto-dismiss
                 self.show_toast_notification("Failed to save screenshot", is_error=True, duration=3000)
@@ -556,11 +4589,38 @@ class CaptureOverlay(QWidget):
         finally:
             self.close()
     
-    def copy_image_to_clipboard(self, pixmap):
-        """Copy the pixmap image to system clipboard"""
+    def capture_all_regions(self):
+        """Crop every named region from the one screen grab and encode them in parallel"""
+        images, source = self.region_images(self.regions)
+        results = self.writer.save_many(images, dict(self.regions), source_image=source,
+                                        counter=self.buffers)
+        
+        saved = [name for name, result in results.items() if result is not None]
+        for name in saved:
+            self.save_capture_region(self.regions[name], name)
+        
+        if not saved:
+            self.show_toast_notification("Failed to save screenshot", is_error=True, duration=3000)
+            return
+        
+        # The active region is the one that goes to the clipboard
+        if self.settings.get('copy_to_clipboard', True) and results.get(self.active_region):
+            self.copy_image_to_clipboard(*self.clipboard_source(self.capture_rect))
+        self.writer.note_buffers(self.buffers)
+        
+        self.capture_signal.emit(self.capture_rect)
+        paths = "\n".join(results[name].filepath for name in saved)
+        failed = len(results) - len(saved)
+        status = "queued" if self.writer.spool is not None else "saved"
+        self.show_toast_notification(f"{len(saved)} screenshots {status}:\n{paths}"
+                                     + (f"\n{failed} failed" if failed else ""),
+                                     is_error=bool(failed))
+    
+    def copy_image_to_clipboard(self, image, rect=None):
+        """Put rect of image (all of it by default) on the system clipboard; see ClipboardImage"""
         try:
             clipboard = QApplication.clipboard()
-            clipboard.setPixmap(pixmap)
+            clipboard.setMimeData(ClipboardImage(image, rect))
             logger.info("Image copied to clipboard")
         except Exception as e:
             logger.error(f"Error copying to clipboard: {e}")
@@ -634,18 +4694,21 @@ class CaptureOverlay(QWidget):
         
         QTimer.singleShot(duration, close_toast)
     
-    def save_capture_region(self):
+    def save_capture_region(self, rect=None, ratio_mode=None):
         """Save the current capture region to settings (separate for portrait/landscape)"""
         try:
+            if rect is None:
+                rect = self.capture_rect
             rect_data = {
-                'x': self.capture_rect.x(),
-                'y': self.capture_rect.y(),
-                'width': self.capture_rect.width(),
-                'height': self.capture_rect.height()
+                'x': rect.x(),
+                'y': rect.y(),
+                'width': rect.width(),
+                'height': rect.height()
             }
             
             # Determine ratio mode based on dimensions
-            ratio_mode = '9:16' if self.capture_rect.width() < self.capture_rect.height() else '16:9'
+            if ratio_mode is None:
+                ratio_mode = '9:16' if rect.width() < rect.height() else '16:9'
             region_key = f'last_capture_rect_{ratio_mode}'
             
             self.settings[region_key] = rect_data
@@ -654,24 +4717,367 @@ class CaptureOverlay(QWidget):
             logger.error(f"Error saving capture region: {e}")
 
 
+class ScreenOverlayTile(QWidget):
+    """One per-screen window of a TiledCaptureOverlay; paints and forwards input to it"""
+
+    def __init__(self, overlay, screen, background, overlay_rect):
+        super().__init__()
+        self.overlay = overlay
+        self.screen_ref = screen
+        self.background = background
+        self.overlay_rect = overlay_rect  # This screen in overlay coordinates
+        
+        self.setWindowFlags(
+            Qt.WindowStaysOnTopHint | 
+            Qt.FramelessWindowHint | 
+            Qt.Tool |
+            Qt.BypassWindowManagerHint
+        )
+        self.setGeometry(screen.geometry())
+        self.setMouseTracking(True)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self._image = None
+    
+    def image(self):
+        """The background as a Format_RGB32 QImage for cropping (shares its buffer on raster platforms)"""
+        if self._image is None:
+            self._image = as_rgb32(self.background.toImage(), self.overlay.buffers)
+        return self._image
+    
+    def paintEvent(self, event):
+        hud = self.overlay.hud
+        started = time.perf_counter() if hud.visible else None
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.background)
+        
+        # Paint in overlay coordinates; Qt clips to this screen
+        painter.translate(-self.overlay_rect.topLeft())
+        self.overlay.paint_dimming(painter)
+        if self.overlay.selection_touches(self.overlay_rect):
+            self.overlay.paint_selection(painter)
+        loupe_rect = self.overlay.loupe_rect()
+        if loupe_rect is not None and loupe_rect.adjusted(0, 0, 0, 30).intersects(self.overlay_rect):
+            self.overlay.paint_loupe(painter)
+        if started is not None:
+            hud.note_paint((time.perf_counter() - started) * 1000,
+                           self.overlay.dragging or self.overlay.resizing, self.overlay.paint_cycle)
+            hud_rect = self.overlay.hud_rect()
+            if hud_rect.intersects(self.overlay_rect):
+                self.overlay.paint_hud(painter)
+    
+    def _forward(self, handler, event):
+        pos = event.localPos() + QPointF(self.overlay_rect.topLeft())
+        handler(QMouseEvent(event.type(), pos, event.button(), event.buttons(), event.modifiers()))
+    
+    def mousePressEvent(self, event):
+        self._forward(self.overlay.mousePressEvent, event)
+    
+    def mouseMoveEvent(self, event):
+        self._forward(self.overlay.mouseMoveEvent, event)
+    
+    def mouseReleaseEvent(self, event):
+        self._forward(self.overlay.mouseReleaseEvent, event)
+    
+    def keyPressEvent(self, event):
+        self.overlay.keyPressEvent(event)
+
+
+class TiledCaptureOverlay(CaptureOverlay):
+    """
+    Capture overlay with one window and one background grab per screen,
+    instead of one window and pixmap spanning the bounding box of all screens.
+    Memory and paint cost follow the real screen area, which matters for
+    staggered layouts and very wide multi-monitor walls.
+    The selection is shared and kept in the same overlay coordinates as in
+    CaptureOverlay; this widget itself is never shown.
+    """
+    
+    # Extra area around a moved selection that must be repainted (handles, label)
+    REPAINT_MARGIN = 60
+    
+    def __init__(self, settings, writer=None, frame=None):
+        self.tiles = []
+        self.desktop_rect = QRect()
+        self._painted_rect = None
+        self._painted_loupe = None
+        self._painted_hud = None
+        self._painted_banner = None
+        self.paint_cycle = 0  # Counts update() calls: the tiles painted for one are one HUD frame
+        super().__init__(settings, writer, frame)
+    
+    def setup_full_desktop_geometry(self):
+        """Only record the desktop bounds; this widget is never shown, so it gets no geometry"""
+        self.desktop_rect = self.desktop_bounds()
+        self.full_desktop_offset = self.desktop_rect.topLeft()
+    
+    def setWindowState(self, state):
+        # Never shown: a full-screen window state would only confuse the window manager
+        pass
+    
+    # Overlay coordinates span the desktop bounds, not the size of this hidden widget
+    def width(self):
+        return self.desktop_rect.width()
+    
+    def height(self):
+        return self.desktop_rect.height()
+    
+    def size(self):
+        return self.desktop_rect.size()
+    
+    def capture_screens(self):
+        """Grab each screen into its own tile window"""
+        backend = get_grab_backend(self.settings.get('grab_backend', 'auto'))
+        for screen in self.screens:
+            geom = screen.geometry()
+            try:
+                background = self.grab_screen(backend, screen)
+            except Exception as e:
+                logger.error(f"Error capturing screen {screen.name()}: {e}")
+                background = QPixmap(geom.size())
+                background.fill(Qt.black)
+            overlay_rect = QRect(geom.topLeft() - self.full_desktop_offset, geom.size())
+            self.tiles.append(ScreenOverlayTile(self, screen, background, overlay_rect))
+    
+    def background_frame(self):
+        return {tile.screen_ref.name(): tile.background for tile in self.tiles}
+    
+    def loupe_sources(self):
+        return [(tile.overlay_rect, tile.background) for tile in self.tiles]
+    
+    def grab_bytes(self):
+        return sum(pixmap_bytes(tile.background) for tile in self.tiles)
+    
+    def tile_at(self, pos):
+        """Tile containing pos (overlay coordinates), or the first one"""
+        for tile in self.tiles:
+            if tile.overlay_rect.contains(pos):
+                return tile
+        return self.tiles[0] if self.tiles else None
+    
+    def key_tile(self):
+        """The tile that holds the keyboard grab: the one showing the selection"""
+        return self.tile_at(self.capture_rect.center())
+    
+    def selection_touches(self, area):
+        """Whether anything drawn by paint_selection can fall inside area"""
+        margin = self.REPAINT_MARGIN
+        for rect in self.regions.values():
+            if rect.adjusted(-margin, -margin, margin, margin).intersects(area):
+                return True
+        return area.contains(self.instructions_anchor())
+    
+    def instructions_anchor(self):
+        tile = self.key_tile()
+        if tile is None:
+            return super().instructions_anchor()
+        return QPoint(tile.overlay_rect.center().x(), tile.overlay_rect.bottom() - 50)
+    
+    def crop_region(self, rect):
+        """A view into the one tile holding rect, or rect composed from the tiles it intersects"""
+        for tile in self.tiles:
+            if tile.overlay_rect.contains(rect):
+                return crop_image_view(tile.image(), rect.translated(-tile.overlay_rect.topLeft()),
+                                       self.buffers)
+        
+        image = QImage(rect.size(), QImage.Format_RGB32)
+        image.fill(Qt.black)
+        painter = QPainter(image)
+        for tile in self.tiles:
+            part = tile.overlay_rect.intersected(rect)
+            if part.isEmpty():
+                continue
+            painter.drawImage(part.topLeft() - rect.topLeft(), tile.image(),
+                              part.translated(-tile.overlay_rect.topLeft()))
+        painter.end()
+        return self.buffers.copied(image)
+    
+    def clipboard_source(self, rect):
+        for tile in self.tiles:
+            if tile.overlay_rect.contains(rect):
+                return tile.image(), rect.translated(-tile.overlay_rect.topLeft())
+        return self.crop_region(rect), None
+    
+    def source_image(self):
+        return None
+    
+    def region_images(self, regions):
+        return {name: self.crop_region(rect) for name, rect in regions.items()}, None
+    
+    def update_loupe_area(self, previous):
+        # update() compares against the loupe it painted last
+        self.update()
+    
+    def update(self):
+        """Repaint only what changed: the old and new selection and loupe areas on the tiles they touch"""
+        self.paint_cycle += 1
+        current = QRect(self.capture_rect)
+        banner = self.instructions_rect(self.fontMetrics())
+        if len(self.regions) > 1 or self._painted_rect is None:
+            dirty = None
+        else:
+            margin = self.REPAINT_MARGIN
+            dirty = [self._painted_rect.united(current).adjusted(-margin, -margin, margin, margin)]
+            # The loupe (and its label) where it was and where it is now
+            for loupe_rect in (self._painted_loupe, self.loupe_rect()):
+                if loupe_rect is not None:
+                    dirty.append(loupe_rect.adjusted(-2, -2, 2, 32))
+            # The HUD refreshes with every repaint, and is wiped where it was when hidden or moved
+            for hud_rect in (self._painted_hud, self.hud_rect()):
+                if hud_rect is not None:
+                    dirty.append(hud_rect)
+            # The instructions banner follows the key tile, so it is wiped where it was
+            for banner_rect in (self._painted_banner, banner):
+                if banner_rect is not None:
+                    dirty.append(banner_rect)
+        self._painted_rect = current
+        self._painted_loupe = self.loupe_rect()
+        self._painted_hud = self.hud_rect()
+        self._painted_banner = banner
+        
+        for tile in self.tiles:
+            if dirty is None:
+                tile.update()
+                continue
+            for area in dirty:
+                part = area.intersected(tile.overlay_rect)
+                if not part.isEmpty():
+                    tile.update(part.translated(-tile.overlay_rect.topLeft()))
+    
+    def setCursor(self, cursor):
+        for tile in self.tiles:
+            tile.setCursor(cursor)
+    
+    def grabKeyboard(self):
+        tile = self.key_tile() if self.tiles else None
+        if tile is not None:
+            tile.grabKeyboard()
+    
+    def grabMouse(self):
+        # Each tile receives its own mouse events; a press keeps delivering
+        # moves to its tile even when the cursor crosses to another screen
+        pass
+    
+    def releaseKeyboard(self):
+        for tile in self.tiles:
+            tile.releaseKeyboard()
+    
+    def releaseMouse(self):
+        for tile in self.tiles:
+            tile.releaseMouse()
+    
+    def show(self):
+        for tile in self.tiles:
+            tile.show()
+        self._painted_rect = QRect(self.capture_rect)
+        self.grabKeyboard()
+    
+    def raise_(self):
+        for tile in self.tiles:
+            tile.raise_()
+    
+    def activateWindow(self):
+        tile = self.key_tile()
+        if tile is not None:
+            tile.activateWindow()
+    
+    def isVisible(self):
+        return any(tile.isVisible() for tile in self.tiles)
+    
+    def close(self):
+        self.releaseMouse()
+        self.releaseKeyboard()
+        for tile in self.tiles:
+            tile.close()
+            tile.deleteLater()
+        self.tiles = []
+        return super().close()
+
+
+def choose_overlay_class(settings):
+    """
+    Pick the overlay implementation from the overlay_mode setting.
+    'auto' uses per-screen tiles when the bounding box of all screens is mostly
+    dead area or too large for a single pixmap.
+    """
+    mode = settings.get('overlay_mode', 'desktop')
+    if mode == 'per_screen':
+        return TiledCaptureOverlay
+    if mode == 'auto':
+        screens = QApplication.screens()
+        bounds = QRect()
+        screen_area = 0
+        for screen in screens:
+            geom = screen.geometry()
+            bounds = bounds.united(geom)
+            screen_area += geom.width() * geom.height()
+        bounds_area = bounds.width() * bounds.height()
+        if bounds_area > 1.25 * screen_area or max(bounds.width(), bounds.height()) > 16384:
+            return TiledCaptureOverlay
+    return CaptureOverlay
+
+
 class PortraitScreenshotApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.settings = self.load_settings()
         self.overlay = None
         self.hotkey_thread = None
+        self.window_hotkey_thread = None
+        self.control_server = None
+        self.watcher = None
         self.is_exiting = False
+        self.started_at = time.time()
+        self.writer = CaptureWriter(self.settings)
+        self.capture_queue = CaptureRequestQueue(self.execute_capture_request, self.grab_for_request,
+                                                 self.settings.get('capture_queue_policy', 'coalesce'),
+                                                 int(self.settings.get('capture_queue_size', 3)))
+        self.catalog = None
+        if self.settings.get('catalog_enabled', False):
+            try:
+                self.catalog = CaptureCatalog(get_catalog_path(self.settings))
+                self.writer.listeners.append(self.catalog.add)
+            except sqlite3.Error as e:
+                logger.error(f"Could not open capture catalog: {e}")
+        self.export_manager = None
+        if self.settings.get('export_sinks'):
+            try:
+                self.export_manager = ExportManager(self.settings)
+                self.writer.listeners.append(self.export_manager.submit)
+            except (OSError, KeyError, ValueError) as e:
+                logger.error(f"Could not set up export sinks, exports are disabled: {e}")
+        self.pruner = RetentionPruner.from_settings(self.writer.get_save_dir(), self.settings)
+        if self.pruner is not None and self.catalog is not None:
+            self.pruner.listeners.append(self.catalog.forget)
+        self.spool = None
+        spool_path = get_spool_path(self.settings)
+        deferred = self.settings.get('deferred_encoding', False)
+        if deferred or (os.path.exists(spool_path) and os.path.getsize(spool_path)):
+            self.spool = CaptureSpool(spool_path, self.writer,
+                                      idle_seconds=self.settings.get('spool_idle_seconds', 3.0),
+                                      max_bytes=int(self.settings.get('spool_max_mb', 1024)) * 1024 * 1024)
+            if deferred:
+                self.writer.spool = self.spool
+            else:
+                # Deferred encoding was switched off: finish what an earlier session spooled
+                self.spool.drain()
         
         self.setWindowTitle("Portrait Screenshot Tool v1.8.1")
         self.setGeometry(300, 300, 450, 350)
         
         self.init_ui()
         self.init_tray()
+        load_capture_plugins(self.settings.get('capture_plugins', []))
+        
+        if self.settings.get('ipc_enabled', True):
+            self.control_server = ControlServer(get_ipc_socket_path(), self.handle_ipc_request, self)
+            if not self.control_server.start():
+                self.control_server = None
         
         # Use a timer for hotkey registration to avoid blocking
         QTimer.singleShot(500, self.register_hotkey)
     
-    def load_settings(self):
+    @staticmethod
+    def load_settings():
         settings_file = os.path.join(os.path.expanduser('~'), '.portrait_screenshot_settings.json')
         default_settings = {
             'hotkey': 'ctrl+shift+p',
@@ -682,7 +5088,38 @@ class PortraitScreenshotApp(QMainWindow):
             'lock_ratio': True,    # NEW: Track if ratio is locked
             'last_capture_rect': None,  # DEPRECATED: kept for backwards compatibility
             'copy_to_clipboard': True,
-            'file_prefix': ''
+            'file_prefix': '',
+            'grab_backend': 'auto',  # 'auto', 'qt' or 'x11-shm'
+            'capture_plugins': [],  # Module names providing on_capture(frame)
+            'ipc_enabled': True,  # Local control socket for scripts and single-instance launch
+            'multi_region_capture': False,  # Capture the 9:16 and 16:9 regions together
+            'shard_by_date': False,  # Save into YYYY/MM/DD/ subfolders
+            'fsync_policy': 'none',  # 'none', 'file', 'file+dir' or 'batch'
+            'fsync_batch_size': 10,  # Captures per fsync with the 'batch' policy
+            'fsync_batch_seconds': 2.0,  # ... or this long after the first capture of a batch
+            'overlay_mode': 'desktop',  # 'desktop', 'per_screen' or 'auto'
+            'hotkey_backend': 'auto',  # 'auto', 'x11', 'evdev' or 'keyboard'
+            'export_sinks': [],  # Upload targets, see ExportManager
+            'export_workers': 2,
+            'catalog_enabled': False,  # SQLite history in ~/.portrait_screenshot_catalog.sqlite3
+            'deferred_encoding': False,  # Spool raw pixels, encode PNGs when idle
+            'spool_idle_seconds': 3.0,  # Quiet time before the spool is encoded
+            'spool_max_mb': 1024,  # Encode regardless of idleness past this spool size
+            'window_target': '',  # Title or class of the window for window capture
+            'window_fit': 'none',  # 'none', 'crop' or 'pad' to the ratio mode
+            'window_hotkey': '',  # Captures window_target directly, without the overlay
+            'capture_queue_policy': 'coalesce',  # Presses while busy: 'drop', 'coalesce' or 'queue'
+            'capture_queue_size': 3,  # Waiting requests with the 'queue' policy
+            'show_loupe': True,  # Magnifier next to the cursor at edges and corners
+            'loupe_zoom': 6,  # 4 to 8
+            'png_encoder': 'auto',  # 'qt', 'parallel' or 'auto' (parallel for large captures)
+            'retention_max_age_days': 0,  # Retention limits, 0 = no limit
+            'retention_max_total_mb': 0,
+            'retention_max_count': 0,
+            'retention_keep_per_prefix': 0,
+            'retention_interval_minutes': 60,  # Time between pruning passes
+            'watch_interval_ms': 500,  # Watch mode sampling interval
+            'watch_threshold': 0.001  # Fraction of the 64x64 thumbnail's pixels that must change
         }
         
         try:
@@ -808,6 +5245,26 @@ class PortraitScreenshotApp(QMainWindow):
         clipboard_layout.addStretch()
         settings_layout.addLayout(clipboard_layout)
         
+        # Window capture target and its hotkey
+        window_layout = QHBoxLayout()
+        window_layout.addWidget(QLabel("Target window:"))
+        self.window_target_input = QLineEdit(self.settings.get('window_target', ''))
+        self.window_target_input.setPlaceholderText("Title or class, e.g. firefox (W in the overlay)")
+        window_layout.addWidget(self.window_target_input, 3)
+        window_layout.addWidget(QLabel("Hotkey:"))
+        self.window_hotkey_input = QLineEdit(self.settings.get('window_hotkey', ''))
+        self.window_hotkey_input.setPlaceholderText("e.g., ctrl+shift+w")
+        window_layout.addWidget(self.window_hotkey_input, 2)
+        settings_layout.addLayout(window_layout)
+        
+        # Capture both ratio modes from the same frame
+        multi_region_layout = QHBoxLayout()
+        self.multi_region_checkbox = QCheckBox("Capture 9:16 and 16:9 regions together")
+        self.multi_region_checkbox.setChecked(self.settings.get('multi_region_capture', False))
+        multi_region_layout.addWidget(self.multi_region_checkbox)
+        multi_region_layout.addStretch()
+        settings_layout.addLayout(multi_region_layout)
+        
         save_settings_btn = QPushButton("Save Settings")
         save_settings_btn.clicked.connect(self.apply_settings)
         settings_layout.addWidget(save_settings_btn)
@@ -822,12 +5279,24 @@ class PortraitScreenshotApp(QMainWindow):
         capture_btn.clicked.connect(self.start_capture)
         btn_layout.addWidget(capture_btn)
         
+        # Capture the saved region by itself whenever it changes
+        self.watch_btn = QPushButton("Watch Region")
+        self.watch_btn.setCheckable(True)
+        self.watch_btn.toggled.connect(self.toggle_watch)
+        btn_layout.addWidget(self.watch_btn)
+        
         minimize_btn = QPushButton("Minimize to Tray")
         minimize_btn.clicked.connect(self.hide)
         btn_layout.addWidget(minimize_btn)
         
         layout.addLayout(btn_layout)
         
+        self.watch_label = QLabel()
+        self.watch_label.setStyleSheet("color: #f59e0b; font-size: 10px; font-style: italic;")
+        self.watch_label.setAlignment(Qt.AlignCenter)
+        self.watch_label.hide()
+        layout.addWidget(self.watch_label)
+        
         exit_btn = QPushButton("Exit Application")
         exit_btn.setStyleSheet("background-color: #dc2626; color: white; padding: 8px;")
         exit_btn.clicked.connect(self.quit_app)
@@ -960,6 +5429,7 @@ class PortraitScreenshotApp(QMainWindow):
     
     def apply_settings(self):
         old_hotkey = self.settings['hotkey']
+        old_window_hotkey = self.settings.get('window_hotkey', '')
         
         self.settings['hotkey'] = self.hotkey_input.text()
         self.settings['save_location'] = self.save_input.text()
@@ -969,10 +5439,13 @@ class PortraitScreenshotApp(QMainWindow):
         self.settings['lock_ratio'] = self.lock_ratio_checkbox.isChecked()
         self.settings['ratio_mode'] = '9:16' if self.ratio_9_16.isChecked() else '16:9'
         self.settings['copy_to_clipboard'] = self.copy_to_clipboard_checkbox.isChecked()
+        self.settings['multi_region_capture'] = self.multi_region_checkbox.isChecked()
+        self.settings['window_target'] = self.window_target_input.text().strip()
+        self.settings['window_hotkey'] = self.window_hotkey_input.text().strip()
         
         self.save_settings()
         
-        if old_hotkey != self.settings['hotkey']:
+        if old_hotkey != self.settings['hotkey'] or old_window_hotkey != self.settings['window_hotkey']:
             self.register_hotkey()
         
         self.tray_icon.setToolTip(f"Portrait Screenshot\nPress {self.settings['hotkey'].upper()}")
@@ -1019,17 +5492,29 @@ class PortraitScreenshotApp(QMainWindow):
             return
         
         try:
-            # Stop previous hotkey thread if exists
+            # Stop previous hotkey threads if they exist
             if self.hotkey_thread is not None:
                 self.hotkey_thread.stop()
                 self.hotkey_thread = None
+            if self.window_hotkey_thread is not None:
+                self.window_hotkey_thread.stop()
+                self.window_hotkey_thread = None
             
             # Create and start new hotkey thread
-            self.hotkey_thread = HotkeyThread(self.settings['hotkey'])
-            self.hotkey_thread.hotkey_triggered.connect(self.start_capture)
+            self.hotkey_thread = HotkeyThread(self.settings['hotkey'],
+                                              self.settings.get('hotkey_backend', 'auto'))
+            self.hotkey_thread.hotkey_pressed.connect(self.on_hotkey_pressed)
             self.hotkey_thread.start()
             
             logger.info(f"Hotkey registered: {self.settings['hotkey']}")
+            
+            # Optional second hotkey that captures the target window without the overlay
+            if self.settings.get('window_hotkey'):
+                self.window_hotkey_thread = HotkeyThread(self.settings['window_hotkey'],
+                                                         self.settings.get('hotkey_backend', 'auto'))
+                self.window_hotkey_thread.hotkey_pressed.connect(self.on_window_hotkey_pressed)
+                self.window_hotkey_thread.start()
+                logger.info(f"Window hotkey registered: {self.settings['window_hotkey']}")
         except Exception as e:
             logger.error(f"Could not register hotkey: {e}")
             QMessageBox.warning(self, "Hotkey Error", 
@@ -1039,17 +5524,281 @@ class PortraitScreenshotApp(QMainWindow):
         """Start capture with safety checks"""
         if self.is_exiting:
             return
-        
+        self.capture_queue.submit('overlay')
+    
+    def on_hotkey_pressed(self, pressed_at):
+        if not self.is_exiting:
+            self.capture_queue.submit('overlay', pressed_at)
+    
+    def on_window_hotkey_pressed(self, pressed_at):
+        if not self.is_exiting:
+            self.capture_queue.submit('window', pressed_at)
+    
+    def grab_for_request(self, request):
+        """
+        Grab what a request that has to wait will capture, right when it is made.
+        While an overlay covers the screen, the capture comes from the overlay's
+        own grab of what is underneath instead.
+        """
+        backend = get_grab_backend(self.settings.get('grab_backend', 'auto'))
+        if self.overlay is not None:
+            backend = FrameGrabBackend(self.overlay.background_frame())
+        if request.kind == 'window':
+            window = self.find_target_window()
+            ratio_mode = self.settings.get('ratio_mode', '9:16')
+            return window, grab_window(backend, window, ratio_mode, self.settings.get('window_fit', 'none'))
+        return grab_all_screens(backend)
+    
+    def execute_capture_request(self, request):
+        """Run a request admitted by the capture queue; True while the overlay is open"""
+        if request.kind == 'window':
+            self.capture_target_window(request)
+            return False
+        return self.open_overlay(request)
+    
+    def open_overlay(self, request):
         try:
-            if self.overlay is None or not self.overlay.isVisible():
-                self.overlay = CaptureOverlay(self.settings)
-                self.overlay.capture_signal.connect(self.on_capture_complete)
-                self.overlay.update_ui_dimensions.connect(self.on_overlay_dimensions_changed)
-                self.overlay.show()
-                self.overlay.activateWindow()
-                self.overlay.raise_()
+            overlay_class = choose_overlay_class(self.settings)
+            self.overlay = overlay_class(self.settings, self.writer, frame=request.frame)
+            self.overlay.capture_signal.connect(self.on_capture_complete)
+            self.overlay.update_ui_dimensions.connect(self.on_overlay_dimensions_changed)
+            # The next queued request runs once this overlay is gone
+            self.overlay.close_signal.connect(self.on_overlay_closed)
+            self.overlay.close_signal.connect(self.capture_queue.finished)
+            self.overlay.show()
+            self.overlay.activateWindow()
+            self.overlay.raise_()
+            return True
         except Exception as e:
             logger.error(f"Error starting capture: {e}")
+            return False
+    
+    def on_overlay_closed(self):
+        self.overlay = None
+    
+    def start_watch(self, preset=None):
+        """Start watch mode on the saved region of preset (default: the current mode)"""
+        self.stop_watch()
+        ratio_mode = preset or self.settings.get('ratio_mode', '9:16')
+        rect = self.resolve_capture_region({'preset': ratio_mode})
+        self.watcher = RegionWatcher(self.writer, get_grab_backend(self.settings.get('grab_backend', 'auto')),
+                                     rect, ratio_mode,
+                                     interval_ms=self.settings.get('watch_interval_ms', 500),
+                                     threshold=self.settings.get('watch_threshold', 0.001),
+                                     paused=lambda: self.capture_queue.busy,
+                                     # The watch label changes every few seconds: never react to it
+                                     excluded=lambda: [self.frameGeometry()] if self.isVisible() else [],
+                                     parent=self)
+        self.watcher.sampled.connect(self.update_watch_label)
+        self.watcher.captured.connect(self.update_watch_label)
+        self.watcher.start()
+        self.watch_btn.blockSignals(True)
+        self.watch_btn.setChecked(True)
+        self.watch_btn.blockSignals(False)
+        self.update_watch_label()
+        self.watch_label.show()
+    
+    def stop_watch(self):
+        if self.watcher is None:
+            return
+        self.watcher.stop()
+        self.watcher.deleteLater()
+        self.watcher = None
+        self.watch_btn.blockSignals(True)
+        self.watch_btn.setChecked(False)
+        self.watch_btn.blockSignals(False)
+        self.watch_label.hide()
+    
+    def toggle_watch(self, checked):
+        if not checked:
+            self.stop_watch()
+            return
+        try:
+            self.start_watch()
+        except ValueError as e:
+            self.watch_btn.blockSignals(True)
+            self.watch_btn.setChecked(False)
+            self.watch_btn.blockSignals(False)
+            QMessageBox.warning(self, "Watch Region", f"{e}\nCapture the region once with the overlay first.")
+    
+    def update_watch_label(self, result=None):
+        if self.watcher is None:
+            return
+        stats = self.watcher.stats
+        self.watch_label.setText(f"Watching the {self.watcher.ratio_mode} region: "
+                                 f"{stats['sample_rate']:.1f} samples/s, {stats['cpu_percent']:.1f}% CPU, "
+                                 f"{stats['captures']} captures")
+    
+    def find_target_window(self, title=None, wm_class=None):
+        """The window to capture: by title and/or class, else the window_target setting"""
+        if not title and not wm_class:
+            title = self.settings.get('window_target', '').strip()
+            if not title:
+                raise ValueError("No target window given and window_target is not set")
+        window = find_window(title=title, wm_class=wm_class)
+        if window is None:
+            raise ValueError(f"No window matches {title or wm_class!r}")
+        return window
+    
+    def capture_window(self, window, ratio_mode=None, defer=True, clipboard=None, grabbed=None):
+        """
+        Grab and save only the area of window; returns (CaptureResult or None, pixmap).
+        grabbed is an earlier (pixmap, rect) from grab_window to save instead.
+        """
+        ratio_mode = ratio_mode or self.settings.get('ratio_mode', '9:16')
+        buffers = BufferCounter()
+        if grabbed is None:
+            backend = get_grab_backend(self.settings.get('grab_backend', 'auto'))
+            # Geometry is looked up again for every capture, so moved windows are followed
+            grabbed = grab_window(backend, window, ratio_mode, self.settings.get('window_fit', 'none'),
+                                  buffers)
+        captured, rect = grabbed
+        # One RGB32 buffer feeds hooks, encoder and clipboard
+        image = as_rgb32(captured.toImage(), buffers)
+        result = self.writer.save(image, rect, ratio_mode=ratio_mode, defer=defer, counter=buffers)
+        self.writer.note_buffers(buffers)
+        if clipboard is None:
+            clipboard = self.settings.get('copy_to_clipboard', True)
+        if result is not None and clipboard:
+            QApplication.clipboard().setMimeData(ClipboardImage(image))
+        return result, captured
+    
+    def capture_target_window(self, request):
+        """Capture the window_target window without the overlay"""
+        try:
+            if request.frame is not None:
+                window, grabbed = request.frame
+            else:
+                window, grabbed = self.find_target_window(), None
+            result, _ = self.capture_window(window, grabbed=grabbed)
+            if result is None:
+                raise RuntimeError("Failed to encode screenshot")
+            self.tray_icon.showMessage("Window captured", result.filepath,
+                                       QSystemTrayIcon.Information, 2000)
+        except Exception as e:
+            logger.error(f"Window capture failed: {e}")
+            self.tray_icon.showMessage("Window capture failed", str(e), QSystemTrayIcon.Warning, 3000)
+    
+    def resolve_capture_region(self, request):
+        """Region for a control request: explicit "rect" [x, y, w, h], or a saved "preset" region"""
+        if request.get('rect'):
+            x, y, w, h = (int(v) for v in request['rect'])
+            return QRect(x, y, w, h)
+        
+        preset = request.get('preset') or self.settings.get('ratio_mode', '9:16')
+        rect_data = self.settings.get(f'last_capture_rect_{preset}')
+        if not rect_data:
+            raise ValueError(f"No saved region for preset '{preset}'")
+        return QRect(rect_data['x'], rect_data['y'], rect_data['width'], rect_data['height'])
+    
+    def handle_ipc_request(self, request):
+        """Execute one control server request and return the response dict"""
+        cmd = request['cmd']
+        
+        if cmd == 'ping':
+            return {'pid': os.getpid()}
+        
+        if cmd == 'show':
+            self.show()
+            self.activateWindow()
+            self.raise_()
+            return {}
+        
+        if cmd == 'overlay':
+            self.start_capture()
+            return {}
+        
+        if cmd == 'capture' and ('window' in request or 'window_class' in request):
+            window = self.find_target_window(request.get('window'), request.get('window_class'))
+            result, _ = self.capture_window(window, request.get('preset'), defer=False,
+                                            clipboard=request.get('clipboard', False))
+            if result is None:
+                raise RuntimeError("Failed to encode screenshot")
+            rect = result.rect
+            response = {'path': result.filepath, 'size': len(result.data), 'window': window.title,
+                        'rect': [rect.x(), rect.y(), rect.width(), rect.height()]}
+            if request.get('return') == 'bytes':
+                response['data'] = base64.b64encode(result.data).decode('ascii')
+            return response
+        
+        if cmd == 'capture':
+            rect = self.resolve_capture_region(request)
+            backend = get_grab_backend(self.settings.get('grab_backend', 'auto'))
+            buffers = BufferCounter()
+            image = as_rgb32(grab_desktop_region(backend, rect, buffers).toImage(), buffers)
+            result = self.writer.save(image, rect, defer=False, counter=buffers)
+            self.writer.note_buffers(buffers)
+            if result is None:
+                raise RuntimeError("Failed to encode screenshot")
+            if request.get('clipboard', False):
+                QApplication.clipboard().setMimeData(ClipboardImage(image))
+            response = {'path': result.filepath, 'size': len(result.data),
+                        'rect': [rect.x(), rect.y(), rect.width(), rect.height()]}
+            if request.get('return') == 'bytes':
+                response['data'] = base64.b64encode(result.data).decode('ascii')
+            return response
+        
+        if cmd == 'stats':
+            stats = dict(self.writer.stats)
+            stats['uptime_s'] = time.time() - self.started_at
+            stats['grab_backend'] = get_grab_backend(self.settings.get('grab_backend', 'auto')).name
+            stats['ipc_requests'] = self.control_server.requests_handled if self.control_server else 0
+            if self.export_manager is not None:
+                stats['exports'] = dict(self.export_manager.stats, pending=self.export_manager.pending())
+            if self.catalog is not None:
+                since = request.get('since')
+                stats['catalog'] = self.catalog.totals(since=since)
+            stats['capture_queue'] = dict(self.capture_queue.stats, pending=self.capture_queue.depth(),
+                                          policy=self.capture_queue.policy)
+            if self.spool is not None:
+                stats['spool'] = dict(self.spool.stats, pending=self.spool.pending(),
+                                      bytes=self.spool.size())
+            if self.pruner is not None:
+                stats['retention'] = dict(self.pruner.stats)
+            if self.watcher is not None:
+                stats['watch'] = dict(self.watcher.stats, preset=self.watcher.ratio_mode)
+            return {'stats': stats}
+        
+        if cmd == 'history':
+            if self.catalog is None:
+                raise RuntimeError("The capture catalog is disabled")
+            return {'captures': self.catalog.query(since=request.get('since'),
+                                                   until=request.get('until'),
+                                                   region=request.get('rect'),
+                                                   limit=int(request.get('limit', 100)))}
+        
+        if cmd == 'rebuild_catalog':
+            if self.catalog is None:
+                raise RuntimeError("The capture catalog is disabled")
+            # Hashing a whole library takes long: answered from the catalog thread when done
+            directory = self.writer.get_save_dir()
+            return self.catalog.submit(lambda: {'added': self.catalog.rebuild(directory)})
+        
+        if cmd == 'windows':
+            return {'windows': [{'id': int(window.wid), 'title': window.title, 'class': window.wm_class,
+                                 'rect': [window.rect.x(), window.rect.y(),
+                                          window.rect.width(), window.rect.height()]}
+                                for window in reversed(list_windows())]}
+        
+        if cmd == 'drain_spool':
+            if self.spool is None:
+                return {'pending': 0}
+            return {'pending': self.spool.drain()}
+        
+        if cmd == 'watch':
+            if request.get('enabled', True):
+                self.start_watch(request.get('preset'))
+            else:
+                self.stop_watch()
+            return {'watching': self.watcher is not None}
+        
+        if cmd == 'prune':
+            if self.pruner is None:
+                raise RuntimeError("No retention policy is configured")
+            self.pruner.prune_now()
+            return {}
+        
+        raise ValueError(f"Unknown command: {cmd}")
     
     def on_capture_complete(self, rect):
         """Called when capture is completed"""
@@ -1087,14 +5836,46 @@ class PortraitScreenshotApp(QMainWindow):
         
         self.is_exiting = True
         
-        # Stop hotkey thread
+        # Stop hotkey threads
         try:
             if self.hotkey_thread is not None:
                 self.hotkey_thread.stop()
                 self.hotkey_thread = None
+            if self.window_hotkey_thread is not None:
+                self.window_hotkey_thread.stop()
+                self.window_hotkey_thread = None
         except Exception as e:
             logger.error(f"Error stopping hotkey thread: {e}")
         
+        self.stop_watch()
+        
+        # Stop pruning; the next session walks the folder again
+        if self.pruner is not None:
+            self.pruner.close()
+        
+        # Stop background encoding; the rest of the spool is encoded next session
+        if self.spool is not None:
+            self.spool.close()
+        
+        # Make batched writes durable before exiting
+        try:
+            self.writer.flush()
+        except Exception as e:
+            logger.error(f"Error flushing pending writes: {e}")
+        
+        # Write out queued catalog rows
+        if self.catalog is not None:
+            self.catalog.close()
+        
+        # Unfinished uploads stay in the export queue for the next session
+        if self.export_manager is not None:
+            self.export_manager.shutdown()
+        
+        # Stop accepting control requests
+        if self.control_server is not None:
+            self.control_server.stop()
+            self.control_server = None
+        
         # Close overlay if open
         if self.overlay and self.overlay.isVisible():
             self.overlay.close()
@@ -1112,11 +5893,242 @@ class PortraitScreenshotApp(QMainWindow):
         QTimer.singleShot(100, QApplication.quit)
 
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Portrait Screenshot Tool")
+    parser.add_argument('--benchmark-grab', type=int, nargs='?', const=20, metavar='N',
+                        help="Benchmark the available screen grab backends (N iterations) and exit")
+    parser.add_argument('--benchmark-write', type=int, nargs='?', const=200, metavar='N',
+                        help="Benchmark the fsync policies with N writes each and exit")
+    parser.add_argument('--bench-dir', default=os.path.join(os.path.expanduser('~'), 'Screenshots'),
+                        help="Directory on the storage to benchmark (default: ~/Screenshots)")
+    parser.add_argument('--bench-size', type=int, default=500, metavar='KB',
+                        help="Size of each benchmark write in KB (default: 500)")
+    parser.add_argument('--benchmark-png', type=int, nargs='?', const=3, metavar='N',
+                        help="Compare Qt's and the parallel PNG encoder (best of N runs) and exit")
+    parser.add_argument('--bench-image', metavar='PATH',
+                        help="Image to encode for --benchmark-png (default: a 2160x3840 test image)")
+    parser.add_argument('--measure-hotkeys', type=float, nargs='?', const=10.0, metavar='SECONDS',
+                        help="Report idle CPU and wakeups per second of each hotkey backend and exit")
+    parser.add_argument('--hotkey', default='ctrl+shift+p',
+                        help="Hotkey to register for --measure-hotkeys (default: ctrl+shift+p)")
+    parser.add_argument('--rebuild-catalog', action='store_true',
+                        help="Add screenshots already on disk to the capture catalog and exit")
+    parser.add_argument('--prune', action='store_true',
+                        help="Apply the retention policy to the screenshot folder now and exit")
+    parser.add_argument('--convert', choices=sorted(CONVERT_FORMATS), metavar='FORMAT',
+                        help="Re-encode the screenshots in the save location to png, jpg or webp and exit "
+                             "(resumes an interrupted run)")
+    parser.add_argument('--convert-dir', metavar='DIR',
+                        help="Folder to convert for --convert (default: the save location)")
+    parser.add_argument('--convert-output', metavar='DIR',
+                        help="Write converted files into a mirror tree below DIR instead of next to the originals")
+    parser.add_argument('--quality', type=int, default=90,
+                        help="JPEG/WebP quality for --convert (default: 90)")
+    parser.add_argument('--png-level', type=int, default=9, choices=range(10), metavar='LEVEL',
+                        help="zlib level for --convert png (default: 9)")
+    parser.add_argument('--max-size', type=int, default=0, metavar='PX',
+                        help="Downscale converted images to at most PX on the long side")
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help="Processes for --convert (default: one per core)")
+    parser.add_argument('--replace-originals', action='store_true',
+                        help="Delete each original once its converted copy is in place (--convert to jpg/webp)")
+    parser.add_argument('--region', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'),
+                        help="Region to capture or benchmark (default: saved preset / every full screen)")
+    parser.add_argument('--capture', nargs='?', const='', metavar='PRESET',
+                        help="Capture the region of PRESET (9:16 or 16:9, default: current mode) "
+                             "or --region through the running instance")
+    parser.add_argument('--window', nargs='?', const='', metavar='TITLE',
+                        help="Capture only the window whose title (or class) contains TITLE "
+                             "(default: the window_target setting)")
+    parser.add_argument('--window-class', metavar='CLASS',
+                        help="Capture only a window whose class contains CLASS")
+    parser.add_argument('--list-windows', action='store_true',
+                        help="List the windows that --window can capture")
+    parser.add_argument('--return', dest='return_type', choices=['path', 'bytes'], default='path',
+                        help="What --capture prints: the saved file path or the PNG bytes")
+    parser.add_argument('--stats', action='store_true',
+                        help="Print capture statistics of the running instance")
+    parser.add_argument('--watch', nargs='?', const='', metavar='PRESET',
+                        help="Capture the saved region of PRESET (default: current mode) whenever it changes")
+    parser.add_argument('--unwatch', action='store_true',
+                        help="Stop watch mode")
+    parser.add_argument('--drain-spool', action='store_true',
+                        help="Encode the deferred-encoding spool now instead of when idle")
+    # Qt consumes its own options (e.g. -platform) from sys.argv
+    args, _ = parser.parse_known_args(argv[1:])
+    return args
+
+
+def build_ipc_request(args):
+    """Translate command line options into a control server request"""
+    if args.window is not None or args.window_class:
+        request = {'cmd': 'capture', 'return': args.return_type, 'window': args.window or ''}
+        if args.window_class:
+            request['window_class'] = args.window_class
+        if args.capture:
+            request['preset'] = args.capture
+        return request
+    if args.capture is not None:
+        request = {'cmd': 'capture', 'return': args.return_type}
+        if args.region:
+            request['rect'] = args.region
+        elif args.capture:
+            request['preset'] = args.capture
+        return request
+    if args.stats:
+        return {'cmd': 'stats'}
+    if args.drain_spool:
+        return {'cmd': 'drain_spool'}
+    if args.watch is not None:
+        request = {'cmd': 'watch', 'enabled': True}
+        if args.watch:
+            request['preset'] = args.watch
+        return request
+    if args.unwatch:
+        return {'cmd': 'watch', 'enabled': False}
+    if args.list_windows:
+        return {'cmd': 'windows'}
+    return {'cmd': 'show'}
+
+
+def print_ipc_response(request, response):
+    """Print a control server response for command line use; returns the exit code"""
+    if not response.get('ok'):
+        print(f"Error: {response.get('error')}", file=sys.stderr)
+        return 1
+    if request['cmd'] == 'capture':
+        if request.get('return') == 'bytes':
+            sys.stdout.buffer.write(base64.b64decode(response['data']))
+            sys.stdout.flush()
+        else:
+            print(response['path'])
+    elif request['cmd'] == 'stats':
+        print(json.dumps(response['stats'], indent=2))
+    elif request['cmd'] == 'windows':
+        for window in response['windows']:
+            x, y, w, h = window['rect']
+            print(f"{window['id']:#010x}  {w}x{h}+{x}+{y}  {window['class']}  {window['title']}")
+    elif request['cmd'] == 'drain_spool':
+        print(f"Encoding {response['pending']} spooled captures")
+    elif request['cmd'] == 'watch':
+        print("Watching" if response['watching'] else "Not watching")
+    return 0
+
+
 def main():
+    args = parse_args(sys.argv)
+    
+    if args.benchmark_write is not None:
+        os.makedirs(args.bench_dir, exist_ok=True)
+        benchmark_write_policies(args.bench_dir, args.benchmark_write, args.bench_size * 1024)
+        return
+    
+    if args.rebuild_catalog:
+        # Works whether or not an instance is running (SQLite handles the locking)
+        window_settings = PortraitScreenshotApp.load_settings()
+        catalog = CaptureCatalog(get_catalog_path(window_settings))
+        try:
+            added = catalog.rebuild(window_settings['save_location'])
+        finally:
+            catalog.close()
+        print(f"Added {added} captures to {catalog.path}")
+        return
+    
+    if args.prune:
+        # One pass in the foreground; a running instance's own pass just finds less to do
+        window_settings = PortraitScreenshotApp.load_settings()
+        pruner = RetentionPruner.from_settings(window_settings['save_location'], window_settings,
+                                               background=False)
+        if pruner is None:
+            sys.exit("No retention policy is configured (retention_* settings)")
+        catalog = None
+        if window_settings.get('catalog_enabled', False):
+            catalog = CaptureCatalog(get_catalog_path(window_settings))
+            pruner.listeners.append(catalog.forget)
+        try:
+            pruner.run_pass()
+        finally:
+            if catalog is not None:
+                catalog.close()
+        print(f"Removed {pruner.stats['removed']} of {pruner.stats['scanned']} screenshots "
+              f"({pruner.stats['bytes_freed'] / 1e6:.1f} MB), kept {pruner.stats['kept']}")
+        return
+    
+    if args.convert:
+        window_settings = PortraitScreenshotApp.load_settings()
+        root = args.convert_dir or window_settings['save_location']
+        
+        def report(stats):
+            print(f"{stats['converted'] + stats['kept'] + stats['failed']} files, "
+                  f"{stats['files_per_s']:.1f} files/s, {stats['mb_per_s']:.1f} MB/s", flush=True)
+        
+        # Converted files keep their catalog rows (new path, format, size and hash)
+        catalog = None
+        if window_settings.get('catalog_enabled', False):
+            catalog = CaptureCatalog(get_catalog_path(window_settings))
+        try:
+            stats = convert_library(root, args.convert, output=args.convert_output, quality=args.quality,
+                                    level=args.png_level, max_size=args.max_size, workers=args.workers,
+                                    replace=args.replace_originals, report=report,
+                                    converted=catalog.record_conversions if catalog is not None else None)
+        finally:
+            if catalog is not None:
+                catalog.close()
+        saved = stats['bytes_in'] - stats['bytes_out']
+        print(f"Converted {stats['converted']}, kept {stats['kept']} (no smaller), "
+              f"failed {stats['failed']}, skipped {stats['skipped']} done earlier")
+        print(f"{stats['seconds']:.1f}s, {stats['files_per_s']:.1f} files/s, {stats['mb_per_s']:.1f} MB/s, "
+              f"{saved / 1e6:.1f} MB saved of {stats['bytes_in'] / 1e6:.1f} MB "
+              f"({100.0 * saved / max(stats['bytes_in'], 1):.1f}%)")
+        return
+    
+    if args.measure_hotkeys is not None:
+        measure_hotkey_backends(args.hotkey, args.measure_hotkeys)
+        return
+    
+    if args.benchmark_grab is None and args.benchmark_png is None:
+        # Single instance: forward the request to a running instance if there is one
+        request = build_ipc_request(args)
+        response = send_ipc_request(request)
+        if response is None and PortraitScreenshotApp.load_settings().get('ipc_enabled', True):
+            # Launches racing past the check above: the one that gets the lock
+            # starts the server, the others forward their request to it
+            instance_lock = acquire_instance_lock()
+            if instance_lock is None:
+                response = forward_when_listening(request)
+        if response is not None:
+            sys.exit(print_ipc_response(request, response))
+    
     app = QApplication(sys.argv)
+
+    if args.benchmark_grab is not None:
+        region = QRect(*args.region) if args.region else None
+        benchmark_grab_backends(args.benchmark_grab, region)
+        return
+    
+    if args.benchmark_png is not None:
+        image = QImage(args.bench_image) if args.bench_image else None
+        if image is not None and image.isNull():
+            sys.exit(f"Cannot read {args.bench_image}")
+        benchmark_png_encoders(image, args.benchmark_png)
+        return
+
     app.setQuitOnLastWindowClosed(False)
     
     window = PortraitScreenshotApp()
+    
+    # No instance was running: this one serves the request itself, before its
+    # window is shown so that a --capture does not grab the window
+    if request['cmd'] != 'show':
+        try:
+            response = window.handle_ipc_request(request)
+            if isinstance(response, concurrent.futures.Future):
+                response = response.result()
+            response.setdefault('ok', True)
+        except Exception as e:
+            response = {'ok': False, 'error': str(e)}
+        print_ipc_response(request, response)
+    
     window.show()
     
     sys.exit(app.exec_())
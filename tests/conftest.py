@@ -0,0 +1,75 @@
+import os
+import sys
+
+# The application is a single module in src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import pytest
+from PyQt5.QtGui import QColor, QPainter, QPixmap
+from PyQt5.QtWidgets import QApplication
+
+import main
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    """One QApplication for the session; pixmaps, painters and sockets need it"""
+    app = QApplication.instance() or QApplication(['tests'])
+    yield app
+
+
+class FakeGrabBackend:
+    """Paints a known pattern instead of reading the screen, and counts the grabs"""
+    name = 'fake'
+
+    def __init__(self):
+        self.grabs = 0
+
+    def grab(self, screen, rect=None, counter=None):
+        self.grabs += 1
+        geometry = screen.geometry()
+        pixmap = QPixmap(geometry.size())
+        pixmap.fill(QColor(20, 40, 60))
+        painter = QPainter(pixmap)
+        # A marker in every 100x100 block: its colour encodes where it is
+        for x in range(0, geometry.width(), 100):
+            for y in range(0, geometry.height(), 100):
+                painter.fillRect(x, y, 4, 4, QColor(x // 100 * 10, y // 100 * 10, 255))
+        painter.end()
+        if rect is None:
+            return pixmap
+        pixmap = pixmap.copy(rect)
+        if counter is not None:
+            counter.copied(pixmap)
+        return pixmap
+
+
+@pytest.fixture
+def backend(qapp, monkeypatch):
+    fake = FakeGrabBackend()
+    monkeypatch.setitem(main._grab_backend_cache, 'fake', fake)
+    return fake
+
+
+@pytest.fixture
+def make_overlay(backend, tmp_path):
+    overlays = []
+
+    def make(overlay_class=main.CaptureOverlay, **settings):
+        screen = QApplication.primaryScreen().geometry()
+        settings = dict({
+            'save_location': str(tmp_path),
+            'grab_backend': 'fake',
+            'copy_to_clipboard': False,
+            'portrait_width': screen.height() * 9 // 16,
+            'portrait_height': screen.height(),
+        }, **settings)
+        overlay = overlay_class(settings)
+        overlays.append(overlay)
+        return overlay
+
+    yield make
+    for overlay in overlays:
+        overlay.close()
+        overlay.deleteLater()
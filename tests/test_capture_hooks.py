@@ -0,0 +1,114 @@
+"""Capture hooks get the region as a read-only view before it is encoded."""
+import os
+
+import pytest
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor, QImage, QPixmap
+
+import main
+
+
+@pytest.fixture
+def hooks():
+    registered = []
+
+    def register(callback):
+        main.register_capture_hook(callback)
+        registered.append(callback)
+        return callback
+
+    yield register
+    for callback in registered:
+        main.unregister_capture_hook(callback)
+
+
+def desktop(width=64, height=48):
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(10, 20, 30))
+    image.setPixelColor(12, 8, QColor(200, 100, 50))
+    return image
+
+
+def capture(tmp_path, source, rect):
+    """Run rect of source (standing in for the screen grab) through the overlay's capture path"""
+    overlay = main.CaptureOverlay({'save_location': str(tmp_path), 'copy_to_clipboard': False})
+    overlay.screen_pixmap = QPixmap.fromImage(source)
+    overlay.capture_rect = QRect(rect)
+    overlay.capture_and_save()
+    overlay.deleteLater()
+    return [str(tmp_path / name) for name in os.listdir(tmp_path)]
+
+
+def test_hook_sees_a_view_into_the_desktop(qapp, hooks, tmp_path):
+    seen = []
+
+    @hooks
+    def hook(frame):
+        pixels = frame.numpy()
+        seen.append({
+            'size': (frame.width, frame.height),
+            'rect': frame.rect,
+            'ratio_mode': frame.ratio_mode,
+            'filepath': frame.filepath,
+            'pixel': tuple(pixels[0, 0]),
+            'writeable': pixels.flags.writeable,
+            'kept': frame.image.copy(),
+        })
+
+    source = desktop()
+    rect = QRect(12, 8, 20, 10)
+    saved = capture(tmp_path, source, rect)
+
+    assert len(seen) == 1
+    frame = seen[0]
+    assert frame['size'] == (20, 10)
+    assert frame['rect'] == rect
+    assert frame['ratio_mode'] == '9:16'
+    assert [frame['filepath']] == saved
+    assert frame['pixel'] == (50, 100, 200, 255)  # BGRA
+    assert not frame['writeable']
+    # A copy made inside the hook outlives the capture buffer
+    del source
+    assert frame['kept'].pixelColor(0, 0) == QColor(200, 100, 50)
+
+
+def test_memoryview_and_numpy_are_read_only():
+    image = desktop(8, 4)
+    frame = main.CapturedFrame(main.crop_image_view(image, QRect(2, 1, 4, 2)), QRect(2, 1, 4, 2),
+                               '1:1', source=image)
+    view = frame.memoryview()
+    assert view.readonly
+    assert len(view) == frame.bytes_per_line + 4 * 4
+    with pytest.raises(TypeError):
+        view[0] = 0
+    pixels = frame.numpy()
+    assert pixels.shape == (2, 4, 4)
+    with pytest.raises(ValueError):
+        pixels[0, 0, 0] = 0
+
+
+def test_empty_frame_has_empty_views():
+    frame = main.CapturedFrame(QImage(), QRect(), '1:1')
+    assert len(frame.memoryview()) == 0
+    assert frame.numpy().shape == (0, 0, 4)
+
+
+def test_failing_or_unregistered_hook_does_not_stop_the_capture(qapp, hooks, tmp_path):
+    calls = []
+
+    @hooks
+    def broken(frame):
+        raise RuntimeError('hook failed')
+
+    def counted(frame):
+        calls.append(frame)
+
+    main.register_capture_hook(counted)
+    main.unregister_capture_hook(counted)
+
+    image = desktop(16, 16)
+    saved = capture(tmp_path, image, image.rect())
+
+    assert len(saved) == 1
+    assert QImage(saved[0]).size() == image.size()
+    assert calls == []
@@ -0,0 +1,151 @@
+"""CaptureRequestQueue admission policies, early grabs and statistics."""
+import time
+
+import pytest
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QApplication
+
+import main
+
+
+class Recorder:
+    """execute/grab callbacks for a queue; every executed request keeps running until finished()"""
+
+    def __init__(self, frame='frame'):
+        self.executed = []
+        self.grabbed = []
+        self.frame = frame
+
+    def execute(self, request):
+        self.executed.append(request)
+        return True
+
+    def grab(self, request):
+        self.grabbed.append(request)
+        if isinstance(self.frame, Exception):
+            raise self.frame
+        return self.frame
+
+
+def make_queue(policy, max_pending=3, **recorder):
+    recorder = Recorder(**recorder)
+    return main.CaptureRequestQueue(recorder.execute, recorder.grab, policy, max_pending), recorder
+
+
+def run_next(qapp, queue):
+    """finished() starts the next request from the event loop"""
+    queue.finished()
+    qapp.processEvents()
+
+
+def test_idle_queue_runs_the_request_at_once(qapp):
+    queue, recorder = make_queue('coalesce')
+    queue.submit('overlay', time.monotonic() - 0.25)
+
+    assert [request.kind for request in recorder.executed] == ['overlay']
+    assert recorder.grabbed == [] and recorder.executed[0].frame is None
+    assert queue.busy and queue.depth() == 0
+    assert queue.stats['executed'] == 1
+    assert queue.stats['last_latency_ms'] >= 250
+
+
+def test_drop_discards_requests_while_busy(qapp):
+    queue, recorder = make_queue('drop')
+    for _ in range(3):
+        queue.submit('overlay')
+
+    assert len(recorder.executed) == 1 and queue.depth() == 0
+    run_next(qapp, queue)
+    assert len(recorder.executed) == 1 and not queue.busy
+    assert queue.stats == dict(queue.stats, requests=3, executed=1, dropped=2, coalesced=0, max_depth=0)
+
+
+def test_coalesce_keeps_the_latest_press_per_kind(qapp):
+    queue, recorder = make_queue('coalesce')
+    queue.submit('overlay', 1.0)
+    queue.submit('overlay', 2.0)
+    queue.submit('window', 3.0)
+    queue.submit('overlay', 4.0)
+
+    assert [(request.kind, request.pressed_at) for request in queue.pending] == [('overlay', 4.0), ('window', 3.0)]
+    assert queue.stats['coalesced'] == 1 and queue.stats['max_depth'] == 2
+    # Every waiting request grabbed when it was admitted, including the replaced one
+    assert [request.pressed_at for request in recorder.grabbed] == [2.0, 3.0, 4.0]
+
+    run_next(qapp, queue)
+    run_next(qapp, queue)
+    assert [request.pressed_at for request in recorder.executed] == [1.0, 4.0, 3.0]
+    assert recorder.executed[1].frame == 'frame'
+
+
+def test_coalesce_is_capped_at_max_pending(qapp):
+    queue, recorder = make_queue('coalesce', max_pending=1)
+    queue.submit('overlay')
+    queue.submit('window')
+    queue.submit('other')
+
+    assert [request.kind for request in queue.pending] == ['window']
+    assert queue.stats['dropped'] == 1
+
+
+def test_queue_keeps_order_up_to_max_pending(qapp):
+    queue, recorder = make_queue('queue', max_pending=2)
+    for pressed_at in range(5):
+        queue.submit('overlay', float(pressed_at))
+
+    assert queue.depth() == 2
+    assert queue.stats == dict(queue.stats, requests=5, executed=1, dropped=2, coalesced=0, max_depth=2)
+    for _ in range(3):
+        run_next(qapp, queue)
+    assert [request.pressed_at for request in recorder.executed] == [0.0, 1.0, 2.0]
+    assert queue.stats['executed'] == 3 and not queue.busy
+
+
+def test_early_grab_records_its_latency(qapp):
+    queue, recorder = make_queue('queue')
+    queue.submit('overlay')
+    pressed_at = time.monotonic() - 0.5
+    queue.submit('overlay', pressed_at)
+
+    request = queue.pending[0]
+    assert request.frame == 'frame'
+    assert request.grabbed_at >= pressed_at
+    assert queue.stats['last_latency_ms'] >= 500
+
+    # The grab time, not the execution, is what the latency measures
+    run_next(qapp, queue)
+    assert queue.stats['last_latency_ms'] < 1000 * (time.monotonic() - pressed_at)
+
+
+@pytest.mark.parametrize('frame', [None, RuntimeError('no display')])
+def test_request_without_an_early_grab_grabs_when_it_runs(qapp, frame):
+    queue, recorder = make_queue('queue', frame=frame)
+    queue.submit('overlay')
+    queue.submit('window')
+
+    assert queue.pending[0].frame is None and queue.pending[0].grabbed_at is None
+    run_next(qapp, queue)
+    assert recorder.executed[-1].kind == 'window'
+
+
+def test_requests_during_an_overlay_capture_what_is_under_it(make_overlay, backend):
+    overlay = make_overlay()
+    grabs = backend.grabs
+    frame = main.grab_all_screens(main.FrameGrabBackend(overlay.background_frame()))
+
+    assert backend.grabs == grabs
+    screen = QApplication.primaryScreen()
+    assert frame[screen.name()].size() == screen.geometry().size()
+    region = main.grab_desktop_region(main.FrameGrabBackend(frame), QRect(200, 100, 50, 50)).toImage()
+    assert region.size() == QRect(0, 0, 50, 50).size()
+    assert region.pixelColor(0, 0) == QColor(20, 10, 255)
+    assert region.pixelColor(10, 10) == QColor(20, 40, 60)
+
+
+def test_tiled_overlay_frame_is_its_tile_backgrounds(make_overlay, backend):
+    overlay = make_overlay(main.TiledCaptureOverlay)
+    frame = overlay.background_frame()
+
+    assert set(frame) == {screen.name() for screen in QApplication.screens()}
+    assert [frame[tile.screen_ref.name()] for tile in overlay.tiles] == [tile.background for tile in overlay.tiles]
@@ -0,0 +1,112 @@
+"""CaptureCatalog against a SQLite database in tmp_path."""
+import os
+import time
+
+import pytest
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor, QImage
+
+import main
+
+
+@pytest.fixture
+def make_catalog(tmp_path):
+    catalogs = []
+
+    def make(**options):
+        catalog = main.CaptureCatalog(str(tmp_path / 'catalog.sqlite3'), **options)
+        catalogs.append(catalog)
+        return catalog
+
+    yield make
+    for catalog in catalogs:
+        catalog.close()
+
+
+def capture(tmp_path, name, timestamp, rect=QRect(10, 20, 90, 160), data=b'png bytes'):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return main.CaptureResult(str(path), data, rect, '9:16', timestamp)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_rows_are_written_in_batches(make_catalog, tmp_path):
+    catalog = make_catalog(batch_size=3, flush_interval=60)
+    for i in range(4):
+        catalog.add(capture(tmp_path, f"shot{i}.png", 1000.0 + i))
+
+    # A full batch is written at once, the rest waits for more rows or the interval
+    assert wait_for(lambda: len(catalog.query()) == 3)
+    time.sleep(0.2)
+    assert len(catalog.query()) == 3
+
+    catalog.close()
+    assert len(catalog.query()) == 4
+
+
+def test_query_and_totals(make_catalog, tmp_path):
+    catalog = make_catalog(batch_size=1)
+    catalog.add(capture(tmp_path, 'a.png', 1000.0, data=b'a' * 10))
+    catalog.add(capture(tmp_path, 'b.png', 2000.0, rect=QRect(0, 0, 160, 90), data=b'b' * 20))
+    catalog.add(capture(tmp_path, 'c.png', 3000.0, data=b'c' * 30))
+    catalog.close()
+
+    assert [row['path'] for row in catalog.query()] == [str(tmp_path / name) for name in ('c.png', 'b.png', 'a.png')]
+    assert [os.path.basename(row['path']) for row in catalog.query(since=1500, until=3000)] == ['b.png']
+    assert [os.path.basename(row['path']) for row in catalog.query(region=(10, 20, 90, 160))] == \
+        ['c.png', 'a.png']
+    assert [os.path.basename(row['path']) for row in catalog.query(region=QRect(0, 0, 160, 90))] == ['b.png']
+    assert len(catalog.query(limit=1)) == 1
+    row = catalog.query(until=1500)[0]
+    assert (row['x'], row['y'], row['width'], row['height']) == (10, 20, 90, 160)
+    assert row['format'] == 'png' and row['size'] == 10 and len(row['sha256']) == 64
+
+    assert catalog.totals() == {'captures': 3, 'bytes': 60}
+    assert catalog.totals(since=1500) == {'captures': 2, 'bytes': 50}
+    assert catalog.totals(since=1500, until=2500) == {'captures': 1, 'bytes': 20}
+
+
+def test_rebuild_indexes_files_it_has_not_seen(make_catalog, tmp_path):
+    library = tmp_path / 'library'
+    shard = library / '2026' / '01' / '02'
+    shard.mkdir(parents=True)
+    image = QImage(30, 40, QImage.Format_RGB32)
+    image.fill(QColor(1, 2, 3))
+    assert image.save(str(library / 'known.png'))
+    assert image.save(str(shard / 'portrait.png'))
+    assert image.scaled(40, 30).save(str(shard / 'landscape.jpg'))
+    (shard / '.partial.png.1.tmp').write_bytes(b'temp')
+    (shard / 'notes.txt').write_text('not a screenshot')
+
+    catalog = make_catalog(batch_size=1)
+    catalog.add(main.CaptureResult(str(library / 'known.png'), (library / 'known.png').read_bytes(),
+                                   QRect(5, 5, 30, 40), '9:16', 1000.0))
+    assert wait_for(lambda: len(catalog.query()) == 1)
+
+    assert catalog.rebuild(str(library)) == 2
+    rows = {os.path.basename(row['path']): row for row in catalog.query()}
+    assert set(rows) == {'known.png', 'portrait.png', 'landscape.jpg'}
+    assert rows['known.png']['x'] == 5
+    assert (rows['portrait.png']['width'], rows['portrait.png']['ratio_mode']) == (30, '9:16')
+    assert (rows['landscape.jpg']['format'], rows['landscape.jpg']['ratio_mode']) == ('jpg', '16:9')
+    assert rows['portrait.png']['x'] is None
+    assert catalog.rebuild(str(library)) == 0
+
+
+def test_forgotten_files_leave_the_catalog(make_catalog, tmp_path):
+    catalog = make_catalog(batch_size=1)
+    catalog.add(capture(tmp_path, 'gone.png', 1000.0))
+    catalog.add(capture(tmp_path, 'kept.png', 2000.0))
+    assert wait_for(lambda: len(catalog.query()) == 2)
+
+    catalog.forget([str(tmp_path / 'gone.png')])
+
+    assert [os.path.basename(row['path']) for row in catalog.query()] == ['kept.png']
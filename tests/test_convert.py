@@ -0,0 +1,89 @@
+"""convert_library: resumable bulk re-encoding that keeps the catalog in step."""
+import hashlib
+import os
+
+import pytest
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor, QImage
+
+import main
+
+
+def screenshot(path, shade):
+    image = QImage(60, 120, QImage.Format_RGB32)
+    image.fill(QColor(shade, 10, 10))
+    assert image.save(str(path), 'PNG', 0)  # Uncompressed: any re-encode is smaller
+    return path
+
+
+@pytest.fixture
+def library(tmp_path):
+    root = tmp_path / 'library'
+    shard = root / '2026' / '01' / '02'
+    shard.mkdir(parents=True)
+    paths = [screenshot(root / f"Portrait_{i}.png", i * 40) for i in range(2)]
+    paths.append(screenshot(shard / 'Portrait_2.png', 80))
+    return root, paths
+
+
+def test_resume_skips_finished_files_across_other_options(library, tmp_path):
+    root, paths = library
+    output = tmp_path / 'out'
+
+    first = main.convert_library(str(root), 'jpg', output=str(output), workers=1)
+    assert (first['converted'], first['skipped']) == (3, 0)
+    assert (output / '2026' / '01' / '02' / 'Portrait_2.jpg').exists()
+
+    # A run with other options in between does not reset the jpg checkpoint
+    assert main.convert_library(str(root), 'webp', output=str(output), workers=1)['converted'] == 3
+    screenshot(root / 'Portrait_3.png', 120)
+    again = main.convert_library(str(root), 'jpg', output=str(output), workers=1)
+    assert (again['converted'], again['skipped']) == (1, 3)
+    assert len(list(output.glob('.portrait-convert-checkpoint-*'))) == 2
+    assert [path.exists() for path in paths] == [True] * 3
+
+
+def test_interrupted_run_resumes_from_its_checkpoint(library):
+    root, paths = library
+    converted = main.convert_library(str(root), 'png', level=9, workers=1)
+    assert converted['converted'] == 3
+    checkpoint = next(root.glob('.portrait-convert-checkpoint-*'))
+    header, *finished = checkpoint.read_text().splitlines()
+    # As if the run had stopped after its first file
+    checkpoint.write_text('\n'.join([header, finished[0]]) + '\n')
+
+    resumed = main.convert_library(str(root), 'png', level=9, workers=1)
+
+    # The two files not in the checkpoint are tried again; already small PNGs are kept
+    assert resumed['skipped'] == 1
+    assert resumed['converted'] + resumed['kept'] == 2
+    assert len(checkpoint.read_text().splitlines()) == 4
+
+
+def test_replaced_files_keep_their_catalog_rows(library, tmp_path):
+    root, paths = library
+    catalog = main.CaptureCatalog(str(tmp_path / 'catalog.sqlite3'), batch_size=1)
+    try:
+        for i, path in enumerate(paths):
+            catalog.add(main.CaptureResult(str(path), path.read_bytes(), QRect(i, 2, 60, 120), '9:16', 1000.0 + i))
+        catalog.close()
+        catalog = main.CaptureCatalog(catalog.path)
+
+        stats = main.convert_library(str(root), 'webp', replace=True, workers=1,
+                                     converted=catalog.record_conversions)
+
+        assert stats['converted'] == 3
+        rows = sorted(catalog.query(), key=lambda row: row['x'])
+        assert [row['path'] for row in rows] == [os.path.splitext(str(path))[0] + '.webp' for path in paths]
+        assert not any(path.exists() for path in paths)
+        for i, row in enumerate(rows):
+            data = open(row['path'], 'rb').read()
+            assert (row['x'], row['timestamp'], row['ratio_mode'], row['format']) == (i, 1000.0 + i, '9:16', 'webp')
+            assert (row['size'], row['sha256']) == (len(data), hashlib.sha256(data).hexdigest())
+    finally:
+        catalog.close()
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        main.convert_library(str(tmp_path), 'gif')
@@ -0,0 +1,119 @@
+"""ExportManager uploads against a local HTTP server on 127.0.0.1."""
+import http.server
+import threading
+import time
+import types
+
+import pytest
+
+import main
+
+
+class RecordingHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def do_PUT(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with server.lock:
+            server.requests.append({'path': self.path, 'port': self.client_address[1],
+                                    'filename': self.headers['X-Filename'], 'body': body})
+            status = server.statuses.pop(0) if server.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.statuses = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def make_manager(server, tmp_path):
+    managers = []
+
+    def make(**settings):
+        settings = dict({
+            'export_sinks': [{'type': 'http', 'url': f"http://127.0.0.1:{server.server_port}/shots/{{filename}}"}],
+            'export_queue_dir': str(tmp_path / 'queue'),
+            'export_workers': 1,
+            'export_backoff_base': 0.05,
+            'export_timeout': 5.0,
+        }, **settings)
+        manager = main.ExportManager(settings)
+        managers.append(manager)
+        return manager
+
+    yield make
+    for manager in managers:
+        manager.shutdown()
+
+
+def capture(tmp_path, name, data=b'\x89PNG fake'):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return types.SimpleNamespace(filepath=str(path), data=data)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_uploads_reuse_one_keep_alive_connection(server, make_manager, tmp_path):
+    manager = make_manager()
+    for i in range(3):
+        manager.submit(capture(tmp_path, f"shot_{i}.png"))
+
+    assert wait_for(lambda: manager.stats['uploaded'] == 3)
+    assert [r['path'] for r in server.requests] == [f"/shots/shot_{i}.png" for i in range(3)]
+    assert len({r['port'] for r in server.requests}) == 1
+    assert wait_for(lambda: manager.pending() == 0)
+
+
+def test_failed_upload_is_retried(server, make_manager, tmp_path):
+    server.statuses = [503, 500]
+    manager = make_manager()
+    result = capture(tmp_path, 'retried.png', b'payload')
+    manager.submit(result)
+
+    assert wait_for(lambda: manager.stats['uploaded'] == 1)
+    assert manager.stats['failed_attempts'] == 2
+    assert [r['body'] for r in server.requests] == [b'payload'] * 3
+    assert wait_for(lambda: manager.pending() == 0)
+
+
+def test_gives_up_after_max_attempts(server, make_manager, tmp_path):
+    server.statuses = [500] * 10
+    manager = make_manager(export_max_attempts=2)
+    manager.submit(capture(tmp_path, 'lost.png'))
+
+    assert wait_for(lambda: manager.stats['given_up'] == 1)
+    assert manager.pending() == 0
+    assert len(list((tmp_path / 'queue' / 'failed').iterdir())) == 1
+
+
+def test_non_ascii_filename_is_percent_encoded(server, make_manager, tmp_path):
+    manager = make_manager()
+    manager.submit(capture(tmp_path, 'schnappschuss_ü.png'))
+
+    assert wait_for(lambda: manager.stats['uploaded'] == 1)
+    assert server.requests[0]['filename'] == 'schnappschuss_%C3%BC.png'
+    assert server.requests[0]['path'] == '/shots/schnappschuss_%C3%BC.png'
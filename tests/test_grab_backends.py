@@ -0,0 +1,82 @@
+"""The x11-shm grab backend against the qt backend, on a virtual X server (Xvfb)."""
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+pytestmark = pytest.mark.skipif(shutil.which('Xvfb') is None or not sys.platform.startswith('linux'),
+                                reason="needs Xvfb")
+
+# Runs in its own process: a QApplication on the xcb platform of the Xvfb display
+COMPARE_GRABS = r'''
+import sys
+sys.path.insert(0, sys.argv[1])
+from PyQt5.QtWidgets import QApplication, QWidget
+from PyQt5.QtGui import QPainter, QColor
+from PyQt5.QtCore import Qt, QRect
+import main
+
+class Pattern(QWidget):
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        for i in range(8):
+            painter.fillRect(i * 40, 0, 40, 300, QColor(i * 30, 255 - i * 30, (i * 70) % 256))
+        painter.fillRect(100, 100, 50, 50, Qt.white)
+
+app = QApplication(['test', '-platform', 'xcb'])
+widget = Pattern()
+widget.setWindowFlags(Qt.FramelessWindowHint | Qt.BypassWindowManagerHint)
+widget.setGeometry(0, 0, 320, 300)
+widget.show()
+for _ in range(50):
+    app.processEvents()
+    app.thread().msleep(10)
+
+assert main.X11ShmGrabBackend.is_available(), "MIT-SHM not available"
+screen = app.primaryScreen()
+region = QRect(20, 30, 250, 200)
+qt_image = main.QtGrabBackend().grab(screen, region).toImage().convertToFormat(main.QImage.Format_RGB32)
+shm = main.X11ShmGrabBackend()
+try:
+    for _ in range(2):  # The second grab reuses the shared memory segment
+        shm_image = shm.grab(screen, region).toImage().convertToFormat(main.QImage.Format_RGB32)
+        assert shm_image.size() == qt_image.size(), (shm_image.size(), qt_image.size())
+        assert shm_image == qt_image, "x11-shm and qt grabs differ"
+    assert qt_image.pixelColor(100 - 20, 100 - 30) == QColor(Qt.white)
+    # Partly outside the root window: served by Qt instead of a fatal BadMatch
+    outside = shm.grab(screen, QRect(600, 440, 100, 100))
+    assert not outside.isNull()
+finally:
+    shm.close()
+print("ok")
+'''
+
+
+@pytest.fixture(scope='module')
+def xvfb_display():
+    read_fd, write_fd = os.pipe()
+    server = subprocess.Popen(['Xvfb', '-displayfd', str(write_fd), '-screen', '0', '640x480x24',
+                               '-nolisten', 'tcp'], pass_fds=(write_fd,),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    try:
+        with os.fdopen(read_fd) as f:
+            number = f.readline().strip()
+        if not number:
+            pytest.skip("Xvfb did not start")
+        yield f":{number}"
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def test_x11_shm_grab_matches_qt_grab(xvfb_display):
+    env = dict(os.environ, DISPLAY=xvfb_display, QT_QPA_PLATFORM='xcb')
+    result = subprocess.run([sys.executable, '-c', COMPARE_GRABS, SRC], env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith('ok')
@@ -0,0 +1,84 @@
+"""The control server answers line-delimited JSON over a real local socket."""
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+import main
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="Unix domain sockets")
+
+
+@pytest.fixture
+def control_server(qapp, tmp_path):
+    def handler(request):
+        if request['cmd'] == 'ping':
+            return {'pid': os.getpid()}
+        if request['cmd'] == 'stats':
+            return {'stats': {'captures': 3}}
+        raise ValueError(f"unknown command {request['cmd']!r}")
+
+    server = main.ControlServer(str(tmp_path / 'control.sock'), handler)
+    assert server.start()
+    yield server
+    server.stop()
+
+
+def in_thread(qapp, function):
+    """Run a blocking client call while the Qt event loop serves it"""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()), daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while thread.is_alive() and time.monotonic() < deadline:
+        qapp.processEvents()
+        time.sleep(0.005)
+    thread.join(0)
+    assert result, "client got no reply"
+    return result[0]
+
+
+def raw_request(path, line):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(path)
+        sock.sendall(line)
+        reply = b''
+        while not reply.endswith(b'\n'):
+            reply += sock.recv(4096)
+        return reply
+
+
+def test_ping_and_stats_round_trip(qapp, control_server):
+    path = control_server.socket_path
+    assert in_thread(qapp, lambda: main.send_ipc_request({'cmd': 'ping'}, path)) == \
+        {'ok': True, 'pid': os.getpid()}
+    assert in_thread(qapp, lambda: main.send_ipc_request({'cmd': 'stats'}, path)) == \
+        {'ok': True, 'stats': {'captures': 3}}
+    assert control_server.requests_handled == 2
+
+
+def test_malformed_lines_get_an_error(qapp, control_server):
+    path = control_server.socket_path
+    assert in_thread(qapp, lambda: raw_request(path, b'not json\n')).startswith(b'{"ok": false')
+    response = in_thread(qapp, lambda: main.send_ipc_request({'no': 'cmd'}, path))
+    assert response['ok'] is False and 'cmd' in response['error']
+    response = in_thread(qapp, lambda: main.send_ipc_request({'cmd': 'bogus'}, path))
+    assert response == {'ok': False, 'error': "unknown command 'bogus'"}
+
+
+def test_no_instance_listening(tmp_path):
+    assert main.send_ipc_request({'cmd': 'ping'}, str(tmp_path / 'none.sock'), timeout=1) is None
+
+
+def test_only_one_launch_gets_the_instance_lock(tmp_path):
+    path = str(tmp_path / 'control.sock')
+    first = main.acquire_instance_lock(path)
+    assert first is not None
+    assert main.acquire_instance_lock(path) is None
+    first.close()
+    second = main.acquire_instance_lock(path)
+    assert second is not None
+    second.close()
@@ -0,0 +1,79 @@
+"""File names: timestamps, sequence numbers and clashes with existing files."""
+import datetime as datetime_module
+import json
+import os
+
+import pytest
+
+import main
+
+
+class FrozenDatetime(datetime_module.datetime):
+    moment = datetime_module.datetime(2026, 3, 14, 15, 9, 26, 535000)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.moment
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    monkeypatch.setattr(main, 'datetime', FrozenDatetime)
+    return FrozenDatetime
+
+
+def make_writer(tmp_path, **settings):
+    return main.CaptureWriter(dict({'save_location': str(tmp_path)}, **settings))
+
+
+def test_captures_in_the_same_millisecond_get_distinct_names(tmp_path, frozen_clock):
+    writer = make_writer(tmp_path)
+    first, second = writer.next_filepath(), writer.next_filepath()
+    pair = writer.next_filepaths(['9:16', '16:9'])
+
+    assert os.path.basename(first) == 'Portrait_2026-03-14_15-09-26-535.png'
+    assert os.path.basename(second) == 'Portrait_2026-03-14_15-09-26-535-1.png'
+    assert [os.path.basename(path) for path in pair] == [
+        'Portrait_2026-03-14_15-09-26-535-2_9x16.png', 'Portrait_2026-03-14_15-09-26-535-2_16x9.png']
+
+
+def test_existing_file_is_never_overwritten(tmp_path, frozen_clock):
+    writer = make_writer(tmp_path)
+    taken = tmp_path / 'Portrait_2026-03-14_15-09-26-535.png'
+    taken.write_bytes(b'someone else')
+
+    result = writer._write(str(taken), b'ours', 0.0, main.QRect(0, 0, 1, 1))
+
+    assert taken.read_bytes() == b'someone else'
+    assert result.filepath != str(taken)
+    assert open(result.filepath, 'rb').read() == b'ours'
+
+
+def test_prefix_clash_rescans_and_takes_the_next_free_number(tmp_path):
+    writer = make_writer(tmp_path, file_prefix='pic')
+    (tmp_path / 'pic1.png').write_bytes(b'old')
+    assert writer.next_filepath() == str(tmp_path / 'pic2.png')
+    # Another process numbered files without going through our state
+    (tmp_path / 'pic3.png').write_bytes(b'other')
+    (tmp_path / 'pic4.jpg').write_bytes(b'converted')
+
+    result = writer._write(str(tmp_path / 'pic3.png'), b'ours', 0.0, main.QRect(0, 0, 1, 1))
+
+    assert result.filepath == str(tmp_path / 'pic5.png')
+    assert (tmp_path / 'pic3.png').read_bytes() == b'other'
+
+
+def test_prefix_numbering_is_global_across_date_shards(tmp_path, frozen_clock, monkeypatch):
+    old_shard = tmp_path / '2026' / '03' / '13'
+    old_shard.mkdir(parents=True)
+    (old_shard / 'pic7.png').write_bytes(b'yesterday')
+    writer = make_writer(tmp_path, file_prefix='pic', shard_by_date=True)
+
+    assert writer.next_filepath() == str(tmp_path / '2026' / '03' / '14' / 'pic8.png')
+
+    # Deleting files does not make numbers come back, and a new process continues
+    (old_shard / 'pic7.png').unlink()
+    monkeypatch.setattr(frozen_clock, 'moment', frozen_clock.moment + datetime_module.timedelta(days=1))
+    assert make_writer(tmp_path, file_prefix='pic', shard_by_date=True).next_filepath() == \
+        str(tmp_path / '2026' / '03' / '15' / 'pic9.png')
+    assert json.loads((tmp_path / main.SEQUENCE_STATE_FILE).read_text()) == {'pic': 9}
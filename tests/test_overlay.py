@@ -0,0 +1,147 @@
+"""The capture overlay, driven offscreen against a fake grab backend."""
+from PyQt5.QtCore import QPoint, QRect
+from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap
+from PyQt5.QtWidgets import QApplication
+
+import main
+
+
+def test_multi_region_capture_crops_every_region_from_one_grab(make_overlay, backend, tmp_path):
+    overlay = make_overlay(multi_region_capture=True)
+    assert set(overlay.regions) == {'9:16', '16:9'}
+    overlay.regions['9:16'] = QRect(100, 0, 200, 300)
+    overlay.regions['16:9'] = QRect(200, 100, 320, 180)
+    grabs = backend.grabs
+
+    overlay.capture_and_save()
+
+    assert backend.grabs == grabs
+    assert overlay.writer.stats['captures'] == 2
+    saved = {QImage(str(path)).size().width(): QImage(str(path)) for path in tmp_path.glob('*.png')}
+    portrait, landscape = saved[200], saved[320]
+    assert portrait.size().height() == 300 and landscape.size().height() == 180
+    # The markers of blocks (1, 0) and (2, 1) sit in the top-left corners
+    assert portrait.pixelColor(0, 0) == QColor(10, 0, 255)
+    assert landscape.pixelColor(0, 0) == QColor(20, 10, 255)
+    assert landscape.pixelColor(4, 4) == QColor(20, 40, 60)
+    assert overlay.settings['last_capture_rect_16:9'] == {'x': 200, 'y': 100, 'width': 320, 'height': 180}
+
+
+def test_capture_copies_no_pixels_for_encoder_and_clipboard(make_overlay, tmp_path):
+    overlay = make_overlay(copy_to_clipboard=True, png_encoder='qt')
+    overlay.capture_rect = QRect(100, 0, 200, 300)
+
+    overlay.capture_and_save()
+
+    stats = overlay.writer.stats
+    assert stats['captures'] == 1
+    assert (stats['last_allocations'], stats['last_copies'], stats['last_bytes_copied']) == (0, 0, 0)
+    # The clipboard crops the grab only now, when it is read
+    pasted = QApplication.clipboard().image()
+    assert pasted.size() == QRect(0, 0, 200, 300).size()
+    assert pasted.pixelColor(0, 0) == QColor(10, 0, 255)
+
+
+def test_parallel_encoder_conversion_is_counted(make_overlay):
+    overlay = make_overlay(png_encoder='parallel')
+    overlay.capture_rect = QRect(0, 0, 200, 300)
+
+    overlay.capture_and_save()
+
+    # The one copy is the packed RGB888 image the encoder filters
+    stats = overlay.writer.stats
+    assert stats['captures'] == 1
+    assert (stats['last_allocations'], stats['last_copies']) == (1, 1)
+    assert stats['last_bytes_copied'] == 200 * 3 * 300
+
+
+def make_loupe(size=400, **options):
+    pixmap = QPixmap(size, size)
+    pixmap.fill(QColor(90, 90, 90))
+    return main.MagnifierLoupe([(QRect(0, 0, size, size), pixmap)], **options)
+
+
+def test_loupe_reuses_cached_tiles(qapp):
+    loupe = make_loupe(zoom=6, radius=10)
+    target = QRect(0, 0, loupe.size(), loupe.size())
+    image = QImage(200, 200, QImage.Format_RGB32)
+    painter = QPainter(image)
+    # 21x21 pixels around (40, 40) span tiles 0 and 1 in both directions
+    loupe.paint(painter, target, QPoint(40, 40))
+    loupe.paint(painter, target, QPoint(41, 39))
+    painter.end()
+
+    assert loupe.stats['paints'] == 2
+    assert loupe.stats['tiles_scaled'] == 4
+    assert set(loupe._tiles) == {(0, tx, ty) for tx in (0, 1) for ty in (0, 1)}
+    assert loupe._tiles[(0, 0, 0)].size() == QRect(0, 0, 32 * 6, 32 * 6).size()
+
+
+def test_loupe_evicts_the_least_recently_used_tile(qapp):
+    loupe = make_loupe(size=32 * 70, zoom=4)
+    loupe.MAX_TILES = 3
+    for tx in range(3):
+        loupe._tile(0, tx, 0)
+    loupe._tile(0, 0, 0)  # Used again: now the most recent
+    loupe._tile(0, 3, 0)
+
+    assert list(loupe._tiles) == [(0, 2, 0), (0, 0, 0), (0, 3, 0)]
+    assert loupe.stats['tiles_scaled'] == 4
+    assert loupe.cache_bytes() == 3 * (32 * 4) ** 2 * 4
+
+
+def test_loupe_cache_stays_bounded(qapp):
+    loupe = make_loupe(size=32 * 20)
+    for tx in range(20):
+        for ty in range(20):
+            loupe._tile(0, tx, ty)
+
+    assert len(loupe._tiles) == main.MagnifierLoupe.MAX_TILES
+    assert (0, 19, 19) in loupe._tiles and (0, 0, 0) not in loupe._tiles
+
+
+def test_hud_counts_one_frame_per_paint_cycle():
+    hud = main.OverlayHud()
+    hud.toggle()
+    # Two tiles painting the same cycle, then the next cycle
+    hud.note_paint(1.0, True, frame=1)
+    hud.note_paint(2.0, True, frame=1)
+    hud.note_paint(0.5, True, frame=2)
+
+    assert hud.paints == 2
+    assert hud.last_paint_ms == 0.5 and hud.total_paint_ms == 3.5
+    # A single-window overlay passes no frame id: every paint is a frame
+    hud.note_paint(1.0, False)
+    hud.note_paint(1.0, False)
+    assert hud.paints == 4
+
+
+def test_hud_rates_cover_only_drag_frames():
+    hud = main.OverlayHud()
+    hud.toggle()
+    for frame in range(30):
+        hud.note_paint(1.0, dragging=frame < 20, frame=frame)
+        hud.note_move()
+    hud._window_start -= 1.0  # A second has passed
+    hud.note_paint(1.0, True, frame=99)
+
+    assert 19 <= hud.fps <= 21
+    assert 29 <= hud.moves_per_s <= 30
+    assert hud.lines(2 * 1024 * 1024, 2048)[-1] == "grab memory 2.0 MB (+2 KB loupe)"
+
+
+def test_tiled_overlay_tiles_share_a_hud_frame(qapp, make_overlay):
+    overlay = make_overlay(main.TiledCaptureOverlay)
+    overlay.show()
+    qapp.processEvents()
+    overlay.hud.toggle()
+    tile = overlay.tiles[0]
+
+    overlay.update()
+    tile.repaint()
+    tile.repaint()  # Another tile painting for the same update
+    assert overlay.hud.paints == 1
+
+    overlay.update()
+    tile.repaint()
+    assert overlay.hud.paints == 2
@@ -0,0 +1,85 @@
+"""encode_png_parallel output decodes to exactly the pixels it was given."""
+import random
+import struct
+import zlib
+
+import pytest
+from PyQt5.QtGui import QImage
+
+import main
+
+
+def noisy_image(width, height, image_format, seed=0):
+    """Flat areas, gradients and noise, so every PNG filter type gets used"""
+    rng = random.Random(seed)
+    flat, ramp = width // 3, width // 3
+    noise = width - flat - ramp
+    gradient = bytes(range(256)) * (ramp * 4 // 256 + 2)
+    rows = []
+    for y in range(height):
+        rows.append(b'\xc8\xc8\xc8\xff' * flat + gradient[y % 256:y % 256 + ramp * 4]
+                    + bytes(rng.getrandbits(8) for _ in range(noise * 4)))
+    return QImage(b''.join(rows), width, height, width * 4, image_format).copy()
+
+
+def decode(data):
+    image = QImage.fromData(data, 'PNG')
+    assert not image.isNull()
+    return image
+
+
+def chunks(data):
+    """(type, payload) of every chunk, checking each CRC"""
+    assert data[:8] == main.PNG_SIGNATURE
+    offset, found = 8, []
+    while offset < len(data):
+        length, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        payload = data[offset + 8:offset + 8 + length]
+        assert struct.unpack('>I', data[offset + 8 + length:offset + 12 + length])[0] == \
+            zlib.crc32(kind + payload)
+        found.append((kind, payload))
+        offset += 12 + length
+    return found
+
+
+@pytest.mark.parametrize('width, height', [(1, 1), (3, 7), (1000, 700), (2160, 300)])
+@pytest.mark.parametrize('image_format', [QImage.Format_RGB32, QImage.Format_ARGB32])
+def test_round_trip_is_pixel_identical(width, height, image_format):
+    image = noisy_image(width, height, image_format, seed=width)
+
+    data, encode_ms = main.encode_png_parallel(image, workers=4)
+
+    decoded = decode(data)
+    assert decoded.size() == image.size()
+    assert decoded.hasAlphaChannel() == image.hasAlphaChannel()
+    assert decoded.convertToFormat(image.format()) == image
+    assert encode_ms >= 0
+
+
+def test_strips_form_one_valid_zlib_stream(monkeypatch):
+    monkeypatch.setattr(main, 'PNG_STRIP_BYTES', 4096)
+    image = noisy_image(300, 200, QImage.Format_RGB32)
+
+    data, _ = main.encode_png_parallel(image, workers=3)
+
+    found = chunks(data)
+    assert [kind for kind, _ in found[:2]] == [b'IHDR', b'IDAT'] and found[-1][0] == b'IEND'
+    assert sum(kind == b'IDAT' for kind, _ in found) > 10
+    raw = zlib.decompress(b''.join(payload for kind, payload in found if kind == b'IDAT'))
+    assert len(raw) == 200 * (1 + 300 * 3)
+    assert decode(data).convertToFormat(image.format()) == image
+
+
+def test_without_numpy_rows_are_stored_unfiltered(monkeypatch):
+    monkeypatch.setattr(main, 'np', None)
+    image = noisy_image(37, 11, QImage.Format_ARGB32)
+
+    data, _ = main.encode_png_parallel(image)
+
+    raw = zlib.decompress(b''.join(payload for kind, payload in chunks(data) if kind == b'IDAT'))
+    assert raw[::1 + 37 * 4] == b'\0' * 11
+    assert decode(data).convertToFormat(image.format()) == image
+
+
+def test_null_image_fails():
+    assert main.encode_png_parallel(QImage()) == (None, 0.0)
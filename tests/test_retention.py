@@ -0,0 +1,93 @@
+"""RetentionPruner policy selection and passes over a real folder."""
+import os
+
+import pytest
+
+import main
+
+DAY = 86400.0
+NOW = 1_800_000_000.0
+
+
+def pruner(**limits):
+    return main.RetentionPruner('/unused', background=False, **limits)
+
+
+def files(*specs):
+    """(age in days, size, name) -> select() input, grouped like real names"""
+    return [(NOW - age * DAY, size, name, main.retention_group(name)) for age, size, name in specs]
+
+
+def test_retention_groups():
+    assert main.retention_group('Portrait_2026-01-02_03-04-05-678.png') == 'Portrait_'
+    assert main.retention_group('Portrait_2026-01-02_03-04-05-678-2_16x9.webp') == 'Portrait_'
+    assert main.retention_group('picture12.png') == 'picture'
+    assert main.retention_group('picture12.jpg') == 'picture'
+
+
+def test_max_age_keeps_the_newest_of_each_prefix():
+    policy = pruner(max_age_days=7)
+    doomed = policy.select(files((1, 10, 'a1.png'), (8, 10, 'a2.png'), (30, 10, 'b1.png'),
+                                 (40, 10, 'b2.png')), NOW)
+
+    assert sorted(path for path, _ in doomed) == ['a2.png', 'b2.png']
+    assert policy.stats['kept'] == 2 and policy.stats['kept_bytes'] == 20
+
+
+def test_keep_per_prefix():
+    doomed = pruner(keep_per_prefix=2).select(
+        files(*[(age, 1, f"pic{age}.png") for age in range(5)], (9, 1, 'other1.png')), NOW)
+
+    assert [path for path, _ in doomed] == ['pic2.png', 'pic3.png', 'pic4.png']
+
+
+def test_max_count_removes_the_oldest():
+    policy = pruner(max_count=3)
+    doomed = policy.select(files(*[(age, 1, f"shot{age}.png") for age in range(6)]), NOW)
+
+    assert [path for path, _ in doomed] == ['shot3.png', 'shot4.png', 'shot5.png']
+    assert policy.stats['kept'] == 3
+
+
+def test_max_total_size_keeps_newest_files_that_fit():
+    policy = pruner(max_total_mb=1)
+    mb = 1024 * 1024
+    doomed = policy.select(files((0, mb // 2, 'a1.png'), (1, mb // 2 + 1, 'a2.png'),
+                                 (2, mb // 4, 'a3.png'), (3, mb, 'a4.png')), NOW)
+
+    # a2 would overflow the limit; the smaller, older a3 still fits
+    assert [path for path, _ in doomed] == ['a2.png', 'a4.png']
+    assert policy.stats['kept_bytes'] == mb // 2 + mb // 4
+
+
+def test_limits_combine():
+    doomed = pruner(max_age_days=10, max_count=2).select(
+        files((0, 1, 'x1.png'), (1, 1, 'x2.png'), (2, 1, 'x3.png'), (20, 1, 'y1.png')), NOW)
+
+    # y1 is too old but the newest of its prefix; x3 is one file too many
+    assert [path for path, _ in doomed] == ['x3.png']
+
+
+@pytest.mark.parametrize('names', [['a.png'], []])
+def test_nothing_to_remove(names):
+    assert pruner(max_count=5).select(files(*[(0, 1, name) for name in names]), NOW) == []
+
+
+def test_pass_removes_files_and_tells_listeners(tmp_path):
+    shard = tmp_path / '2026' / '01' / '02'
+    shard.mkdir(parents=True)
+    paths = [tmp_path / 'shot1.png', shard / 'shot2.jpg', tmp_path / 'shot3.webp', tmp_path / 'shot4.png']
+    for age, path in enumerate(reversed(paths)):
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (NOW - age * DAY, NOW - age * DAY))
+    (tmp_path / 'notes.txt').write_text('not a screenshot')
+    removed = []
+
+    retention = main.RetentionPruner(str(tmp_path), max_count=2, background=False)
+    retention.listeners.append(removed.extend)
+    retention.run_pass()
+
+    assert sorted(removed) == sorted(str(path) for path in paths[:2])
+    assert [path.exists() for path in paths] == [False, False, True, True]
+    assert (tmp_path / 'notes.txt').exists()
+    assert retention.stats == dict(retention.stats, passes=1, scanned=4, removed=2, bytes_freed=200, kept=2)
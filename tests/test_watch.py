@@ -0,0 +1,126 @@
+"""Watch mode saves a region only when its thumbnail changed enough."""
+import pytest
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor, QPainter, QPixmap
+
+import main
+
+REGION = QRect(100, 50, 540, 960)
+
+
+class Screen:
+    """What the fake grab returns: a light page, with extra marks painted on top"""
+
+    def __init__(self):
+        self.marks = []
+
+    def grab(self, backend, rect, counter=None):
+        pixmap = QPixmap(rect.size())
+        pixmap.fill(QColor(240, 240, 240))
+        painter = QPainter(pixmap)
+        for mark in self.marks:
+            painter.fillRect(mark.translated(-rect.topLeft()), QColor(0, 0, 0))
+        painter.end()
+        return pixmap
+
+
+@pytest.fixture
+def screen(qapp, monkeypatch):
+    fake = Screen()
+    monkeypatch.setattr(main, 'grab_desktop_region', fake.grab)
+    return fake
+
+
+@pytest.fixture
+def make_watcher(tmp_path):
+    def make(**options):
+        writer = main.CaptureWriter({'save_location': str(tmp_path), 'copy_to_clipboard': False})
+        return main.RegionWatcher(writer, None, REGION, '9:16', **options)
+    return make
+
+
+def saved(tmp_path):
+    return sorted(path.name for path in tmp_path.glob('*.png'))
+
+
+def test_first_sample_is_saved_and_identical_ones_are_not(screen, make_watcher, tmp_path):
+    watcher = make_watcher()
+    watcher.sample()
+    watcher.sample()
+    watcher.sample()
+
+    assert watcher.stats['samples'] == 3 and watcher.stats['captures'] == 1
+    assert len(saved(tmp_path)) == 1
+
+
+def test_change_below_the_threshold_is_ignored(screen, make_watcher, tmp_path):
+    watcher = make_watcher()
+    watcher.sample()
+    # A blinking caret covers one or two blocks of the 64x64 thumbnail
+    screen.marks.append(QRect(REGION.x() + 200, REGION.y() + 300, 2, 20))
+    watcher.sample()
+
+    assert watcher.stats['captures'] == 1
+
+
+def test_real_change_is_saved_once(screen, make_watcher, tmp_path):
+    captured = []
+    watcher = make_watcher()
+    watcher.captured.connect(captured.append)
+    watcher.sample()
+    # A new line of text
+    screen.marks.append(QRect(REGION.x() + 40, REGION.y() + 400, 300, 12))
+    watcher.sample()
+    watcher.sample()
+
+    assert watcher.stats['captures'] == 2 and len(saved(tmp_path)) == 2
+    assert watcher.stats['last_change'] > watcher.threshold
+    assert captured[-1].rect == REGION and captured[-1].ratio_mode == '9:16'
+
+
+def test_zero_threshold_reacts_to_any_block(screen, make_watcher):
+    watcher = make_watcher(threshold=0.0)
+    watcher.sample()
+    screen.marks.append(QRect(REGION.x() + 200, REGION.y() + 300, 2, 20))
+    watcher.sample()
+
+    assert watcher.stats['captures'] == 2
+
+
+def test_own_window_is_excluded(screen, make_watcher):
+    own_window = QRect(REGION.x() + 300, REGION.y() + 600, 400, 300)  # Sticks out of the region
+    watcher = make_watcher(excluded=lambda: [own_window])
+    watcher.sample()
+    screen.marks.append(QRect(own_window.x() + 10, own_window.y() + 10, 200, 200))
+    watcher.sample()
+    assert watcher.stats['captures'] == 1
+
+    screen.marks.append(QRect(REGION.x() + 10, REGION.y() + 10, 200, 200))
+    watcher.sample()
+    assert watcher.stats['captures'] == 2
+
+
+def test_paused_watcher_skips_samples(screen, make_watcher):
+    watcher = make_watcher(paused=lambda: True)
+    watcher.sample()
+
+    assert watcher.stats['skipped'] == 1 and watcher.stats['captures'] == 0
+
+
+def test_changed_cells():
+    page = QPixmap(640, 640)
+    page.fill(QColor(255, 255, 255))
+    thumbnail = main.luma_thumbnail(page.toImage())
+    left_half = [QRect(0, 0, 315, 640)]
+    before = main.luma_thumbnail(page.toImage(), excluded=left_half)
+    assert thumbnail.size() == QRect(0, 0, 64, 64).size()
+    assert main.changed_cells(None, thumbnail) == 1.0
+    assert main.changed_cells(thumbnail, thumbnail.copy()) == 0.0
+
+    painter = QPainter(page)
+    painter.fillRect(0, 0, 320, 640, QColor(0, 0, 0))
+    painter.end()
+    assert main.changed_cells(thumbnail, main.luma_thumbnail(page.toImage())) == 0.5
+    # Blanked areas are rounded outwards to whole blocks, so the change disappears entirely
+    after = main.luma_thumbnail(page.toImage(), excluded=left_half)
+    assert main.changed_cells(before, after) == 0.0
@@ -0,0 +1,64 @@
+"""Window capture fitted to a ratio mode by cropping or letterboxing."""
+import pytest
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QColor, QPixmap
+
+import main
+
+
+@pytest.mark.parametrize('rect, ratio_mode, expected', [
+    # Too wide for portrait: keep the full height, crop the sides
+    (QRect(100, 50, 1000, 800), '9:16', QRect(375, 50, 450, 800)),
+    # Too tall for landscape: keep the full width, crop top and bottom
+    (QRect(0, 0, 640, 1000), '16:9', QRect(0, 320, 640, 360)),
+    # Already the right shape
+    (QRect(10, 10, 1920, 1080), '16:9', QRect(10, 10, 1920, 1080)),
+    # Rounding never makes the crop larger than the window
+    (QRect(0, 0, 101, 100), '9:16', QRect(22, 0, 56, 100)),
+])
+def test_crop_is_the_largest_centred_rect_inside(rect, ratio_mode, expected):
+    fitted = main.fit_rect_to_ratio(rect, ratio_mode, 'crop')
+    assert fitted == expected
+    assert rect.contains(fitted)
+
+
+@pytest.mark.parametrize('rect, ratio_mode, expected', [
+    # Too wide for portrait: letterbox above and below
+    (QRect(100, 50, 900, 800), '9:16', QRect(100, -350, 900, 1600)),
+    # Too tall for landscape: pillarbox left and right
+    (QRect(0, 0, 640, 720), '16:9', QRect(-320, 0, 1280, 720)),
+    (QRect(0, 0, 1920, 1080), '16:9', QRect(0, 0, 1920, 1080)),
+    # Rounding never cuts into the window
+    (QRect(0, 0, 100, 101), '16:9', QRect(-40, 0, 180, 101)),
+])
+def test_pad_is_the_smallest_centred_rect_around(rect, ratio_mode, expected):
+    fitted = main.fit_rect_to_ratio(rect, ratio_mode, 'pad')
+    assert fitted == expected
+    assert fitted.contains(rect)
+
+
+def test_no_fit_keeps_the_window_rect():
+    rect = QRect(3, 4, 500, 300)
+    assert main.fit_rect_to_ratio(rect, '9:16', 'none') == rect
+
+
+class SolidGrabBackend:
+    name = 'solid'
+
+    def grab(self, screen, rect=None, counter=None):
+        pixmap = QPixmap((rect or screen.geometry()).size())
+        pixmap.fill(QColor(200, 10, 10))
+        return pixmap
+
+
+def test_padded_window_grab_has_black_bars(qapp):
+    window = main.WindowInfo(0x123, 'Editor', 'editor', QRect(100, 100, 320, 90))
+
+    pixmap, rect = main.grab_window(SolidGrabBackend(), window, '16:9', fit='pad')
+
+    assert rect == QRect(100, 55, 320, 180)
+    image = pixmap.toImage()
+    assert image.size() == rect.size()
+    assert image.pixelColor(0, 0) == QColor(0, 0, 0)
+    assert image.pixelColor(160, 90) == QColor(200, 10, 10)
+    assert image.pixelColor(319, 179) == QColor(0, 0, 0)
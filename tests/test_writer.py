@@ -0,0 +1,78 @@
+"""CaptureWriter durability: temp files, exclusive names and the batch fsync policy."""
+import os
+
+from PyQt5.QtCore import QRect
+
+import main
+
+
+def make_writer(tmp_path, **settings):
+    return main.CaptureWriter(dict({'save_location': str(tmp_path), 'file_prefix': 'shot'}, **settings))
+
+
+def visible(directory):
+    return sorted(name for name in os.listdir(directory) if not name.startswith('.'))
+
+
+def test_leftover_temp_files_are_removed_at_start(tmp_path):
+    shard = tmp_path / '2026' / '01' / '02'
+    shard.mkdir(parents=True)
+    (tmp_path / f".shot1.png.123{main.TEMP_SUFFIX}").write_bytes(b'partial')
+    (shard / f".shot2.png.456{main.TEMP_SUFFIX}").write_bytes(b'partial')
+    (shard / 'shot2.png').write_bytes(b'complete')
+
+    make_writer(tmp_path)
+
+    assert [path.name for path in tmp_path.rglob('*') if path.is_file()] == ['shot2.png']
+
+
+def test_existing_screenshot_is_not_overwritten(tmp_path):
+    writer = make_writer(tmp_path)
+    path = writer.next_filepath()
+    open(path, 'wb').write(b'already there')
+
+    result = writer._write(path, b'new capture', 0.0, QRect(0, 0, 1, 1))
+
+    assert open(path, 'rb').read() == b'already there'
+    assert open(result.filepath, 'rb').read() == b'new capture'
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(main.TEMP_SUFFIX)]
+
+
+def test_batch_keeps_temp_names_until_the_boundary(tmp_path):
+    writer = make_writer(tmp_path, fsync_policy='batch', fsync_batch_size=3, fsync_batch_seconds=60)
+    written = []
+    writer.listeners.append(written.append)
+
+    first = writer._write(writer.next_filepath(), b'one', 0.0, QRect(0, 0, 1, 1))
+    writer._write(writer.next_filepath(), b'two', 0.0, QRect(0, 0, 1, 1))
+    assert visible(tmp_path) == []
+    assert written == [] and writer.stats['captures'] == 0
+
+    writer._write(writer.next_filepath(), b'three', 0.0, QRect(0, 0, 1, 1))
+    assert visible(tmp_path) == ['shot1.png', 'shot2.png', 'shot3.png']
+    assert open(first.filepath, 'rb').read() == b'one'
+    assert [result.filepath for result in written] == [str(tmp_path / f"shot{i}.png") for i in (1, 2, 3)]
+    assert writer.stats['captures'] == 3
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(main.TEMP_SUFFIX)]
+
+
+def test_batch_flushes_after_its_delay(tmp_path):
+    writer = make_writer(tmp_path, fsync_policy='batch', fsync_batch_size=10, fsync_batch_seconds=0.05)
+    writer._write(writer.next_filepath(), b'one', 0.0, QRect(0, 0, 1, 1))
+    writer._batch_timer.join(5)
+    assert visible(tmp_path) == ['shot1.png']
+
+    writer.flush()
+    assert writer.stats['captures'] == 1
+
+
+def test_batch_commit_does_not_overwrite_a_name_taken_meanwhile(tmp_path):
+    writer = make_writer(tmp_path, fsync_policy='batch', fsync_batch_size=2, fsync_batch_seconds=60)
+    result = writer._write(writer.next_filepath(), b'ours', 0.0, QRect(0, 0, 1, 1))
+    open(result.filepath, 'wb').write(b'theirs')
+
+    writer.flush()
+
+    assert open(result.filepath, 'rb').read() == b'theirs'
+    assert writer.stats['last_filepath'] != result.filepath
+    assert open(writer.stats['last_filepath'], 'rb').read() == b'ours'